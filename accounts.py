@@ -0,0 +1,94 @@
+"""
+Comptes email (boites de coachs) servis par un meme deploiement
+Un compte = identifiants IMAP/SMTP + nom court (affichage); les emails sont tagues en base par l'adresse
+de la boite, stable si le compte est renomme ou passe de MAIL_USER a MAIL_ACCOUNTS
+
+Config: MAIL_ACCOUNTS = liste JSON (ou chemin d'un fichier JSON), par exemple
+[{"name": "achzod", "user": "coach@gmail.com", "password": "app-password"},
+ {"name": "julie", "user": "julie@gmail.com", "password": "...", "from_name": "Julie Coaching"}]
+Sans MAIL_ACCOUNTS: un seul compte depuis MAIL_USER / MAIL_PASS (comportement historique)
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
+IMAP_SSL = os.getenv("IMAP_SSL", "1") != "0"  # 0 = IMAP en clair (serveur local de benchmark)
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+MAIL_USER = os.getenv("MAIL_USER")
+MAIL_PASS = os.getenv("MAIL_PASS")
+FROM_NAME = os.getenv("FROM_NAME", "Achzod Coaching")
+
+
+class MailAccount:
+    """Identifiants d'une boite: IMAP (lecture, synchro) et SMTP (envoi des reponses)"""
+
+    __slots__ = ("name", "user", "password", "imap_server", "imap_port", "imap_ssl",
+                 "smtp_server", "smtp_port", "from_name")
+
+    def __init__(self, name: str, user: Optional[str], password: Optional[str],
+                 imap_server: str = IMAP_SERVER, imap_port: int = IMAP_PORT, imap_ssl: bool = IMAP_SSL,
+                 smtp_server: str = SMTP_SERVER, smtp_port: int = SMTP_PORT, from_name: str = FROM_NAME):
+        self.name = name
+        self.user = user
+        self.password = password
+        self.imap_server = imap_server
+        self.imap_port = int(imap_port)
+        self.imap_ssl = bool(imap_ssl)
+        self.smtp_server = smtp_server
+        self.smtp_port = int(smtp_port)
+        self.from_name = from_name
+
+    def __repr__(self):
+        return f"MailAccount({self.name!r}, {self.user!r}, {self.imap_server}:{self.imap_port})"
+
+    @property
+    def tag(self) -> str:
+        """Valeur stockee en base (colonne account, cles des checkpoints): adresse de la boite normalisee"""
+        return (self.user or self.name).strip().lower()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.user and self.password)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MailAccount":
+        user = data.get("user")
+        fields = {key: data[key] for key in ("imap_server", "imap_port", "imap_ssl", "smtp_server",
+                                             "smtp_port", "from_name") if data.get(key) is not None}
+        return cls((data.get("name") or user or "default").lower(), user, data.get("password"), **fields)
+
+
+def load_accounts() -> List[MailAccount]:
+    """Comptes configures, le premier est le compte principal (emails historiques sans tag)"""
+    raw = os.getenv("MAIL_ACCOUNTS", "").strip()
+    if raw:
+        try:
+            if not raw.startswith("["):
+                with open(raw, encoding="utf-8") as f:
+                    raw = f.read()
+            accounts = [MailAccount.from_dict(item) for item in json.loads(raw)]
+            if accounts:
+                return accounts
+        except Exception as e:
+            print(f"[ACCOUNTS] MAIL_ACCOUNTS illisible ({e}): repli sur MAIL_USER")
+    return [MailAccount((MAIL_USER or "default").lower(), MAIL_USER, MAIL_PASS)]
+
+
+ACCOUNTS = load_accounts()
+PRIMARY_ACCOUNT = ACCOUNTS[0]
+
+
+def get_account(name: Optional[str] = None) -> MailAccount:
+    """Compte par nom ou par tag stocke en base (None ou inconnu: compte principal)"""
+    for account in ACCOUNTS:
+        if name in (account.name, account.tag):
+            return account
+    return PRIMARY_ACCOUNT
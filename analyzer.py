@@ -10,6 +10,7 @@ from typing import List, Dict, Any, Optional
 from anthropic import Anthropic
 from dotenv import load_dotenv
 from PIL import Image
+from attachments import Attachment
 
 load_dotenv()
 
@@ -18,12 +19,11 @@ client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 MAX_IMAGE_SIZE = 4 * 1024 * 1024  # 4 MB (marge sous les 5 MB de Claude)
 
 
-def compress_image_if_needed(b64_data: str, media_type: str) -> tuple:
-    raw_size = len(base64.b64decode(b64_data))
-    if raw_size <= MAX_IMAGE_SIZE:
-        return b64_data, media_type
+def compress_image_if_needed(img_bytes, media_type: str) -> tuple:
+    """Octets bruts -> (base64 pour l'API, type): seul endroit ou l'image est encodee"""
+    if len(img_bytes) <= MAX_IMAGE_SIZE:
+        return base64.b64encode(img_bytes).decode('utf-8'), media_type
     try:
-        img_bytes = base64.b64decode(b64_data)
         img = Image.open(io.BytesIO(img_bytes))
         if img.mode in ('RGBA', 'P'):
             img = img.convert('RGB')
@@ -50,12 +50,12 @@ def compress_image_if_needed(b64_data: str, media_type: str) -> tuple:
                 return base64.b64encode(buffer.getvalue()).decode('utf-8'), 'image/jpeg'
     except Exception as e:
         print(f"Erreur compression: {e}")
-        return b64_data, media_type
+        return base64.b64encode(img_bytes).decode('utf-8'), media_type
 
 
-def detect_image_type(b64_data: str) -> Optional[str]:
+def detect_image_type(raw: bytes) -> Optional[str]:
+    """Type reel d'apres les premiers octets (magic numbers)"""
     try:
-        raw = base64.b64decode(b64_data[:32])
         if raw[0] == 0xFF and raw[1] == 0xD8 and raw[2] == 0xFF:
             return 'image/jpeg'
         if raw[0] == 0x89 and raw[1] == 0x50 and raw[2] == 0x4E and raw[3] == 0x47:
@@ -79,44 +79,20 @@ def analyze_coaching_bilan(current_email, conversation_history, client_name=""):
     all_pdfs = []
     
     # Photos de l'email actuel
-    photos = [att for att in current_email.get("attachments", []) if att.get("content_type", "").startswith("image/")]
-    pdfs = [att for att in current_email.get("attachments", []) if "pdf" in att.get("content_type", "").lower()]
-    all_photos.extend(photos)
-    all_pdfs.extend(pdfs)
+    current_attachments = [att for att in current_email.get("attachments", []) if isinstance(att, Attachment)]
+    all_photos.extend(att for att in current_attachments if att.is_image)
+    all_pdfs.extend(att for att in current_attachments if att.is_pdf)
     
-    # Photos de TOUT l'historique
+    # Photos de TOUT l'historique: references aux fichiers, rien n'est lu ici
     for hist_email in conversation_history:
         if not isinstance(hist_email, dict):
             continue
-        hist_attachments = hist_email.get("attachments", [])
-        for att in hist_attachments:
-            if isinstance(att, dict):
-                content_type = att.get("content_type", "")
-                if content_type.startswith("image/"):
-                    # Charger l'image depuis le filepath si disponible
-                    filepath = att.get("filepath")
-                    if filepath and os.path.exists(filepath):
-                        try:
-                            with open(filepath, "rb") as f:
-                                img_data = base64.b64encode(f.read()).decode('utf-8')
-                                all_photos.append({
-                                    "data": img_data,
-                                    "content_type": content_type,
-                                    "filename": att.get("filename", ""),
-                                    "from_email": hist_email.get("from_email", ""),
-                                    "date": hist_email.get("date")
-                                })
-                        except:
-                            pass
-                elif "pdf" in content_type.lower():
-                    filepath = att.get("filepath")
-                    if filepath and os.path.exists(filepath):
-                        all_pdfs.append({
-                            "filepath": filepath,
-                            "filename": att.get("filename", ""),
-                            "from_email": hist_email.get("from_email", ""),
-                            "date": hist_email.get("date")
-                        })
+        for att in hist_email.get("attachments", []):
+            if isinstance(att, Attachment) and att.available:
+                if att.is_image:
+                    all_photos.append(att)
+                elif att.is_pdf:
+                    all_pdfs.append(att)
     
     # Utiliser toutes les photos trouvées
     photos = all_photos
@@ -178,12 +154,12 @@ Reponds en JSON valide avec cette structure:
 
     VALID_IMAGE_TYPES = ["image/jpeg", "image/png", "image/gif", "image/webp"]
     images_added = 0
-    for att in current_email.get("attachments", []):
-        if att["content_type"].startswith("image/") and images_added < 5:
+    for att in current_attachments:
+        if att.is_image and images_added < 5:
             try:
-                real_type = detect_image_type(att["data"])
+                real_type = detect_image_type(att.head(32))
                 if real_type and real_type in VALID_IMAGE_TYPES:
-                    compressed_data, final_type = compress_image_if_needed(att["data"], real_type)
+                    compressed_data, final_type = compress_image_if_needed(att.read(), real_type)
                     content.append({
                         "type": "image",
                         "source": {"type": "base64", "media_type": final_type, "data": compressed_data}
@@ -361,7 +337,7 @@ def _build_history_context(history):
         attachments_info = ""
         atts = e.get('attachments', [])
         if atts:
-            att_names = [att.get('filename', '') for att in atts if isinstance(att, dict)]
+            att_names = [att.filename for att in atts if isinstance(att, Attachment) and att.filename]
             if att_names:
                 attachments_info = f"\n[PIECES JOINTES: {', '.join(att_names)}]"
         
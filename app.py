@@ -4,18 +4,23 @@ Version Database-First (CRM) - Monolithique
 """
 
 import streamlit as st
-import base64
 from datetime import datetime
-from email_reader import EmailReader
+from email_reader import EmailReader, IdleWatcher, ParallelFetcher, get_breaker, reserve_fetch_connections
+from accounts import ACCOUNTS, PRIMARY_ACCOUNT, get_account
+from async_reader import AsyncEmailReader
+from attachments import Attachment
 from analyzer import analyze_coaching_bilan, regenerate_email_draft
 from email_sender import send_email, preview_email
 from clients import get_client, save_client, get_jours_restants
+from exclusions import is_excluded
 from dashboard_generator import generate_client_dashboard
+from db_connection import get_connection
 import html
 import json
-import sqlite3
 import os
+from email.utils import parseaddr
 from typing import List, Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 import threading
 import time
 
@@ -24,16 +29,30 @@ import time
 # Chemin de la DB: toujours local maintenant
 DB_PATH = "coaching.db"
 ATTACHMENTS_DIR = "attachments"
+# Colonnes utiles a l'historique (vue, analyse IA): ni analysis_json ni client_key
+HISTORY_COLUMNS = ("message_id, client_email, subject, date, body, direction, is_bilan, body_loaded, "
+                   "imap_uid, imap_folder, answered, account")
+
+def client_key(address: Optional[str]) -> str:
+    """Cle de recherche d'un client: adresse seule en minuscules ("Nom <X@Y.com>" -> "x@y.com")"""
+    if not address:
+        return ''
+    _, addr = parseaddr(str(address))
+    return (addr or str(address)).strip().lower()
 
 class DatabaseManager:
+    _known_ids = None  # Message-IDs deja en base, partages par toutes les instances du process
+    _known_lock = threading.Lock()
+
     def __init__(self):
         self._init_db()
         self._init_dirs()
+        self._warm_known_ids()
 
     def _init_db(self):
         """Cree les tables si elles n'existent pas"""
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_connection(DB_PATH)
             c = conn.cursor()
             
             # Table Clients
@@ -70,6 +89,34 @@ class DatabaseManager:
                 c.execute("ALTER TABLE emails ADD COLUMN body_loaded BOOLEAN DEFAULT 0")
             except:
                 pass  # Colonne existe deja
+
+            try:
+                c.execute("ALTER TABLE emails ADD COLUMN answered BOOLEAN DEFAULT 0")
+            except:
+                pass  # Colonne existe deja
+
+            try:
+                c.execute("ALTER TABLE emails ADD COLUMN imap_folder TEXT")  # NULL = INBOX
+            except:
+                pass  # Colonne existe deja
+
+            try:
+                c.execute("ALTER TABLE emails ADD COLUMN account TEXT")  # boite du coach (MAIL_ACCOUNTS)
+            except:
+                pass  # Colonne existe deja
+            # Emails d'avant le multi-comptes: compte principal
+            c.execute("UPDATE emails SET account = ? WHERE account IS NULL", (PRIMARY_ACCOUNT.tag,))
+
+            try:
+                c.execute("ALTER TABLE emails ADD COLUMN client_key TEXT")  # client_email normalise (recherche indexee)
+            except:
+                pass  # Colonne existe deja
+            c.execute("CREATE INDEX IF NOT EXISTS idx_emails_client_date ON emails(client_key, date)")
+            # Migration unique: les emails d'avant la colonne (ensuite l'index ne trouve plus aucun NULL)
+            conn.create_function("normalize_client", 1, client_key, deterministic=True)
+            c.execute("UPDATE emails SET client_key = normalize_client(client_email) WHERE client_key IS NULL")
+            if c.rowcount > 0:
+                print(f"[DB] Migration client_key: {c.rowcount} emails indexes")
                         
             # Table Attachments
             c.execute('''CREATE TABLE IF NOT EXISTS attachments
@@ -79,10 +126,59 @@ class DatabaseManager:
                         filepath TEXT,
                         content_type TEXT,
                         FOREIGN KEY(message_id) REFERENCES emails(message_id))''')
-                        
+            c.execute("CREATE INDEX IF NOT EXISTS idx_attachments_message ON attachments(message_id)")
+
+            # Table Checkpoints de synchro IMAP (un par dossier)
+            c.execute('''CREATE TABLE IF NOT EXISTS sync_state
+                        (folder TEXT PRIMARY KEY,
+                        uidvalidity INTEGER,
+                        last_uid INTEGER, -- plus grand UID deja vu
+                        highestmodseq INTEGER, -- CONDSTORE
+                        message_count INTEGER, -- EXISTS au dernier passage
+                        updated_at TIMESTAMP)''')
+
+            # Table Progression du backfill historique (reprise apres crash / redemarrage Render)
+            c.execute('''CREATE TABLE IF NOT EXISTS backfill_state
+                        (folder TEXT PRIMARY KEY,
+                        uidvalidity INTEGER,
+                        next_uid INTEGER, -- prochaine tranche a traiter
+                        uidnext INTEGER, -- borne haute au lancement
+                        saved INTEGER DEFAULT 0,
+                        done BOOLEAN DEFAULT 0,
+                        updated_at TIMESTAMP)''')
+
+            # Table Backfill a la demande par client (jamais rejoue une fois termine)
+            c.execute('''CREATE TABLE IF NOT EXISTS client_backfill
+                        (client_email TEXT PRIMARY KEY,
+                        saved INTEGER DEFAULT 0,
+                        done BOOLEAN DEFAULT 0,
+                        updated_at TIMESTAMP)''')
+
+            # Migration: emails et checkpoints tagues par le nom du compte (perdus au renommage) -> adresse de la boite
+            for account in ACCOUNTS:
+                if account.name == account.tag:
+                    continue
+                c.execute("UPDATE emails SET account = ? WHERE account = ?", (account.tag, account.name))
+                moved = c.rowcount
+                for table, column in (("sync_state", "folder"), ("backfill_state", "folder"),
+                                      ("client_backfill", "client_email")):
+                    c.execute(f"""UPDATE OR IGNORE {table} SET {column} = ? || substr({column}, ?)
+                                  WHERE substr({column}, 1, ?) = ?""",
+                              (account.tag + ':', len(account.name) + 2, len(account.name) + 1, account.name + ':'))
+                if moved > 0:
+                    print(f"[DB] Migration compte {account.name}: {moved} emails tagues {account.tag}")
+            tags = [account.tag for account in ACCOUNTS]
+            orphans = c.execute(f"""SELECT account, COUNT(*) FROM emails WHERE account NOT IN ({','.join('?' * len(tags))})
+                                    GROUP BY account""", tags).fetchall()
+            for tag, count in orphans:
+                print(f"[DB] {count} emails tagues '{tag}', compte absent de la config (renomme avant la migration ?)")
+
             conn.commit()
-            conn.close()
         except Exception as e:
+            try:
+                get_connection(DB_PATH).rollback()  # connexion partagee: pas de transaction laissee ouverte
+            except Exception:
+                pass
             st.error(f"Erreur init DB: {e}")
 
     def _init_dirs(self):
@@ -92,31 +188,97 @@ class DatabaseManager:
         except:
             pass
 
+    def _warm_known_ids(self):
+        """Charge une fois par process tous les Message-IDs (une requete): la deduplication se fait ensuite en memoire
+        Les emails ne sont jamais supprimes de la base: un Message-ID du set existe forcement en DB"""
+        with DatabaseManager._known_lock:
+            if DatabaseManager._known_ids is not None:
+                return
+            try:
+                ids = {row[0] for row in get_connection(DB_PATH).execute("SELECT message_id FROM emails")}
+            except Exception as e:
+                print(f"[DB] Erreur chargement Message-IDs: {e}")
+                ids = set()
+            DatabaseManager._known_ids = ids
+        print(f"[DB] {len(ids)} Message-IDs en memoire pour la deduplication")
+
+    def _remember_ids(self, message_ids):
+        """Ajoute au set les Message-IDs inseres (apres commit uniquement)"""
+        with DatabaseManager._known_lock:
+            if DatabaseManager._known_ids is not None:
+                DatabaseManager._known_ids.update(str(m) for m in message_ids if m)
+
+    def get_new_message_ids(self, message_ids) -> set:
+        """Sous-ensemble des Message-IDs absents de la base, pour tout un lot
+        Set en memoire d'abord; seuls les inconnus sont verifies en base (ecrits par un autre process),
+        en une requete par tranche de 500"""
+        wanted = {str(m) for m in message_ids if m}
+        with DatabaseManager._known_lock:
+            unknown = wanted - (DatabaseManager._known_ids or set())
+        if not unknown:
+            return set()
+        found = set()
+        try:
+            conn = get_connection(DB_PATH)
+            pending = list(unknown)
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                rows = conn.execute(f"SELECT message_id FROM emails WHERE message_id IN ({','.join('?' * len(chunk))})",
+                                    chunk)
+                found.update(row[0] for row in rows)
+        except Exception as e:
+            print(f"[DB] Erreur get_new_message_ids: {e}")
+        self._remember_ids(found)
+        return unknown - found
+
     def get_client(self, email: str) -> Optional[Dict]:
         """Recupere infos client"""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM clients WHERE email = ?", (email,))
-            row = c.fetchone()
-            conn.close()
+            row = get_connection(DB_PATH).execute("SELECT * FROM clients WHERE email = ?", (email,)).fetchone()
             return dict(row) if row else None
         except:
             return None
 
     def save_client(self, email: str, nom: str = "", objectif: str = "", date_debut: str = "", duree: int = 12):
         """Sauvegarde/Update client"""
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""INSERT OR REPLACE INTO clients (email, nom, objectif, date_debut, duree_semaines, last_updated)
-                     VALUES (?, ?, ?, ?, ?, ?)""",
-                  (email, nom, objectif, date_debut, duree, datetime.now()))
-        conn.commit()
-        conn.close()
+        conn = get_connection(DB_PATH)
+        with conn:
+            conn.execute("""INSERT OR REPLACE INTO clients (email, nom, objectif, date_debut, duree_semaines, last_updated)
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                         (email, nom, objectif, date_debut, duree, datetime.now()))
 
     def save_email(self, email_data: Dict) -> bool:
         """Sauvegarde un email et ses pieces jointes"""
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:  # commit, ou rollback si exception
+                saved = self._insert_email(conn.cursor(), email_data)
+            if saved:
+                self._remember_ids([email_data.get('message_id') or email_data.get('id')])
+            return saved
+        except Exception as e:
+            print(f"[DB] Erreur save_email: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def save_emails(self, emails: List[Dict]) -> int:
+        """Sauvegarde un lot d'emails en UNE transaction (backfill); les emails deja en base sont conserves"""
+        if not emails:
+            return 0
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                c = conn.cursor()
+                inserted = [email_data for email_data in emails if self._insert_email(c, email_data, replace=False)]
+            self._remember_ids(e.get('message_id') or e.get('id') for e in inserted)
+            return len(inserted)
+        except Exception as e:
+            print(f"[DB] Erreur save_emails: {e}")
+            return 0
+
+    def _insert_email(self, c, email_data: Dict, replace: bool = True) -> bool:
+        """Insere un email et ses pieces jointes (curseur fourni, commit par l'appelant)"""
         
         # Validation: email_data doit etre un dict
         if not isinstance(email_data, dict):
@@ -131,255 +293,376 @@ class DatabaseManager:
         
         message_id = str(message_id)
         
-        # FILTRE: Ignorer les emails inutiles (spam coaching)
-        EXCLUDE_PATTERNS = [
-            'typeform', 'followup', 'newsletter', 'noreply', 'no-reply', 
-            'stripe', 'paypal', 'billing', 'invoice', 'facture', 'recu', 'receipt',
-            'confirmation', 'commande', 'order', 'shipping', 'livraison',
-            'publicite', 'promo', 'soldes', 'unsubscribe', 'desinscription',
-            'linkedin', 'instagram', 'facebook', 'twitter', 'youtube', 'pinterest',
-            'notification', 'alert', 'security', 'securite', 'connexion', 'login'
-        ]
-        
-        subject = email_data.get('subject', '').lower()
-        sender = email_data.get('from_email', '').lower()
-        
-        if any(p in subject for p in EXCLUDE_PATTERNS) or any(p in sender for p in EXCLUDE_PATTERNS):
+        # FILTRE: Ignorer les emails inutiles (spam coaching), le serveur n'exclut que les expediteurs techniques
+        if is_excluded(email_data.get('subject', ''), email_data.get('from_email', '')):
             return False
             
-        conn = None
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            
-            # 1. Sauvegarder l'email
-            date_val = email_data.get('date', datetime.now())
-            if isinstance(date_val, datetime):
-                date_val = date_val.isoformat()
-            elif isinstance(date_val, str):
-                pass  # Deja string
-            else:
-                date_val = datetime.now().isoformat()
-            
-            # Determiner client_email
-            direction = email_data.get('direction', 'received')
-            if direction == 'received':
-                client_email = email_data.get('from_email', '')
-            else:
-                client_email = email_data.get('to_email', '')
-            
-            subject = email_data.get('subject', 'Sans sujet')
-            body = email_data.get('body', '')
-            is_bilan = email_data.get('is_potential_bilan', False)
+        # 1. Sauvegarder l'email
+        date_val = email_data.get('date', datetime.now())
+        if isinstance(date_val, datetime):
+            date_val = date_val.isoformat()
+        elif isinstance(date_val, str):
+            pass  # Deja string
+        else:
+            date_val = datetime.now().isoformat()
+        
+        # Determiner client_email
+        direction = email_data.get('direction', 'received')
+        if direction == 'received':
+            client_email = email_data.get('from_email', '')
+        else:
+            client_email = email_data.get('to_email', '')
+        
+        subject = email_data.get('subject', 'Sans sujet')
+        body = email_data.get('body', '')
+        is_bilan = email_data.get('is_potential_bilan', False)
+        
+        analysis_json = None
+        if email_data.get('analysis'):
+            try:
+                analysis_json = json.dumps(email_data.get('analysis', {}))
+            except:
+                pass
             
-            analysis_json = None
-            if email_data.get('analysis'):
-                try:
-                    analysis_json = json.dumps(email_data.get('analysis', {}))
-                except:
-                    pass
+        # Determiner si le body est charge
+        body_loaded = 1 if body else 0
+        imap_uid = email_data.get('id', '')  # ID IMAP (UID) pour charger a la demande
+        imap_folder = email_data.get('folder')  # UID relatif a ce dossier (None = INBOX)
+        answered = 1 if email_data.get('answered') else 0
+        account = email_data.get('account') or PRIMARY_ACCOUNT.tag  # UID relatif a cette boite
+        
+        c.execute(f"""INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO emails 
+                     (message_id, client_email, client_key, subject, date, body, direction, is_bilan, analysis_json, body_loaded, imap_uid, imap_folder, answered, account)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                  (message_id, client_email, client_key(client_email), subject, date_val, body, direction, is_bilan, analysis_json, body_loaded, imap_uid, imap_folder, answered, account))
+        if c.rowcount == 0:
+            return False  # Deja en base (INSERT OR IGNORE)
+        
+        # Si body_loaded = 0, on ne sauvegarde pas les attachments (on les chargera a la demande)
+        if body_loaded == 0:
+            return True
+        
+        # 2. Sauvegarder les pieces jointes (les octets sont liberes une fois sur disque)
+        self._save_attachments(c, message_id, email_data.get('attachments', []))
+        return True
+
+    def _save_attachments(self, c, message_id: str, attachments: List[Attachment]):
+        """Ecrit les octets bruts sur disque et les reference en base (curseur fourni)
+        Chaque Attachment pointe ensuite sur son fichier: plus de copie en memoire"""
+        for att in attachments or []:
+            if not isinstance(att, Attachment):
+                continue
                 
-            # Determiner si le body est charge
-            body_loaded = 1 if body else 0
-            imap_uid = email_data.get('id', '')  # ID IMAP (UID) pour charger a la demande
-            
-            c.execute("""INSERT OR REPLACE INTO emails 
-                         (message_id, client_email, subject, date, body, direction, is_bilan, analysis_json, body_loaded, imap_uid)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                      (message_id, client_email, subject, date_val, body, direction, is_bilan, analysis_json, body_loaded, imap_uid))
-            
-            conn.commit()  # FORCER le commit immédiatement
-            
-            # Si body_loaded = 0, on ne sauvegarde pas les attachments (on les chargera a la demande)
-            if body_loaded == 0:
-                return True
-            
-            # 2. Sauvegarder les pieces jointes
-            for att in email_data.get('attachments', []):
-                if not isinstance(att, dict):
-                    continue
-                    
-                filename = att.get('filename', 'unknown')
-                if not filename:
-                    continue
-                    
-                safe_filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in '._- ']).strip()
-                if not safe_filename:
-                    safe_filename = "attachment"
-                    
-                file_path = os.path.join(ATTACHMENTS_DIR, f"{message_id}_{safe_filename}")
+            filename = att.filename or 'unknown'
                 
-                if 'data' in att and att['data']:
-                    if not os.path.exists(file_path):
-                        try:
-                            decoded_data = base64.b64decode(att['data'])
-                            with open(file_path, "wb") as f:
-                                f.write(decoded_data)
-                        except Exception as e:
-                            print(f"[DB] Erreur sauvegarde PJ {filename}: {e}")
-                    
-                    # Liberer memoire
-                    att['data'] = None
+            safe_filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in '._- ']).strip()
+            if not safe_filename:
+                safe_filename = "attachment"
                 
-                content_type = att.get('content_type', 'application/octet-stream')
-                try:
-                    c.execute("""INSERT OR IGNORE INTO attachments (message_id, filename, filepath, content_type)
-                                 VALUES (?, ?, ?, ?)""",
-                              (message_id, filename, file_path, content_type))
-                except Exception as e:
-                    print(f"[DB] Erreur insertion PJ: {e}")
-                    continue
+            file_path = os.path.join(ATTACHMENTS_DIR, f"{message_id}_{safe_filename}")
             
-            conn.commit()
+            try:
+                att.save(file_path)
+            except Exception as e:
+                print(f"[DB] Erreur sauvegarde PJ {filename}: {e}")
             
-            # Nettoyage memoire
-            if 'attachments' in email_data:
-                for att in email_data['attachments']:
-                    if isinstance(att, dict) and 'data' in att:
-                        att['data'] = None
-                        
-            return True
-        except Exception as e:
-            print(f"[DB] Erreur save_email: {e}")
-            import traceback
-            traceback.print_exc()
-            if conn:
-                try:
-                    conn.rollback()
-                except:
-                    pass
-            return False
-        finally:
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
+            try:
+                c.execute("""INSERT OR IGNORE INTO attachments (message_id, filename, filepath, content_type)
+                             VALUES (?, ?, ?, ?)""",
+                          (message_id, filename, file_path, att.content_type))
+            except Exception as e:
+                print(f"[DB] Erreur insertion PJ: {e}")
+                continue
 
     def get_client_history(self, client_email: str, limit: int = None, load_attachments: bool = False) -> List[Dict]:
-        """Recupere TOUT l'historique d'un client depuis la DB avec toutes les pièces jointes"""
-        conn = None
+        """Recupere TOUT l'historique d'un client depuis la DB (du plus ancien au plus recent) avec ses pièces jointes
+        Deux requetes ensemblistes: les emails via l'index (client_key, date), puis toutes leurs pieces jointes,
+        regroupees en une passe. Les fichiers ne sont verifies qu'a la lecture (analyse IA)."""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            
-            # Recherche flexible (contient) - SANS LIMITE pour avoir tout depuis le début
-            if client_email and client_email.strip():
-                if limit:
-                    c.execute(f"""SELECT * FROM emails 
-                                WHERE client_email LIKE ? OR client_email LIKE ?
-                                ORDER BY date DESC LIMIT ?""", (f"%{client_email}%", client_email, limit))
-                else:
-                    # PAS DE LIMITE - TOUT depuis le début
-                    c.execute(f"""SELECT * FROM emails 
-                                WHERE client_email LIKE ? OR client_email LIKE ?
-                                ORDER BY date DESC""", (f"%{client_email}%", client_email))
-            else:
-                if limit:
-                    c.execute(f"SELECT * FROM emails ORDER BY date DESC LIMIT ?", (limit,))
-                else:
-                    c.execute(f"SELECT * FROM emails ORDER BY date DESC")
+            conn = get_connection(DB_PATH)
 
-            rows = c.fetchall()
+            # Recherche par cle normalisee: index (client_key, date), deja trie - SANS LIMITE pour avoir tout depuis le début
+            key = client_key(client_email)
+            where, params = ("WHERE client_key = ?", [key]) if key else ("", [])
+            order = "ORDER BY date DESC" + (" LIMIT ?" if limit else "")
+            if limit:
+                params.append(limit)
+            rows = conn.execute(f"SELECT {HISTORY_COLUMNS} FROM emails {where} {order}", params).fetchall()
             print(f"[DB] get_client_history: {len(rows)} emails trouvés (TOUT depuis le début)")
-            
+
             history = []
-            for row in rows:
+            attachments_by_id = {}
+            for row in reversed(rows):  # SQL trie du plus recent au plus ancien: l'historique se lit dans l'autre sens
+                email_dict = dict(row)
                 try:
-                    email_dict = dict(row)
-                    
-                    # Parse date
-                    try:
-                        if email_dict.get('date'):
-                            email_dict['date'] = datetime.fromisoformat(email_dict['date'])
-                        else:
-                            email_dict['date'] = datetime.now()
-                    except:
-                        email_dict['date'] = datetime.now()
-                    
-                    # CHARGER les attachments si demandé (pour l'analyse IA complète)
-                    email_dict['body_loaded'] = email_dict.get('body_loaded', 0)
-                    email_dict['imap_uid'] = email_dict.get('imap_uid', '')
-                    
-                    if load_attachments:
-                        # Charger les attachments depuis la DB
-                        message_id = email_dict.get('message_id')
-                        if message_id:
-                            c.execute("SELECT filename, filepath FROM attachments WHERE message_id = ?", (message_id,))
-                            attachments = []
-                            for att_row in c.fetchall():
-                                att_dict = dict(att_row)
-                                # Vérifier que le fichier existe
-                                if att_dict.get('filepath') and os.path.exists(att_dict['filepath']):
-                                    attachments.append({
-                                        'filename': att_dict.get('filename', ''),
-                                        'filepath': att_dict.get('filepath', ''),
-                                        'exists': True
-                                    })
-                            email_dict['attachments'] = attachments
-                        else:
-                            email_dict['attachments'] = []
-                    else:
-                        email_dict['attachments'] = []
-                    
-                    history.append(email_dict)
-                except Exception as e:
-                    print(f"[DB] Erreur parsing email: {e}")
-                    continue
-            
-            # Tri final par date (du plus ancien au plus récent pour le contexte)
-            try:
-                history.sort(key=lambda x: x.get('date', datetime.min) if isinstance(x.get('date'), datetime) else datetime.min)
-            except:
-                pass
-                
-            print(f"[DB] Historique complet chargé: {len(history)} emails avec {sum(len(e.get('attachments', [])) for e in history)} pièces jointes")
+                    email_dict['date'] = datetime.fromisoformat(email_dict['date']) if email_dict.get('date') else datetime.now()
+                except (TypeError, ValueError):
+                    email_dict['date'] = datetime.now()
+                email_dict['attachments'] = attachments_by_id[email_dict['message_id']] = []
+                history.append(email_dict)
+
+            # CHARGER les attachments si demandé (pour l'analyse IA complète): une requete pour tout l'historique
+            if load_attachments and history:
+                for att_row in conn.execute(f"""SELECT message_id, filename, filepath, content_type FROM attachments
+                                               WHERE message_id IN (SELECT message_id FROM emails {where} {order})
+                                               ORDER BY id""", params):
+                    target = attachments_by_id.get(att_row[0])
+                    if target is not None:
+                        # Fichier lu seulement si l'analyse en a besoin
+                        target.append(Attachment(att_row[1] or '', att_row[3], filepath=att_row[2]))
+
+            print(f"[DB] Historique complet chargé: {len(history)} emails avec {sum(len(e['attachments']) for e in history)} pièces jointes")
             return history
         except Exception as e:
             print(f"[DB] Erreur get_client_history: {e}")
             import traceback
             traceback.print_exc()
             return []
-        finally:
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
 
     def email_exists(self, message_id: str) -> bool:
-        """Verifie si un email est deja en base"""
+        """Verifie si un email est deja en base (pour un lot: get_new_message_ids)"""
         if not message_id:
             return False
-            
-        conn = None
+        return not self.get_new_message_ids([message_id])
+
+    def get_pending_emails(self, limit: int = 50) -> List[Dict]:
+        """Derniers emails recus sans reponse (liste de l'interface, a chaque rerun)"""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT 1 FROM emails WHERE message_id = ?", (str(message_id),))
-            exists = c.fetchone() is not None
-            return exists
+            rows = get_connection(DB_PATH).execute("""SELECT * FROM emails
+                         WHERE COALESCE(answered, 0) = 0 AND COALESCE(direction, 'received') = 'received'
+                         ORDER BY date DESC LIMIT ?""", (limit,))
+            return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"[DB] Erreur get_pending_emails: {e}")
+            return []
+
+    def get_unloaded_emails(self, limit: int = 20, account: str = None) -> List[Dict]:
+        """Emails en attente d'un compte dont le contenu n'est pas encore telecharge (pour le prechargement)"""
+        try:
+            rows = get_connection(DB_PATH).execute("""SELECT message_id, imap_uid, imap_folder FROM emails
+                         WHERE COALESCE(body_loaded, 0) = 0 AND COALESCE(answered, 0) = 0
+                         AND imap_uid IS NOT NULL AND imap_uid != '' AND account = ?
+                         ORDER BY date DESC LIMIT ?""", (account or PRIMARY_ACCOUNT.tag, limit))
+            return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"[DB] Erreur get_unloaded_emails: {e}")
+            return []
+
+    def save_email_content(self, message_id: str, body: str, attachments: List[Attachment]) -> bool:
+        """Complete un email deja synchronise (headers) avec son corps et ses pieces jointes"""
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                c = conn.cursor()
+                c.execute("UPDATE emails SET body = ?, body_loaded = 1 WHERE message_id = ?", (body, message_id))
+                c.execute("SELECT 1 FROM attachments WHERE message_id = ? LIMIT 1", (message_id,))
+                if c.fetchone() is None:
+                    self._save_attachments(c, message_id, attachments)
+            return True
         except Exception as e:
-            print(f"[DB] Erreur email_exists: {e}")
+            print(f"[DB] Erreur save_email_content: {e}")
             return False
-        finally:
-            if conn:
+
+    def get_attachments(self, message_id: str, with_data: bool = False) -> List[Attachment]:
+        """Pieces jointes d'un email depuis la DB (with_data: octets charges en memoire, sinon lus a la demande)"""
+        try:
+            rows = get_connection(DB_PATH).execute("SELECT filename, filepath, content_type FROM attachments WHERE message_id = ?",
+                                                   (message_id,)).fetchall()
+        except Exception as e:
+            print(f"[DB] Erreur get_attachments: {e}")
+            return []
+        attachments = []
+        for row in rows:
+            att = Attachment(row['filename'] or '', row['content_type'], filepath=row['filepath'])
+            if not att.available:
+                continue
+            if with_data:
                 try:
-                    conn.close()
-                except:
-                    pass
+                    att.data = att.read()
+                except Exception as e:
+                    print(f"[DB] Erreur lecture PJ {att.filepath}: {e}")
+                    continue
+            attachments.append(att)
+        return attachments
+
+    def _state_key(self, folder: str, account: str = None) -> str:
+        """Cle des checkpoints par dossier: "tag:dossier" hors compte principal (cles historiques inchangees)"""
+        if not account or account == PRIMARY_ACCOUNT.tag:
+            return folder
+        return f"{account}:{folder}"
+
+    def get_sync_state(self, folder: str = "INBOX", account: str = None) -> Optional[Dict]:
+        """Recupere le checkpoint de synchro d'un dossier"""
+        try:
+            row = get_connection(DB_PATH).execute("SELECT * FROM sync_state WHERE folder = ?",
+                                                  (self._state_key(folder, account),)).fetchone()
+            if not row:
+                return None
+            return {"uidvalidity": row["uidvalidity"], "last_uid": row["last_uid"],
+                    "highestmodseq": row["highestmodseq"], "exists": row["message_count"]}
+        except Exception as e:
+            print(f"[DB] Erreur get_sync_state: {e}")
+            return None
+
+    def save_sync_state(self, folder: str, checkpoint: Dict, account: str = None):
+        """Sauvegarde le checkpoint de synchro d'un dossier"""
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                conn.execute("""INSERT OR REPLACE INTO sync_state
+                                (folder, uidvalidity, last_uid, highestmodseq, message_count, updated_at)
+                                VALUES (?, ?, ?, ?, ?, ?)""",
+                             (self._state_key(folder, account), checkpoint.get('uidvalidity'), checkpoint.get('last_uid'),
+                              checkpoint.get('highestmodseq'), checkpoint.get('exists'), datetime.now()))
+        except Exception as e:
+            print(f"[DB] Erreur save_sync_state: {e}")
+
+    def get_backfill_state(self, folder: str = "INBOX", account: str = None) -> Optional[Dict]:
+        """Recupere la progression du backfill d'un dossier"""
+        try:
+            row = get_connection(DB_PATH).execute("SELECT * FROM backfill_state WHERE folder = ?",
+                                                  (self._state_key(folder, account),)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"[DB] Erreur get_backfill_state: {e}")
+            return None
+
+    def _write_backfill_state(self, conn, folder: str, state: Dict, account: str = None):
+        conn.execute("""INSERT OR REPLACE INTO backfill_state
+                        (folder, uidvalidity, next_uid, uidnext, saved, done, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                     (self._state_key(folder, account), state.get('uidvalidity'), state.get('next_uid'),
+                      state.get('uidnext'), state.get('saved', 0), 1 if state.get('done') else 0, datetime.now()))
+
+    def save_backfill_state(self, folder: str, state: Dict, account: str = None):
+        """Sauvegarde la progression du backfill (apres chaque tranche)"""
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                self._write_backfill_state(conn, folder, state, account)
+        except Exception as e:
+            print(f"[DB] Erreur save_backfill_state: {e}")
+
+    def save_backfill_batch(self, emails: List[Dict], folder: str, state: Dict, account: str = None) -> Optional[Dict]:
+        """Sauvegarde un lot d'emails du backfill ET le checkpoint `state` en UNE transaction
+        Retourne le checkpoint ecrit (saved incremente des emails inseres), None si rien n'a ete ecrit"""
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                c = conn.cursor()
+                inserted = [email_data for email_data in emails if self._insert_email(c, email_data, replace=False)]
+                checkpoint = dict(state, saved=state.get('saved', 0) + len(inserted))
+                self._write_backfill_state(conn, folder, checkpoint, account)
+            self._remember_ids(e.get('message_id') or e.get('id') for e in inserted)
+            return checkpoint
+        except Exception as e:
+            print(f"[DB] Erreur save_backfill_batch: {e}")
+            return None
+
+    def get_client_backfill(self, client_email: str, account: str = None) -> Optional[Dict]:
+        """Etat du backfill a la demande d'un client dans la boite d'un compte (None si jamais lance)"""
+        try:
+            row = get_connection(DB_PATH).execute("SELECT * FROM client_backfill WHERE client_email = ?",
+                                                  (self._state_key((client_email or '').lower(), account),)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"[DB] Erreur get_client_backfill: {e}")
+            return None
+
+    def save_client_backfill(self, client_email: str, saved: int, done: bool = False, account: str = None):
+        """Progression du backfill d'un client dans la boite d'un compte (done = historique IMAP complet en base)"""
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                conn.execute("""INSERT OR REPLACE INTO client_backfill (client_email, saved, done, updated_at)
+                                VALUES (?, ?, ?, ?)""",
+                             (self._state_key((client_email or '').lower(), account), saved, 1 if done else 0, datetime.now()))
+        except Exception as e:
+            print(f"[DB] Erreur save_client_backfill: {e}")
+
+    def mark_answered(self, imap_uids: List[str], answered: bool = True, folder: str = "INBOX", account: str = None):
+        """Met a jour le flag \\Answered (repondu depuis Gmail ou depuis l'app)"""
+        if not imap_uids:
+            return
+        account = account or PRIMARY_ACCOUNT.tag
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                conn.executemany("""UPDATE emails SET answered = ? WHERE imap_uid = ? AND COALESCE(imap_folder, 'INBOX') = ?
+                                    AND account = ?""",
+                                 [(1 if answered else 0, str(uid), folder, account) for uid in imap_uids])
+        except Exception as e:
+            print(f"[DB] Erreur mark_answered: {e}")
+
+    def mark_email_answered(self, message_id: str):
+        """Marque un email comme traite par son Message-ID (reponse envoyee depuis l'app)"""
+        if not message_id:
+            return
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                conn.execute("UPDATE emails SET answered = 1 WHERE message_id = ?", (str(message_id),))
+        except Exception as e:
+            print(f"[DB] Erreur mark_email_answered: {e}")
+
+    def get_known_uids(self, folder: str = "INBOX", account: str = None) -> set:
+        """UIDs IMAP connus localement pour un dossier d'un compte"""
+        try:
+            rows = get_connection(DB_PATH).execute("""SELECT imap_uid FROM emails WHERE imap_uid IS NOT NULL AND imap_uid != ''
+                         AND COALESCE(imap_folder, 'INBOX') = ? AND account = ?""",
+                      (folder, account or PRIMARY_ACCOUNT.tag))
+            return {row[0] for row in rows}
+        except Exception as e:
+            print(f"[DB] Erreur get_known_uids: {e}")
+            return set()
+
+    def clear_vanished_uids(self, imap_uids: List[str], folder: str = "INBOX", account: str = None):
+        """Oublie les UIDs supprimes/archives cote serveur (l'email reste dans l'historique)"""
+        if not imap_uids:
+            return
+        account = account or PRIMARY_ACCOUNT.tag
+        try:
+            conn = get_connection(DB_PATH)
+            with conn:
+                conn.executemany("""UPDATE emails SET imap_uid = NULL WHERE imap_uid = ? AND COALESCE(imap_folder, 'INBOX') = ?
+                                    AND account = ?""",
+                                 [(str(uid), folder, account) for uid in imap_uids])
+        except Exception as e:
+            print(f"[DB] Erreur clear_vanished_uids: {e}")
 
 # --- FIN GESTION DB ---
 
-# Liste des patterns a exclure (spam, notifs, etc)
-EXCLUDE_PATTERNS = [
-    "typeform", "confirmation", "paiement", "payment", "commande", "order",
-    "noreply", "no-reply", "notification", "newsletter", "unsubscribe"
-]
+def make_reader(account=None) -> EmailReader:
+    """Lecteur de la session: IMAP_BACKEND=async pour les chargements sur la boucle asyncio"""
+    if os.getenv("IMAP_BACKEND", "sync") == "async":
+        return AsyncEmailReader(account=account)
+    return EmailReader(account=account)
+
+def reader_for(account_name: str = None) -> EmailReader:
+    """Lecteur de la session pour un compte: chaque boite a son propre pool IMAP"""
+    account = get_account(account_name)
+    if account is PRIMARY_ACCOUNT:
+        if st.session_state.get('reader') is None:
+            st.session_state.reader = make_reader()
+        return st.session_state.reader
+    if 'readers' not in st.session_state:
+        st.session_state.readers = {}
+    if account.name not in st.session_state.readers:
+        st.session_state.readers[account.name] = make_reader(account)
+    return st.session_state.readers[account.name]
+
+def configured_accounts():
+    """Comptes avec identifiants (les autres sont ignores par la synchro)"""
+    return [account for account in ACCOUNTS if account.configured]
 
 # --- CHARGEMENT EN ARRIÈRE-PLAN ---
 SYNC_STATS_FILE = "sync_stats.json"
+BACKFILL_CHUNK = int(os.getenv("BACKFILL_CHUNK", 100))  # UIDs par tranche
+BACKFILL_PAUSE = float(os.getenv("BACKFILL_PAUSE", 2))  # secondes minimum entre deux tranches
+BACKFILL_SAVE_BATCH = int(os.getenv("BACKFILL_SAVE_BATCH", 50))  # emails par transaction SQLite
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", 4))  # connexions de fetch des contenus (1 = sequentiel)
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 4))
+PREFETCH_PARALLEL_MIN = int(os.getenv("PREFETCH_PARALLEL_MIN", 10))  # en dessous: un FETCH sur la connexion deja ouverte
 
 def load_sync_stats():
     """Charge les stats depuis le fichier"""
@@ -406,6 +689,355 @@ def save_sync_stats(stats):
     except:
         pass
 
+def load_sync_changes(reader, db, folder: str = "INBOX", days: int = 7, max_emails: int = 50):
+    """Synchro incrementale: demande au serveur uniquement les changements depuis le checkpoint
+    Applique tout de suite les flags \\Answered et les UIDs disparus; l'appelant sauvegarde les
+    nouveaux emails puis le checkpoint (save_sync_checkpoint) une fois le lot traite.
+    """
+    account = reader.account.tag
+    changes = reader.sync_changes(db.get_sync_state(folder, account), folder=folder, days=days, max_emails=max_emails)
+    if changes is None:
+        return None
+    db.mark_answered(changes['answered'], answered=True, folder=folder, account=account)
+    db.mark_answered(changes['unanswered'], answered=False, folder=folder, account=account)
+    vanished = list(changes['vanished'])
+    if changes.get('present_uids') is not None:
+        last_uid = (db.get_sync_state(folder, account) or {}).get('last_uid') or 0
+        vanished += [uid for uid in db.get_known_uids(folder, account)
+                     if uid.isdigit() and int(uid) <= last_uid and uid not in changes['present_uids']]
+    db.clear_vanished_uids(vanished, folder, account)
+    mode = "complete" if changes['full_resync'] else "incrementale"
+    print(f"[SYNC] {account}: synchro {mode}: {len(changes['new'])} nouveaux, {len(changes['answered'])} repondus, "
+          f"{len(vanished)} disparus")
+    return changes
+
+def save_sync_checkpoint(db, changes: Dict, pending_ids, folder: str = "INBOX", account: str = None) -> bool:
+    """Enregistre le checkpoint seulement si tous les nouveaux emails `pending_ids` sont en base
+    Sinon l'ancien checkpoint est garde: la prochaine synchro redemande les memes UIDs et seuls les
+    emails manquants sont sauves (deduplication par Message-ID)."""
+    unsaved = db.get_new_message_ids(pending_ids)
+    if unsaved:
+        print(f"[SYNC] {account}: {len(unsaved)} nouveaux emails non sauvegardes, checkpoint conserve")
+        return False
+    db.save_sync_state(folder, changes['checkpoint'], account)
+    return True
+
+def sync_account(reader, db, days: int = 7, max_emails: int = 20) -> Dict:
+    """Synchro d'un compte: changements IMAP, headers des nouveaux emails en base, puis checkpoint
+    Le contenu complet est charge a la demande (ou par prefetch_email_bodies)"""
+    result = {'account': reader.account.name, 'found': 0, 'saved': 0, 'ignored': 0, 'errors': 0, 'error': None}
+    try:
+        changes = load_sync_changes(reader, db, days=days, max_emails=max_emails)
+    except Exception as e:
+        print(f"[SYNC] {reader.account.name}: erreur connexion: {e}")
+        result['error'] = str(e)
+        return result
+    if not changes:
+        result['error'] = "Connexion impossible"
+        return result
+    new_emails = changes['new'] if isinstance(changes.get('new'), list) else []
+    result['found'] = len(new_emails)
+    # Deduplication du lot entier en une fois (set en memoire + une requete pour les inconnus)
+    new_ids = db.get_new_message_ids(e.get('message_id') or e.get('id') for e in new_emails if isinstance(e, dict))
+    pending = []  # Message-IDs a sauver avant d'avancer le checkpoint
+    for email in new_emails:
+        try:
+            message_id = email.get('message_id') or email.get('id') if isinstance(email, dict) else None
+            if not message_id:
+                result['errors'] += 1
+                continue
+            # Filtre anti-spam AVANT tout traitement lourd
+            if is_excluded(email.get('subject', ''), email.get('from_email', '')):
+                result['ignored'] += 1
+                continue
+            if str(message_id) in new_ids:
+                pending.append(str(message_id))
+                # Headers seulement: le contenu complet sera charge a la demande
+                email['body'] = ''
+                email['attachments'] = []
+                if db.save_email(email):
+                    result['saved'] += 1
+                else:
+                    result['errors'] += 1
+        except Exception as e:
+            print(f"[SYNC] Erreur traitement email: {e}")
+            result['errors'] += 1
+    save_sync_checkpoint(db, changes, pending, account=reader.account.tag)
+    return result
+
+def sync_all_accounts(readers, db, days: int = 7, max_emails: int = 20) -> List[Dict]:
+    """Synchronise toutes les boites en parallele (un thread et un pool IMAP par compte)"""
+    if len(readers) == 1:
+        return [sync_account(readers[0], db, days=days, max_emails=max_emails)]
+    with ThreadPoolExecutor(max_workers=len(readers), thread_name_prefix="sync-account") as executor:
+        return list(executor.map(lambda reader: sync_account(reader, db, days=days, max_emails=max_emails), readers))
+
+def send_reply(reader, db, email_data: Dict, body: str) -> Dict:
+    """Envoie la reponse (SMTP) puis pose \\Answered sur l'UID d'origine et marque l'email traite en DB
+    Sans le flag serveur, le bilan reviendrait a chaque synchro (recherche UNANSWERED).
+    """
+    account = get_account(email_data.get('account'))  # repondre depuis la boite qui a recu le bilan
+    result = send_email(email_data.get('client_email') or email_data.get('from_email'), None, body,
+                        reply_to_message_id=email_data.get('message_id'),
+                        original_subject=email_data.get('subject'), account=account)
+    if not result.get('success'):
+        return result
+    folder = email_data.get('imap_folder') or "INBOX"
+    uid = email_data.get('imap_uid')
+    result['flagged'] = bool(reader and uid and reader.mark_answered(uid, folder=folder))
+    if uid:
+        db.mark_answered([uid], answered=True, folder=folder, account=account.tag)
+    db.mark_email_answered(email_data.get('message_id'))
+    print(f"[SYNC] Reponse envoyee a {email_data.get('client_email')} "
+          f"(\\Answered serveur: {'oui' if result['flagged'] else 'non'})")
+    return result
+
+def load_email_bodies(reader, db, rows: List[Dict]) -> int:
+    """Telecharge et sauve le contenu d'emails deja en base en headers seuls ({message_id, imap_uid, imap_folder})"""
+    # Un FETCH par dossier: les UIDs ne sont valables que dans leur dossier
+    by_folder = {}
+    for row in rows:
+        by_folder.setdefault(row.get('imap_folder') or "INBOX", {})[str(row['imap_uid'])] = row['message_id']
+    # Gros lot: reparti sur plusieurs connexions (les LOGIN supplementaires sont vite rentabilises)
+    fetcher = None
+    if len(rows) >= PREFETCH_PARALLEL_MIN and PREFETCH_WORKERS > 1:
+        fetcher = ParallelFetcher(reader, workers=PREFETCH_WORKERS,
+                                  chunk_size=max(1, -(-len(rows) // PREFETCH_WORKERS)))
+    loaded = 0
+    try:
+        for folder, by_uid in by_folder.items():
+            contents = (fetcher.iter_contents(list(by_uid), folder) if fetcher
+                        else reader.iter_email_contents(list(by_uid), folder=folder))
+            for result in contents:
+                if result.get('loaded') and db.save_email_content(by_uid[result['uid']], result['body'], result['attachments']):
+                    loaded += 1
+    finally:
+        if fetcher is not None:
+            fetcher.close()
+    return loaded
+
+def prefetch_email_bodies(reader, db, limit: int = 20) -> int:
+    """Precharge en UN seul FETCH le contenu des emails en attente (au lieu d'un login par clic)"""
+    pending = db.get_unloaded_emails(limit, account=reader.account.tag)
+    if not pending:
+        return 0
+    loaded = load_email_bodies(reader, db, pending)
+    print(f"[PREFETCH] {loaded}/{len(pending)} emails precharges")
+    return loaded
+
+@st.cache_resource
+def get_content_executor():
+    """Telechargements de contenus en arriere-plan (threads Gmail), partages entre les sessions Streamlit"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="thread-bodies")
+
+def load_email_thread(reader, db, email_data: Dict) -> Optional[Future]:
+    """Complete l'historique avec le thread Gmail de l'email (recus + nos reponses envoyees)
+    Une seule recherche X-GM-THRID; seuls les headers des emails absents de la DB sont sauves
+    (body_loaded=0), leurs contenus suivent en arriere-plan. Retourne le Future du telechargement
+    (nombre de contenus charges), None si le thread etait deja complet."""
+    thread = reader.get_thread(message_id=email_data.get('message_id'), uid=email_data.get('imap_uid'),
+                               folder=email_data.get('imap_folder') or "INBOX")
+    new_ids = db.get_new_message_ids(e['message_id'] for e in thread)
+    missing = [e for e in thread if str(e['message_id']) in new_ids]
+    if not missing:
+        return None
+    # Un email recu suivi d'une de nos reponses dans le thread est traite
+    for e in missing:
+        if e['direction'] == 'received' and any(r['direction'] == 'sent' and int(r['id']) > int(e['id']) for r in thread):
+            e['answered'] = True
+    saved = []
+    for e in missing:
+        e['body'] = ''
+        e['attachments'] = []
+        if db.save_email(e):
+            saved.append({'message_id': e['message_id'], 'imap_uid': e['id'], 'imap_folder': e.get('folder')})
+    print(f"[THREAD] {len(saved)}/{len(thread)} emails du thread ajoutes a l'historique (contenus en arriere-plan)")
+    if not saved:
+        return None
+    return get_content_executor().submit(load_email_bodies, reader, db, saved)
+
+def _save_backfill_batch(db, batch: List[Dict], folder: str, state: Dict, account: str) -> Dict:
+    """Lot + checkpoint en une transaction; leve une exception si l'ecriture echoue (tranche rejouee)"""
+    checkpoint = db.save_backfill_batch(batch, folder, state, account)
+    if checkpoint is None:
+        raise RuntimeError("lot non sauvegarde en base")
+    return checkpoint
+
+def run_backfill(reader, db, folder: str = "INBOX", chunk_size: int = BACKFILL_CHUNK, pause: float = BACKFILL_PAUSE,
+                 stop_event: threading.Event = None, workers: int = BACKFILL_WORKERS) -> Optional[Dict]:
+    """Backfill historique: parcourt le dossier par tranches fixes d'UIDs, du plus ancien au plus recent
+    Checkpoint apres chaque tranche: reprend la ou il s'etait arrete (crash, redemarrage Render).
+    Contenus de chaque tranche repartis sur `workers` connexions (ParallelFetcher)."""
+    account = reader.account.tag
+    status = reader.get_folder_status(folder)
+    if not status:
+        print(f"[BACKFILL] {folder} indisponible ({account})")
+        return None
+    state = db.get_backfill_state(folder, account)
+    if not state or state.get('uidvalidity') != status['uidvalidity']:
+        # Premier lancement ou UIDs renumerotes par le serveur: on repart du debut
+        state = {'uidvalidity': status['uidvalidity'], 'next_uid': 1, 'uidnext': status['uidnext'],
+                 'saved': 0, 'done': False}
+        db.save_backfill_state(folder, state, account)
+    elif state.get('done'):
+        return state
+
+    # Connexions du fetcher ouvertes une fois pour tout le backfill (prises dans le budget du compte)
+    fetcher = (ParallelFetcher(reader, workers=workers, chunk_size=max(1, chunk_size // (workers * 2)), folder=folder)
+               if workers > 1 else None)
+    try:
+        errors = 0
+        while state['next_uid'] < state['uidnext']:
+            if stop_event is not None and stop_event.is_set():
+                break
+            first_uid = state['next_uid']
+            last_uid = min(first_uid + chunk_size, state['uidnext']) - 1
+            start_time = time.time()
+            fetched = 0
+            interrupted = retry = False
+            emails = reader.fetch_uid_range(first_uid, last_uid, folder, unseen=db.get_new_message_ids, fetcher=fetcher)
+            try:
+                # Sauve par lots au fil du fetch: la tranche n'est jamais entierement en memoire
+                batch = []
+                for email_data in emails:
+                    fetched += 1
+                    batch.append(email_data)
+                    if stop_event is not None and stop_event.is_set():
+                        interrupted = True  # suspension: le lot recu est garde, la tranche sera reprise
+                        break
+                    if len(batch) >= BACKFILL_SAVE_BATCH:
+                        state = _save_backfill_batch(db, batch, folder, state, account)
+                        batch = []
+                # Dernier lot et checkpoint de la tranche dans la meme transaction
+                next_uid = state['next_uid'] if interrupted else last_uid + 1
+                state = _save_backfill_batch(db, batch, folder, dict(state, next_uid=next_uid), account)
+            except Exception as e:
+                errors += 1
+                print(f"[BACKFILL] Erreur tranche {first_uid}-{last_uid}: {e}")
+                if errors >= 3:
+                    break  # La prochaine execution reprendra a cette tranche (emails deja sauves ignores)
+                retry = True
+            finally:
+                emails.close()  # fetch abandonne en cours de route: connexions liberees tout de suite
+            if retry:
+                time.sleep(pause * 2 ** errors)
+                continue
+            errors = 0
+            if interrupted:
+                break
+            print(f"[BACKFILL] UIDs {first_uid}-{last_uid} / {state['uidnext'] - 1}: {fetched} emails "
+                  f"({state['saved']} au total)")
+            # Throttle: au moins `pause`, et jamais plus de la moitie du temps a solliciter Gmail
+            delay = max(pause, time.time() - start_time)
+            if stop_event is not None:
+                stop_event.wait(delay)  # une suspension demandee pendant la pause est prise en compte tout de suite
+            else:
+                time.sleep(delay)
+        else:
+            state['done'] = True
+            db.save_backfill_state(folder, state, account)
+            print(f"[BACKFILL] {folder} termine: {state['saved']} emails importes")
+            return state
+        if stop_event is not None and stop_event.is_set():
+            print(f"[BACKFILL] {folder} suspendu a l'UID {state['next_uid']} ({account})")
+        return state
+    finally:
+        if fetcher is not None:
+            fetcher.close()
+
+def run_on_own_reader(target, account, *args, **kwargs):
+    """Execute un backfill sur un lecteur dedie (une connexion IMAP), ferme a la fin
+    Sans ca, chaque backfill laisse une connexion au pool, entretenue par NOOP pour toujours:
+    au-dela de GMAIL_MAX_CONNECTIONS, les nouveaux LOGIN echouent et le circuit s'ouvre."""
+    reader = EmailReader(pool_size=1, account=account)
+    try:
+        return target(reader, DatabaseManager(), *args, **kwargs)
+    finally:
+        reader.pool.close()
+
+@st.cache_resource
+def get_backfill_runner(account_name: str = None):
+    """Un seul backfill par compte et par process (partage entre les sessions Streamlit)
+    "stop": suspension demandee depuis l'interface, valable jusqu'a la reprise ou au redemarrage"""
+    return {"thread": None, "stop": threading.Event()}
+
+def start_backfill(folder: str = "INBOX", account_name: str = None) -> bool:
+    """Lance (ou reprend) le backfill d'un compte en arriere-plan sur sa propre connexion IMAP"""
+    account = get_account(account_name)
+    runner = get_backfill_runner(account.name)
+    runner["stop"].clear()  # reprise: annule une suspension pas encore prise en compte
+    if runner["thread"] is not None and runner["thread"].is_alive():
+        return False
+    runner["thread"] = threading.Thread(target=run_on_own_reader, args=(run_backfill, account, folder),
+                                        kwargs={"stop_event": runner["stop"]}, daemon=True, name=f"backfill-{account.name}")
+    runner["thread"].start()
+    return True
+
+def stop_backfill(account_name: str = None) -> bool:
+    """Suspend le backfill d'un compte a la fin de la tranche en cours (checkpoint conserve)"""
+    runner = get_backfill_runner(get_account(account_name).name)
+    runner["stop"].set()
+    return runner["thread"] is not None and runner["thread"].is_alive()
+
+def backfill_paused(account_name: str = None) -> bool:
+    return get_backfill_runner(get_account(account_name).name)["stop"].is_set()
+
+CLIENT_BACKFILL_CHUNK = int(os.getenv("CLIENT_BACKFILL_CHUNK", 25))  # emails par lot (historique d'un client)
+
+def run_client_backfill(reader, db, client_email: str, chunk_size: int = CLIENT_BACKFILL_CHUNK) -> Optional[Dict]:
+    """Backfill a la demande d'un client: tout son historique All Mail (OR FROM x TO x), lot par lot
+    Chaque lot est en base des qu'il arrive (l'onglet historique se complete au fil de l'eau);
+    le client est marque backfille a la fin et n'est plus jamais relance."""
+    account = reader.account.tag
+    state = db.get_client_backfill(client_email, account) or {'saved': 0, 'done': False}
+    if state.get('done'):
+        return state
+    known = db.get_known_uids(reader.get_all_mail_folder(), account)
+    try:
+        for emails in reader.iter_client_history(client_email, known_uids=known, unseen=db.get_new_message_ids,
+                                                 chunk_size=chunk_size):
+            state['saved'] += db.save_emails(emails)
+            db.save_client_backfill(client_email, state['saved'], account=account)
+    except Exception as e:
+        print(f"[BACKFILL] Erreur historique {client_email}: {e}")
+        return state  # Relance a la prochaine ouverture du client
+    state['done'] = True
+    db.save_client_backfill(client_email, state['saved'], done=True, account=account)
+    print(f"[BACKFILL] Historique de {client_email} complet: {state['saved']} emails importes")
+    return state
+
+CLIENT_BACKFILL_WORKERS = int(os.getenv("CLIENT_BACKFILL_WORKERS", 2))  # historiques clients simultanes par compte
+
+@st.cache_resource
+def get_client_backfill_runner(account_name: str = None):
+    """Backfills clients d'un compte, partages entre les sessions Streamlit
+    Un seul lecteur (un pool IMAP) et un executor borne par compte, pris dans le budget de connexions
+    du compte: ouvrir plusieurs clients ne multiplie plus les LOGIN, les suivants attendent leur tour."""
+    account = get_account(account_name)
+    workers = max(1, reserve_fetch_connections(account, CLIENT_BACKFILL_WORKERS))
+    return {"reader": EmailReader(pool_size=workers, account=account), "db": DatabaseManager(),
+            "executor": ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"backfill-{account.name}-client"),
+            "futures": {}, "lock": threading.Lock()}
+
+def start_client_backfill(client_email: str, account_name: str = None) -> bool:
+    """Lance le backfill d'un client en arriere-plan sur la boite du compte (une seule fois par client, compte et process)"""
+    account = get_account(account_name)
+    if not client_email or not account.configured:
+        return False
+    runner = get_client_backfill_runner(account.name)
+    key = client_email.lower()
+    with runner["lock"]:
+        future = runner["futures"].get(key)
+        if future is not None and not future.done():
+            return False
+        runner["futures"][key] = runner["executor"].submit(run_client_backfill, runner["reader"], runner["db"], client_email)
+    return True
+
+def client_backfill_running(client_email: str, account_name: str = None) -> bool:
+    """Vrai tant que le backfill du client est en cours ou en attente d'un worker"""
+    future = get_client_backfill_runner(get_account(account_name).name)["futures"].get((client_email or '').lower())
+    return future is not None and not future.done()
+
 def background_sync_worker(reader, db):
     """Fonction pour charger les emails en arrière-plan (appelée dans un thread)
     Charge UNIQUEMENT les headers des 50 derniers emails non lus (TRÈS RAPIDE)
@@ -417,16 +1049,22 @@ def background_sync_worker(reader, db):
     save_sync_stats(stats)
     
     try:
-        # Charger UNIQUEMENT les headers des 50 derniers emails non lus (TRÈS RAPIDE)
-        unread_emails = reader.get_recent_emails(days=30, unread_only=True, max_emails=50)
+        # Synchro incrementale: seulement ce qui a change depuis le dernier checkpoint
+        changes = load_sync_changes(reader, db, days=30, max_emails=50)
+        unread_emails = changes['new'] if changes else None
         
         if not unread_emails or not isinstance(unread_emails, list):
+            if changes:
+                db.save_sync_state("INBOX", changes['checkpoint'], reader.account.tag)
             stats['is_running'] = False
             save_sync_stats(stats)
             return
         
         print(f"[BG SYNC] {len(unread_emails)} emails non lus trouvés - chargement headers uniquement")
         
+        new_ids = db.get_new_message_ids(e.get('message_id') or e.get('id') for e in unread_emails if isinstance(e, dict))
+        pending = []  # Message-IDs a sauver avant d'avancer le checkpoint
+        
         # Traiter chaque email non lu (seulement headers)
         for email in unread_emails:
             try:
@@ -438,18 +1076,19 @@ def background_sync_worker(reader, db):
                     continue
                 
                 # Filtre anti-spam
-                subject = email.get('subject', '').lower()
-                sender = email.get('from_email', '').lower()
-                if any(p in subject for p in EXCLUDE_PATTERNS) or any(p in sender for p in EXCLUDE_PATTERNS):
+                if is_excluded(email.get('subject', ''), email.get('from_email', '')):
                     stats['ignored'] += 1
                     continue
                 
                 # Sauvegarder UNIQUEMENT les headers (rapide, pas de body/attachments)
-                if not db.email_exists(str(message_id)):
+                if str(message_id) in new_ids:
+                    pending.append(str(message_id))
                     email['body'] = ''
                     email['attachments'] = []
                     if db.save_email(email):
                         stats['saved'] += 1
+                    else:
+                        stats['errors'] += 1
                 
                 stats['total_processed'] += 1
                 stats['last_update'] = datetime.now().isoformat()
@@ -461,6 +1100,8 @@ def background_sync_worker(reader, db):
         
         # Sauvegarder les stats une seule fois à la fin
         save_sync_stats(stats)
+        save_sync_checkpoint(db, changes, pending, account=reader.account.tag)
+        prefetch_email_bodies(reader, db)
         gc.collect()
         
         stats['is_running'] = False
@@ -509,7 +1150,7 @@ if 'reader' not in st.session_state:
     if is_render:
         st.session_state.reader = None # No instantation on startup for Render
     else:
-        st.session_state.reader = EmailReader()
+        st.session_state.reader = make_reader()
 
 if 'emails' not in st.session_state:
     st.session_state.emails = []
@@ -524,6 +1165,26 @@ if 'draft' not in st.session_state:
     st.session_state.draft = ""
 
 
+@st.cache_resource
+def start_idle_watchers():
+    """Demarre une seule fois par process l'ecoute IMAP IDLE de chaque boite (nouveaux emails en temps reel)"""
+    watchers = []
+    for account in configured_accounts():
+        watcher = IdleWatcher(EmailReader(pool_size=1, account=account), DatabaseManager())
+        watcher.start()
+        watchers.append(watcher)
+    return watchers
+
+if os.getenv("IMAP_IDLE", "1") == "1" and configured_accounts():
+    st.session_state.idle_watchers = start_idle_watchers()
+
+# Backfill interrompu (crash, redemarrage): reprise automatique a la derniere tranche
+for _account in configured_accounts():
+    _backfill_state = st.session_state.db.get_backfill_state("INBOX", _account.tag)
+    if _backfill_state and not _backfill_state.get('done') and not backfill_paused(_account.name):
+        start_backfill(account_name=_account.name)
+
+
 def generate_kpi_table(kpis: dict) -> str:
     """Genere un tableau texte des KPIs pour l'email"""
     if not kpis:
@@ -581,26 +1242,17 @@ def display_attachments(attachments):
     cols = st.columns(min(len(attachments), 3))
     for i, att in enumerate(attachments[:6]):
         with cols[i % 3]:
-            # Support Base64 (nouveau) ou Path (DB)
-            if "data" in att:
-                # Ancienne methode (memoire)
-                if att.get("content_type", "").startswith("image/"):
-                    try:
-                        img_data = base64.b64decode(att["data"])
-                        st.image(img_data, caption=att.get("filename", ""), use_container_width=True)
-                    except:
-                        st.write(f"📷 {att.get('filename', 'Image')}")
-                else:
-                    st.write(f"📎 {att.get('filename', 'Fichier')}")
-            elif "filepath" in att and att.get("filepath"):
-                # Nouvelle methode (DB/Fichier)
+            if not att.available:
+                st.write(f"⚠️ Fichier introuvable: {att.filename}")
+            elif att.is_image:
+                # Octets en memoire ou chemin du fichier: st.image accepte les deux sans base64
                 try:
-                    if os.path.exists(att["filepath"]):
-                        st.image(att["filepath"], caption=att["filename"], use_container_width=True)
-                    else:
-                        st.write(f"⚠️ Fichier introuvable: {att['filename']}")
+                    st.image(att.filepath if att.data is None else bytes(att.data), caption=att.filename,
+                             use_container_width=True)
                 except:
-                    st.write(f"📷 {att['filename']}")
+                    st.write(f"📷 {att.filename or 'Image'}")
+            else:
+                st.write(f"📎 {att.filename or 'Fichier'}")
 
 
 def display_kpis(kpis):
@@ -634,7 +1286,7 @@ def main():
 
     # Initialiser session state
     if 'reader' not in st.session_state:
-        st.session_state.reader = EmailReader()
+        st.session_state.reader = make_reader()
     if 'db' not in st.session_state:
         st.session_state.db = DatabaseManager()
     
@@ -645,12 +1297,7 @@ def main():
     if 'emails' not in st.session_state or not st.session_state.emails:
         try:
             # Charger depuis DB (très rapide)
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM emails ORDER BY date DESC LIMIT 50")
-            rows = c.fetchall()
-            conn.close()
+            rows = st.session_state.db.get_pending_emails(limit=50)
             
             if rows:
                 emails_from_db = []
@@ -679,7 +1326,7 @@ def main():
                     st.warning("⚠️ Base de données vide. Synchronisation automatique en cours...")
                     try:
                         if st.session_state.reader is None:
-                            st.session_state.reader = EmailReader()
+                            st.session_state.reader = make_reader()
                         
                         # Synchro légère et RAPIDE
                         with st.spinner("🔄 Chargement initial..."):
@@ -689,10 +1336,12 @@ def main():
                             
                             if new_emails and isinstance(new_emails, list):
                                 saved = 0
+                                new_ids = st.session_state.db.get_new_message_ids(
+                                    e.get('message_id') or e.get('id') for e in new_emails if isinstance(e, dict))
                                 for email in new_emails:
                                     if isinstance(email, dict):
                                         msg_id = email.get('message_id') or email.get('id')
-                                        if msg_id and not st.session_state.db.email_exists(str(msg_id)):
+                                        if msg_id and str(msg_id) in new_ids:
                                             email['body'] = ''
                                             email['attachments'] = []
                                             if st.session_state.db.save_email(email):
@@ -729,91 +1378,86 @@ def main():
             else:
                 st.info("⏳ Chargement en cours...")
 
+        multi_accounts = len(ACCOUNTS) > 1
+        for account in ACCOUNTS:
+            label = f"Gmail ({account.name})" if multi_accounts else "Gmail"
+            breaker = get_breaker(account).get_state()
+            if breaker['state'] == 'open':
+                st.error(f"🔴 {label} injoignable: affichage depuis la base locale, nouvel essai dans {breaker['retry_in']}s")
+                if breaker.get('last_error'):
+                    st.caption(f"Derniere erreur: {breaker['last_error']}")
+            elif breaker['state'] == 'half-open':
+                st.warning(f"🟠 {label}: test de reconnexion en cours...")
+            else:
+                st.caption(f"🟢 {label} joignable")
+
+        watchers = st.session_state.get('idle_watchers') or []
+        if watchers:
+            if all(w.stats.get('connected') for w in watchers):
+                saved = sum(w.stats.get('saved', 0) for w in watchers)
+                st.caption(f"⚡ Push IMAP actif: {saved} nouveaux emails recus en direct")
+            else:
+                st.caption("⚡ Push IMAP: reconnexion en cours...")
+
+        if st.session_state.reader is not None:
+            pool_stats = st.session_state.reader.get_pool_stats()
+            st.caption(f"🔌 Pool IMAP: {pool_stats['hits']} reutilisees / {pool_stats['misses']} nouvelles / "
+                       f"{pool_stats['reconnects']} reconnexions (~{pool_stats['saved_seconds']}s economisees)")
+            store_stats = st.session_state.reader.get_store_stats()
+            if store_stats:
+                st.caption(f"💾 Cache local: {store_stats['messages']} emails ({store_stats['size_mb']} Mo), "
+                           f"{store_stats['hits']} lectures sans reseau")
+
+        for account in configured_accounts() or [PRIMARY_ACCOUNT]:
+            suffix = f" ({account.name})" if multi_accounts else ""
+            backfill = st.session_state.db.get_backfill_state("INBOX", account.tag)
+            if backfill and not backfill.get('done'):
+                progress = min(1.0, (backfill['next_uid'] - 1) / max(1, backfill['uidnext'] - 1))
+                paused = backfill_paused(account.name)
+                st.progress(progress, text=f"📚 Import de l'historique{suffix}: {backfill['saved']} emails"
+                                           + (" (en pause)" if paused else ""))
+                if paused:
+                    if st.button(f"▶️ Reprendre l'import{suffix}", use_container_width=True,
+                                 key=f"backfill_resume_{account.name}"):
+                        start_backfill(account_name=account.name)
+                        st.rerun()
+                elif st.button(f"⏸️ Suspendre l'import{suffix}", use_container_width=True,
+                               key=f"backfill_stop_{account.name}"):
+                    stop_backfill(account.name)
+                    st.rerun()
+            elif not backfill and st.button(f"📚 Importer tout l'historique{suffix}", use_container_width=True,
+                                            key=f"backfill_{account.name}"):
+                start_backfill(account_name=account.name)
+                st.rerun()
+
         days = st.selectbox("Jours a scanner", [1, 3, 7, 30], index=1) # Default 3 jours
         
         if st.button("📥 Synchroniser Gmail", use_container_width=True, type="primary"):
-            # S'assurer que reader est initialisé
-            if st.session_state.reader is None:
-                st.session_state.reader = EmailReader()
-                    
             with st.status("Synchronisation en cours...", expanded=True) as status:
-                st.write("🔌 Connexion Gmail...")
-                
-                # 1. Recuperer les emails NON LUS uniquement (LIMITÉ à 20 pour performance)
-                try:
-                    new_emails = st.session_state.reader.get_recent_emails(days=7, unread_only=True, max_emails=20) # Seulement non lus, limité à 20
-                    if new_emails is None:
-                        new_emails = []
-                    if not isinstance(new_emails, list):
-                        new_emails = []
-                    st.write(f"📨 {len(new_emails)} emails NON LUS trouves")
-                except Exception as e:
-                    st.error(f"❌ Erreur connexion Gmail: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    new_emails = []
+                accounts = configured_accounts() or [PRIMARY_ACCOUNT]
+                st.write(f"🔌 Connexion Gmail ({len(accounts)} boîte(s))...")
                 
-                # 2. Sauvegarder en DB (uniquement les nouveaux et pertinents)
-                saved_count = 0
-                ignored_count = 0
-                error_count = 0
+                # Incrementale, toutes les boites en parallele (un pool IMAP par compte, limité à 20 chacune)
+                readers = [reader_for(account.name) for account in accounts]
+                results = sync_all_accounts(readers, st.session_state.db, days=7, max_emails=20)
                 
-                # Progress bar pour le chargement
-                progress_bar = st.progress(0)
-                total_emails = len(new_emails)
-                
-                for idx, email in enumerate(new_emails):
-                    # Update progress bar
-                    if total_emails > 0:
-                        progress = (idx + 1) / total_emails
-                        progress_bar.progress(progress)
-                    try:
-                        # Validation: email doit etre un dict avec les champs essentiels
-                        if not isinstance(email, dict):
-                            error_count += 1
-                            continue
-                        
-                        # Validation: message_id obligatoire
-                        message_id = email.get('message_id') or email.get('id')
-                        if not message_id:
-                            error_count += 1
-                            continue
-                        
-                        # Filtre anti-spam AVANT tout traitement lourd
-                        subject = email.get('subject', '').lower()
-                        sender = email.get('from_email', '').lower()
-                        
-                        if any(p in subject for p in EXCLUDE_PATTERNS) or any(p in sender for p in EXCLUDE_PATTERNS):
-                            ignored_count += 1
-                            continue
-
-                        # Verifier si deja en DB
-                        if not st.session_state.db.email_exists(str(message_id)):
-                            # OPTIMISATION: Sauvegarder seulement les headers (sans body/attachments)
-                            # Le contenu complet sera charge a la demande quand on clique sur l'email
-                            email['body'] = ''  # Pas de body pour l'instant
-                            email['attachments'] = []  # Pas d'attachments pour l'instant
-                            
-                            # Sauvegarder en DB (headers seulement)
-                            if st.session_state.db.save_email(email):
-                                saved_count += 1
-                        
-                        # Nettoyage memoire (sans clear() qui casse la boucle)
-                        if 'attachments' in email:
-                            for att in email.get('attachments', []):
-                                if 'data' in att:
-                                    att['data'] = None
-                        
-                        # Force garbage collection tous les 10 emails
-                        if idx % 10 == 0:
-                            gc.collect()
-                            
-                    except Exception as e:
-                        print(f"[SYNC] Erreur traitement email: {e}")
-                        error_count += 1
-                        continue
+                saved_count = sum(r['saved'] for r in results)
+                ignored_count = sum(r['ignored'] for r in results)
+                error_count = sum(r['errors'] for r in results)
+                for r in results:
+                    prefix = f"{r['account']}: " if len(results) > 1 else ""
+                    if r['error']:
+                        st.error(f"❌ {prefix}Erreur connexion Gmail: {r['error']}")
+                    else:
+                        st.write(f"📨 {prefix}{r['found']} emails NON LUS trouves, {r['saved']} nouveaux")
+                gc.collect()
                 
-                progress_bar.empty()
+                if saved_count > 0:
+                    # Precharger les corps en arriere-plan pour que l'ouverture soit instantanee
+                    for reader, r in zip(readers, results):
+                        if r['saved']:
+                            threading.Thread(target=prefetch_email_bodies, args=(reader, st.session_state.db),
+                                             daemon=True).start()
                 
                 final_msg = f"✅ {saved_count} nouveaux emails sauvegardes"
                 if ignored_count > 0:
@@ -839,12 +1483,7 @@ def main():
         # Charger depuis la DB uniquement (RAPIDE, pas de connexion Gmail)
         try:
             # Charger les 20 derniers emails depuis la DB (instantané)
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM emails ORDER BY date DESC LIMIT 20")
-            rows = c.fetchall()
-            conn.close()
+            rows = st.session_state.db.get_pending_emails(limit=20)
             
             if rows:
                 emails_from_db = []
@@ -889,7 +1528,7 @@ def main():
                     <div style="background: white; padding: 15px; border-radius: 10px; border: 1px solid #eee; margin-bottom: 10px; box-shadow: 0 2px 5px rgba(0,0,0,0.05);">
                         <div style="font-weight: bold; font-size: 1.1rem; color: #333;">{email.get('subject', 'Sans sujet')}</div>
                         <div style="color: #666; font-size: 0.9rem; margin-bottom: 5px;">
-                            👤 <b>{email.get('client_email', 'Inconnu')}</b> | 📅 {email.get('date').strftime('%d/%m/%Y %H:%M') if isinstance(email.get('date'), datetime) else str(email.get('date'))}
+                            👤 <b>{email.get('client_email', 'Inconnu')}</b> | 📅 {email.get('date').strftime('%d/%m/%Y %H:%M') if isinstance(email.get('date'), datetime) else str(email.get('date'))}{f" | 📬 {get_account(email.get('account')).name}" if len(ACCOUNTS) > 1 else ""}
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
@@ -919,36 +1558,109 @@ def main():
             
         email = st.session_state.selected_email
         client_email = email.get('client_email', '')
+        reader = reader_for(email.get('account'))  # UIDs valables uniquement dans la boite d'origine
         
         st.header(f"📧 {email.get('subject', 'Sans sujet')}")
-        st.caption(f"De: **{client_email}** | Date: {email.get('date')}")
+        st.caption(f"De: **{client_email}** | Date: {email.get('date')}"
+                   + (f" | Boîte: {get_account(email.get('account')).name}" if len(ACCOUNTS) > 1 else ""))
         
         # 1. Charger le contenu complet SI manquant
         if not email.get('body') and email.get('imap_uid'):
             with st.spinner("🔌 Chargement du contenu Gmail..."):
-                full_data = st.session_state.reader.load_email_content(email['imap_uid'])
+                # Texte uniquement (quelques Ko): les pieces jointes suivent dans l'onglet email
+                full_data = reader.load_email_content(email['imap_uid'], folder=email.get('imap_folder') or "INBOX",
+                                                      with_attachments=False, message_id=email.get('message_id'))
                 if full_data.get('loaded'):
                     email['body'] = full_data['body']
                     email['attachments'] = full_data['attachments']
+                    email['attachment_parts'] = full_data.get('parts', [])
+                    email['preview'] = full_data.get('preview', False)
+                    email['size'] = full_data.get('size', 0)
+                    if email['attachment_parts'] or full_data.get('text_parts'):
+                        # Grosses parties (photos, texte tronque) en arriere-plan: l'apercu s'affiche tout de suite
+                        email['background_load'] = reader.load_parts_background(
+                            email['imap_uid'], email['attachment_parts'], folder=email.get('imap_folder') or "INBOX",
+                            text_parts=full_data.get('text_parts'))
                     # Garder en session
                     st.session_state.selected_email = email
+        elif email.get('body') and not email.get('attachments') and not email.get('attachment_parts') and email.get('message_id'):
+            # Contenu deja precharge en DB: pieces jointes depuis le disque
+            email['attachments'] = st.session_state.db.get_attachments(email['message_id'])
+            st.session_state.selected_email = email
         
         # 2. Charger l'historique complet pour l'IA
         if not st.session_state.history:
             with st.spinner("📜 Récupération de l'historique client..."):
+                # Thread Gmail complet (y compris nos reponses) plutot qu'elargir la fenetre de synchro
+                if email.get('imap_uid') or email.get('message_id'):
+                    st.session_state.thread_load = load_email_thread(reader, st.session_state.db, email)
                 st.session_state.history = st.session_state.db.get_client_history(client_email, load_attachments=True)
+            # Historique IMAP complet du client en arriere-plan (une seule fois par client)
+            client_backfill = st.session_state.db.get_client_backfill(client_email, get_account(email.get('account')).tag)
+            if not (client_backfill and client_backfill.get('done')):
+                start_client_backfill(client_email, email.get('account'))
+        thread_load = st.session_state.get('thread_load')
+        if thread_load is not None and thread_load.done():
+            # Contenus du thread arrives: l'historique (et l'analyse IA) les inclut
+            st.session_state.history = st.session_state.db.get_client_history(client_email, load_attachments=True)
+            st.session_state.thread_load = None
+        if client_backfill_running(client_email, email.get('account')):
+            st.session_state.history_stale = True
+        elif st.session_state.get('history_stale'):
+            # Backfill termine depuis le dernier affichage: derniers lots inclus
+            st.session_state.history = st.session_state.db.get_client_history(client_email, load_attachments=True)
+            st.session_state.history_stale = False
         
         # 3. ONGLETS
         tab1, tab2, tab3, tab4 = st.tabs(["📨 Email Actuel", "📜 Historique Complet", "🤖 Analyse IA", "✉️ Email de Réponse"])
         
         with tab1:
+            background = email.get('background_load')
+            if background is not None and background.done():
+                loaded = background.result()
+                if loaded.get('body'):
+                    email['body'] = loaded['body']
+                    email['preview'] = False
+                email['attachments'] = (email.get('attachments') or []) + loaded['attachments']
+                email['attachment_parts'] = loaded['skipped']  # hors budget: chargement a la demande
+                email['background_load'] = None
+                st.session_state.selected_email = email
+            if email.get('preview'):
+                st.caption(f"👀 Aperçu d'un email de {email.get('size', 0) / (1024 * 1024):.1f} Mo: "
+                           "texte complet en cours de téléchargement")
             st.markdown(f'<div class="bilan-card">{html.escape(email.get("body", ""))}</div>', unsafe_allow_html=True)
+            parts = email.get('attachment_parts') or []
+            if parts:
+                total_mb = sum(p.get('size', 0) for p in parts) / (1024 * 1024)
+                for p in parts:
+                    st.caption(f"📎 {p.get('filename') or p['content_type']} ({p.get('size', 0) / (1024 * 1024):.1f} Mo)")
+                if email.get('background_load') is not None:
+                    st.info(f"⏳ {len(parts)} pièce(s) jointe(s) en cours de téléchargement ({total_mb:.1f} Mo)")
+                    if st.button("🔄 Actualiser", key="refresh_parts"):
+                        st.rerun()
+                elif st.button(f"📥 Charger {len(parts)} pièce(s) jointe(s) ({total_mb:.1f} Mo)", key="load_parts"):
+                    with st.spinner("📎 Chargement des pièces jointes..."):
+                        email['attachments'] = (email.get('attachments') or []) + reader.load_attachments(
+                            email['imap_uid'], parts, folder=email.get('imap_folder') or "INBOX")
+                        email['attachment_parts'] = []
+                        st.session_state.selected_email = email
+                    st.rerun()
             if email.get('attachments'):
                 st.subheader(f"📎 Pièces jointes ({len(email['attachments'])})")
                 display_attachments(email['attachments'])
         
         with tab2:
             st.subheader(f"Historique de {client_email}")
+            if st.session_state.get('thread_load') is not None:
+                st.info("⏳ Contenu des emails du thread en cours de téléchargement")
+                if st.button("🔄 Actualiser", key="refresh_thread"):
+                    st.rerun()
+            if client_backfill_running(client_email, email.get('account')):
+                progress = st.session_state.db.get_client_backfill(client_email, get_account(email.get('account')).tag) or {}
+                st.info(f"⏳ Import de l'historique Gmail du client: {progress.get('saved', 0)} emails ajoutés")
+                if st.button("🔄 Actualiser", key="refresh_history"):
+                    st.session_state.history = st.session_state.db.get_client_history(client_email, load_attachments=True)
+                    st.rerun()
             if st.session_state.history:
                 for h_email in reversed(st.session_state.history): # Plus récent en haut
                     direction = "📥" if h_email.get('direction') == 'received' else "📤"
@@ -1004,7 +1716,19 @@ def main():
                 col_send, col_regen = st.columns(2)
                 with col_send:
                     if st.button("📤 Envoyer par Gmail", type="primary", use_container_width=True):
-                        st.warning("Fonction d'envoi à configurer (App Password requis)")
+                        with st.spinner("📤 Envoi en cours..."):
+                            sent = send_reply(reader, st.session_state.db, email, draft)
+                        if sent.get("success"):
+                            st.toast(f"✅ {sent['message']}")
+                            if not sent.get("flagged"):
+                                st.toast("⚠️ Flag Gmail non posé: email marqué traité localement")
+                            st.session_state.selected_email = None
+                            st.session_state.draft = ""
+                            st.session_state.analysis = None
+                            st.session_state.history = []
+                            st.rerun()
+                        else:
+                            st.error(f"Erreur d'envoi: {sent.get('error')}")
                 with col_regen:
                     if st.button("🔄 Régénérer", use_container_width=True):
                          # Logique de régénération...
@@ -0,0 +1,434 @@
+"""
+Backend asyncio pour la lecture IMAP
+Plusieurs connexions sur une seule boucle: synchro, prechargement et chargements a la demande
+se chevauchent sans bloquer le thread Streamlit, avec timeout et annulation propres
+"""
+
+import asyncio
+import concurrent.futures
+import email
+import os
+import re
+import ssl
+import threading
+import zlib
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator, Tuple
+
+import email_reader
+from accounts import MailAccount
+from email_reader import (EmailReader, HEADER_ITEMS, IMAP_POOL_SIZE, compress_uid_set, parse_fetch_line,
+                          quote_mailbox, _next_tag, _LITERAL_RE)
+
+IMAP_ASYNC_TIMEOUT = float(os.getenv("IMAP_ASYNC_TIMEOUT", 60))  # secondes max par operation
+STREAM_LIMIT = 16 * 1024 * 1024  # longueur max d'une ligne de reponse (SEARCH sur des milliers d'UIDs)
+
+
+class IMAPCommandError(Exception):
+    """Reponse NO / BAD a une commande"""
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class AsyncDeflateStream:
+    """Flux IMAP compresse (COMPRESS=DEFLATE, RFC 4978) sous AsyncIMAPConnection
+
+    Equivalent asyncio de email_reader.DeflateStream: remplace a la fois le StreamReader
+    (readline/readexactly) et le StreamWriter (write/drain/close), la connexion n'y voit que du texte IMAP."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 level: int = email_reader.IMAP_COMPRESS_LEVEL):
+        self._reader = reader
+        self._writer = writer
+        self._inflater = zlib.decompressobj(-15)
+        self._deflater = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self._buffer = bytearray()
+        self.stats = {"wire_in": 0, "data_in": 0, "wire_out": 0, "data_out": 0}
+
+    async def _fill(self) -> bool:
+        """Lit un bloc compresse et l'ajoute au tampon decompresse (False si EOF)"""
+        chunk = await self._reader.read(65536)
+        if not chunk:
+            return False
+        data = self._inflater.decompress(chunk)
+        self.stats["wire_in"] += len(chunk)
+        self.stats["data_in"] += len(data)
+        self._buffer += data
+        return True
+
+    async def readline(self) -> bytes:
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start)
+            if end >= 0:
+                end += 1
+                break
+            start = len(self._buffer)
+            if not await self._fill():
+                end = len(self._buffer)
+                break
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return line
+
+    async def readexactly(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            if not await self._fill():
+                raise asyncio.IncompleteReadError(bytes(self._buffer), size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def write(self, data: bytes):
+        wire = self._deflater.compress(data) + self._deflater.flush(zlib.Z_SYNC_FLUSH)
+        self.stats["data_out"] += len(data)
+        self.stats["wire_out"] += len(wire)
+        self._writer.write(wire)
+
+    async def drain(self):
+        await self._writer.drain()
+
+    def close(self):
+        self._writer.close()
+
+
+class AsyncIMAPConnection:
+    """Connexion IMAP asyncio: une commande a la fois, reponses lues au fil de l'eau"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.capabilities: Tuple[str, ...] = ()
+        self.folder = None
+        self.uidvalidity = None
+        self.compress: Optional[AsyncDeflateStream] = None
+
+    @classmethod
+    async def open(cls, host: str, port: int, user: str, password: str,
+                   ssl_context: Optional[ssl.SSLContext] = None, use_ssl: bool = True) -> "AsyncIMAPConnection":
+        if use_ssl:
+            ssl_context = ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context if use_ssl else None,
+                                                       limit=STREAM_LIMIT)
+        conn = cls(reader, writer)
+        try:
+            await conn._readline()  # * OK greeting
+            await conn.command(f"LOGIN {_quote(user)} {_quote(password)}")
+            for line, _ in await conn.command("CAPABILITY"):
+                if line.upper().startswith(b"* CAPABILITY "):
+                    conn.capabilities = tuple(line[13:].decode("ascii", "ignore").upper().split())
+            await conn.enable_compression()
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    async def enable_compression(self) -> bool:
+        """Negocie COMPRESS DEFLATE avant le SELECT (meme regle IMAP_COMPRESS que le pool imaplib)
+        La reponse taguee arrive encore en clair, tout ce qui suit passe par AsyncDeflateStream."""
+        if not email_reader.IMAP_COMPRESS or "COMPRESS=DEFLATE" not in self.capabilities or self.compress:
+            return False
+        try:
+            await self.command("COMPRESS DEFLATE")
+        except IMAPCommandError as e:
+            print(f"[IMAP ASYNC] COMPRESS refuse: {e}")
+            return False
+        self.compress = AsyncDeflateStream(self.reader, self.writer)
+        self.reader = self.writer = self.compress
+        return True
+
+    async def _readline(self) -> bytes:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("connexion IMAP fermee par le serveur")
+        return line
+
+    async def _read_response(self) -> Tuple[bytes, List[bytes]]:
+        """Une reponse complete: litteraux {n} lus et remplaces par \\x00<index>\\x00"""
+        line = await self._readline()
+        literals = []
+        size = _LITERAL_RE.search(line)
+        while size:
+            literals.append(await self.reader.readexactly(int(size.group(1))))
+            rest = await self._readline()
+            line = line[:size.start()] + b"\x00%d\x00" % (len(literals) - 1) + rest
+            size = _LITERAL_RE.search(line)
+        return line, literals
+
+    async def responses(self, command: str) -> AsyncIterator[Tuple[bytes, List[bytes]]]:
+        """Envoie une commande et rend les reponses non taguees jusqu'a la reponse taguee"""
+        tag = _next_tag()
+        self.writer.write(f"{tag} {command}\r\n".encode())
+        await self.writer.drain()
+        prefix = tag.encode() + b" "
+        while True:
+            line, literals = await self._read_response()
+            if line.startswith(prefix):
+                if not line[len(prefix):].upper().startswith(b"OK"):
+                    raise IMAPCommandError(line.decode("utf-8", "ignore").strip())
+                return
+            yield line, literals
+
+    async def command(self, command: str) -> List[Tuple[bytes, List[bytes]]]:
+        return [response async for response in self.responses(command)]
+
+    async def select(self, folder: str):
+        """SELECT seulement si le dossier change"""
+        if self.folder == folder:
+            return
+        self.folder = None
+        for line, _ in await self.command(f"SELECT {quote_mailbox(folder)}"):
+            match = re.search(rb"\[UIDVALIDITY (\d+)\]", line)
+            if match:
+                self.uidvalidity = int(match.group(1))
+        self.folder = folder
+
+    async def uid_search(self, criteria: str) -> List[str]:
+        uids = []
+        for line, _ in await self.command(f"UID SEARCH {criteria}"):
+            if line.upper().startswith(b"* SEARCH"):
+                uids += line[8:].decode("ascii", "ignore").split()
+        return uids
+
+    async def uid_fetch(self, uid_set: str, items: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        async for line, literals in self.responses(f"UID FETCH {uid_set} {items}"):
+            parsed = parse_fetch_line(line, literals)
+            if parsed is not None:
+                yield parsed
+
+    async def logout(self):
+        try:
+            await asyncio.wait_for(self.command("LOGOUT"), 5)
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncIMAPPool:
+    """Pool de connexions asyncio: une connexion par operation en cours, jusqu'a max_size en parallele
+
+    Une operation annulee (timeout) ou en erreur laisse une reponse a moitie lue: sa connexion est
+    fermee au lieu d'etre rendue au pool.
+    """
+
+    def __init__(self, connect: Callable, max_size: int = IMAP_POOL_SIZE):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._idle: List[AsyncIMAPConnection] = []
+        self.stats = {"opened": 0, "reused": 0, "broken": 0, "compressed": 0}
+
+    @asynccontextmanager
+    async def connection(self, folder: str = "INBOX"):
+        async with self._slots:
+            if self._idle:
+                conn = self._idle.pop()
+                self.stats["reused"] += 1
+            else:
+                conn = await self._connect()
+                self.stats["opened"] += 1
+                self.stats["compressed"] += conn.compress is not None
+            try:
+                await conn.select(folder)
+                yield conn
+            except BaseException:
+                self.stats["broken"] += 1
+                conn.close()
+                raise
+            self._idle.append(conn)
+
+    async def execute(self, operation: Callable, folder: str = "INBOX", retries: int = 1):
+        """Execute `await operation(conn)`; une connexion coupee (idle trop longtemps) est remplacee"""
+        for attempt in range(retries + 1):
+            try:
+                async with self.connection(folder) as conn:
+                    return await operation(conn)
+            except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+                if attempt >= retries:
+                    raise
+                print(f"[IMAP ASYNC] Connexion perdue ({e}), nouvelle tentative...")
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.logout()
+
+
+class AsyncEmailReader(EmailReader):
+    """EmailReader dont la synchro des headers et les chargements de contenu passent par asyncio
+
+    Les variantes *_async s'utilisent depuis une boucle asyncio (une seule boucle par lecteur).
+    Les methodes synchrones du meme nom executent la coroutine sur une boucle dediee (thread
+    d'arriere-plan): plusieurs appels depuis des threads differents se chevauchent sur le pool.
+    Les autres methodes (sync_changes, get_thread...) restent sur le pool imaplib.
+    """
+
+    def __init__(self, pool_size: int = IMAP_POOL_SIZE, store=None, timeout: float = IMAP_ASYNC_TIMEOUT,
+                 ssl_context: Optional[ssl.SSLContext] = None, account: Optional[MailAccount] = None):
+        super().__init__(pool_size=pool_size, store=store, account=account)
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.async_pool = AsyncIMAPPool(self._connect, max_size=pool_size)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    async def _connect(self) -> AsyncIMAPConnection:
+        account = self.account
+        if not account.configured:
+            raise ConnectionError(f"Identifiants du compte {account.name} non definis")
+        breaker = email_reader.get_breaker(account)  # circuit partage avec le pool imaplib
+        if not breaker.allow():
+            raise ConnectionError(f"Circuit IMAP ouvert (prochain essai dans {breaker.retry_in():.0f}s)")
+        try:
+            conn = await AsyncIMAPConnection.open(account.imap_server, account.imap_port,
+                                                  account.user, account.password, self.ssl_context,
+                                                  use_ssl=account.imap_ssl)
+        except Exception as e:
+            breaker.record_failure(f"{type(e).__name__}: {e}")
+            raise
+        breaker.record_success()
+        return conn
+
+    async def _execute(self, operation: Callable, folder: str, timeout: float = None):
+        async def run(conn):
+            if conn.uidvalidity:
+                self.pool.uidvalidity[folder] = conn.uidvalidity  # cle du store local
+            return await operation(conn)
+        return await asyncio.wait_for(self.async_pool.execute(run, folder), timeout or self.timeout)
+
+    async def _fetch_one(self, conn: AsyncIMAPConnection, uid: str, items: str) -> Dict[str, Any]:
+        fields = {}
+        async for fetched_uid, item in conn.uid_fetch(str(uid), items):
+            if fetched_uid == str(uid):
+                fields = item
+        return fields
+
+    async def get_unanswered_emails_async(self, days: int = 7, folder: str = "INBOX",
+                                          max_emails: int = 50, timeout: float = None) -> List[Dict[str, Any]]:
+        """Headers (ENVELOPE) des emails sans reponse"""
+        async def fetch(conn):
+            uids = (await conn.uid_search(self._unanswered_criteria(conn, days)))[-max_emails:]
+            if not uids:
+                return []
+            return [self._envelope_record(uid, fields)
+                    async for uid, fields in conn.uid_fetch(compress_uid_set(uids), HEADER_ITEMS) if uid]
+        try:
+            emails = await self._execute(fetch, folder, timeout)
+        except asyncio.TimeoutError:
+            print(f"[IMAP ASYNC] Timeout synchro {folder}")
+            return []
+        except Exception as e:
+            print(f"Error sync: {e}")
+            return []
+        return sorted(emails, key=lambda x: x["date"], reverse=True)
+
+    async def load_email_content_async(self, uid: str, folder: str = "INBOX", with_attachments: bool = True,
+                                       message_id: str = None, timeout: float = None) -> Dict[str, Any]:
+        """Comme load_email_content: store local, sinon BODYSTRUCTURE puis uniquement les sections utiles"""
+        uidvalidity_known = folder in self.pool.uidvalidity
+        cached = self._cached_content(uid, folder, message_id=message_id)
+        if cached:
+            return cached
+
+        async def fetch(conn):
+            if not uidvalidity_known:
+                # Premier acces au dossier: la cle du store n'est connue qu'apres le SELECT
+                cached = self._cached_content(uid, folder, conn.uidvalidity, message_id)
+                if cached:
+                    return cached
+            if with_attachments:
+                # Toutes les sections seraient telechargees: le message brut, lui, va dans le store local
+                raw = (await self._fetch_one(conn, uid, "(UID BODY.PEEK[])")).get("BODY[]")
+                if not isinstance(raw, bytes):
+                    return {"loaded": False, "error": "Fetch fail"}
+                content = self._parse_content(str(uid), raw, folder, conn.uidvalidity)
+                del content["uid"]
+                content["parts"] = []
+                return content
+            fields = await self._fetch_one(conn, uid, "(UID RFC822.SIZE BODYSTRUCTURE)")
+            size = int(fields.get("RFC822.SIZE") or 0)
+            limit = self._preview_limit(size, with_attachments)
+            parts = self._parse_bodystructure(fields.get("BODYSTRUCTURE"))
+            if not parts:
+                # Structure illisible: on retombe sur le message complet (ou son debut si trop gros)
+                if limit:
+                    raw = (await self._fetch_one(conn, uid, f"(UID BODY.PEEK[]<0.{limit}>)")).get("BODY[]<0>")
+                    if not isinstance(raw, bytes):
+                        return {"loaded": False, "error": "Fetch fail"}
+                    return {"loaded": True, "body": self._get_email_body(email.message_from_bytes(raw)),
+                            "attachments": [], "parts": [], "size": size, "preview": True, "text_parts": []}
+                raw = (await self._fetch_one(conn, uid, "(UID BODY.PEEK[])")).get("BODY[]")
+                if not isinstance(raw, bytes):
+                    return {"loaded": False, "error": "Fetch fail"}
+                content = self._parse_content(str(uid), raw, folder, conn.uidvalidity)
+                del content["uid"]
+                return content
+            text_parts, attachment_parts = self._split_parts(parts)
+            sections = await self._fetch_one(conn, uid, self._sections_items(text_parts, limit)) if text_parts else {}
+            return self._content_result(text_parts, attachment_parts, sections, size, limit)
+
+        try:
+            return await self._execute(fetch, folder, timeout)
+        except asyncio.TimeoutError:
+            print(f"[IMAP ASYNC] Timeout chargement UID {uid}")
+            return {"loaded": False, "error": "Timeout"}
+        except Exception as e:
+            print(f"Error load: {e}")
+            return {"loaded": False, "error": "Fetch fail"}
+
+    async def load_email_contents_async(self, uids: List[str], folder: str = "INBOX",
+                                        with_attachments: bool = False) -> List[Dict[str, Any]]:
+        """Chargements en parallele, repartis sur les connexions du pool"""
+        results = await asyncio.gather(*(self.load_email_content_async(uid, folder, with_attachments)
+                                         for uid in uids))
+        for uid, result in zip(uids, results):
+            result.setdefault("uid", str(uid))
+        return list(results)
+
+    # --- API synchrone (Streamlit, threads de synchro) ---
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="imap-async").start()
+        return self._loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Planifie une coroutine sur la boucle du lecteur (resultat via future.result())"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _run(self, coro, default):
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=self.timeout + 5)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return default
+
+    def get_unanswered_emails(self, days: int = 7, folder: str = "INBOX", max_emails: int = 50) -> List[Dict[str, Any]]:
+        return self._run(self.get_unanswered_emails_async(days, folder, max_emails), [])
+
+    def load_email_content(self, uid: str, folder: str = "INBOX", with_attachments: bool = True,
+                           message_id: str = None) -> Dict[str, Any]:
+        return self._run(self.load_email_content_async(uid, folder, with_attachments, message_id),
+                         {"loaded": False, "error": "Timeout"})
+
+    def close(self):
+        """Ferme les connexions asyncio et arrete la boucle"""
+        if self._loop is not None:
+            try:
+                self.submit(self.async_pool.close()).result(timeout=10)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+        self.pool.close()
@@ -0,0 +1,78 @@
+"""
+Piece jointe unique pour tout le pipeline (email_reader -> app -> analyzer)
+Octets bruts en memoire (bytes / memoryview) ou fichier sur disque: le base64 n'est produit
+qu'a la frontiere de l'API Claude, jamais entre les modules
+"""
+
+import base64
+import os
+from typing import Optional, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class Attachment:
+    """Piece jointe decodee: `data` (octets bruts) et/ou `filepath` (lue a la demande)"""
+
+    __slots__ = ("filename", "content_type", "data", "filepath")
+
+    def __init__(self, filename: str, content_type: str = "application/octet-stream",
+                 data: Optional[BytesLike] = None, filepath: Optional[str] = None):
+        self.filename = filename
+        self.content_type = content_type or "application/octet-stream"
+        self.data = data
+        self.filepath = filepath
+
+    def __repr__(self):
+        where = "memoire" if self.data is not None else self.filepath
+        return f"Attachment({self.filename!r}, {self.content_type!r}, {self.size} octets, {where})"
+
+    @property
+    def is_image(self) -> bool:
+        return self.content_type.startswith("image/")
+
+    @property
+    def is_pdf(self) -> bool:
+        return "pdf" in self.content_type.lower()
+
+    @property
+    def available(self) -> bool:
+        return self.data is not None or bool(self.filepath and os.path.exists(self.filepath))
+
+    @property
+    def size(self) -> int:
+        if self.data is not None:
+            return memoryview(self.data).nbytes
+        try:
+            return os.path.getsize(self.filepath) if self.filepath else 0
+        except OSError:
+            return 0
+
+    def read(self) -> BytesLike:
+        """Octets bruts (sans copie si deja en memoire)"""
+        if self.data is not None:
+            return self.data
+        with open(self.filepath, "rb") as f:
+            return f.read()
+
+    def head(self, n: int) -> bytes:
+        """Premiers octets (detection du type) sans charger le fichier entier"""
+        if self.data is not None:
+            return bytes(memoryview(self.data)[:n])
+        with open(self.filepath, "rb") as f:
+            return f.read(n)
+
+    def b64(self) -> str:
+        """Encodage base64: uniquement pour l'API (Claude)"""
+        return base64.b64encode(self.read()).decode("ascii")
+
+    def save(self, path: str) -> bool:
+        """Ecrit les octets sur disque (si absent) puis libere la memoire: l'objet pointe sur le fichier"""
+        if self.data is not None and not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(self.data)
+        if self.data is None and not os.path.exists(path):
+            return False
+        self.filepath = path
+        self.data = None
+        return True
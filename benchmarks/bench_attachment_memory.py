@@ -0,0 +1,166 @@
+"""
+Benchmark memoire du pipeline pieces jointes: ancien (base64 entre chaque module) vs octets bruts
+Un email de bilan avec photos est parse, prepare pour l'API Claude (photos de l'email + historique
+du client sur disque) puis sauvegarde; chaque variante tourne dans un process neuf et rapporte
+le pic de RSS (ru_maxrss) et le pic d'allocations Python (tracemalloc) par email
+
+Usage: python benchmarks/bench_attachment_memory.py [photos] [taille_photo_ko] [photos_historique]
+"""
+
+import base64
+import email
+import email.policy
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.message import EmailMessage
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("RAW_STORE_MAX_MB", "0")
+os.environ.setdefault("ANTHROPIC_API_KEY", "bench")  # client cree a l'import d'analyzer, jamais appele
+
+from mailbox_generator import fake_jpeg
+
+
+def rss_mb() -> float:
+    # ru_maxrss: Ko sous Linux, octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_email(photos: int, photo_kb: int) -> bytes:
+    rng = random.Random(7)
+    msg = EmailMessage()
+    msg["From"] = "Client <client@client.example>"
+    msg["To"] = "coach@example.com"
+    msg["Subject"] = "Bilan semaine 12"
+    msg["Message-ID"] = "<bench@client.example>"
+    msg.set_content("Salut coach, voici mon bilan et mes photos.\n")
+    for i in range(photos):
+        msg.add_attachment(fake_jpeg(rng, photo_kb * 1024), maintype="image", subtype="jpeg",
+                           filename=f"photo_{i}.jpg")
+    return msg.as_bytes(policy=email.policy.SMTP)
+
+
+# --- Ancien pipeline (avant Attachment): base64 en sortie du reader, decode a la sauvegarde,
+# re-encode a l'analyse, historique relu et re-encode en entier ---
+
+def legacy_pipeline(raw: bytes, workdir: str, history_files):
+    msg = email.message_from_bytes(raw)
+    attachments = []
+    for part in msg.walk():
+        if "attachment" in str(part.get("Content-Disposition", "")):
+            data = part.get_payload(decode=True)
+            attachments.append({"filename": part.get_filename(), "content_type": part.get_content_type(),
+                                "data": base64.b64encode(data).decode("utf-8")})
+    history_photos = []
+    for path in history_files:
+        with open(path, "rb") as f:
+            history_photos.append({"data": base64.b64encode(f.read()).decode("utf-8")})
+    payload = []
+    for att in attachments[:5]:
+        base64.b64decode(att["data"][:32])  # detect_image_type
+        if len(base64.b64decode(att["data"])) <= 4 * 1024 * 1024:  # compress_image_if_needed
+            payload.append({"type": "image", "source": {"type": "base64", "media_type": "image/jpeg",
+                                                        "data": att["data"]}})
+    for att in attachments:
+        with open(os.path.join(workdir, "legacy_" + att["filename"]), "wb") as f:
+            f.write(base64.b64decode(att["data"]))
+        att["data"] = None
+    return len(payload), len(history_photos)
+
+
+# --- Pipeline actuel: Attachment (octets bruts / fichier), base64 uniquement pour l'API ---
+
+def current_pipeline(raw: bytes, workdir: str, history_files):
+    from email_reader import EmailReader
+    from attachments import Attachment
+    from analyzer import compress_image_if_needed, detect_image_type
+
+    reader = EmailReader(pool_size=1)
+    attachments = reader._parse_content("1", raw)["attachments"]
+    history_photos = [Attachment(os.path.basename(p), "image/jpeg", filepath=p) for p in history_files]
+    payload = []
+    for att in attachments[:5]:
+        real_type = detect_image_type(att.head(32))
+        data, media_type = compress_image_if_needed(att.read(), real_type)
+        payload.append({"type": "image", "source": {"type": "base64", "media_type": media_type, "data": data}})
+    for att in attachments:
+        att.save(os.path.join(workdir, "current_" + att.filename))
+    return len(payload), len(history_photos)
+
+
+def run_variant(variant: str, email_path: str, workdir: str, history_files, emails: int):
+    """Execute dans un process neuf: le pic RSS ne depend que de cette variante"""
+    with open(email_path, "rb") as f:
+        raw = f.read()
+    pipeline = legacy_pipeline if variant == "legacy" else current_pipeline
+    if variant == "current":
+        import email_reader, analyzer  # imports hors mesure
+    base_rss = rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    peaks = []
+    for _ in range(emails):
+        tracemalloc.reset_peak()
+        pipeline(raw, workdir, history_files)
+        peaks.append(tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    print(json.dumps({"variant": variant, "rss_peak_mb": rss_mb() - base_rss, "alloc_peak_mb": max(peaks),
+                      "ms_per_email": elapsed / emails * 1000}))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        _, _, variant, email_path, workdir, emails, *history = sys.argv
+        run_variant(variant, email_path, workdir, history, int(emails))
+        return
+
+    photos = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    photo_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 3072
+    history_count = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+    emails = 3
+
+    workdir = tempfile.mkdtemp(prefix="bench_att_")
+    try:
+        raw = make_email(photos, photo_kb)
+        email_path = os.path.join(workdir, "bilan.eml")
+        with open(email_path, "wb") as f:
+            f.write(raw)
+        rng = random.Random(11)
+        history = []
+        for i in range(history_count):
+            path = os.path.join(workdir, f"history_{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(fake_jpeg(rng, photo_kb * 1024))
+            history.append(path)
+
+        print(f"Email de {len(raw) / 1e6:.1f} Mo ({photos} photos de {photo_kb} Ko), "
+              f"{history_count} photos d'historique sur disque")
+        print(f"{'pipeline':<12}{'pic RSS (Mo)':>14}{'pic alloc (Mo)':>16}{'ms/email':>10}")
+        for variant in ("legacy", "current"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", variant, email_path, workdir,
+                                  str(emails)] + history, capture_output=True, text=True)
+            lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+            if out.returncode != 0 or not lines:
+                print(f"{variant:<12} echec: {out.stderr.strip().splitlines()[-1] if out.stderr else '?'}")
+                continue
+            r = json.loads(lines[-1])
+            print(f"{variant:<12}{r['rss_peak_mb']:>14.1f}{r['alloc_peak_mb']:>16.1f}{r['ms_per_email']:>10.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
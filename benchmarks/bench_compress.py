@@ -0,0 +1,80 @@
+"""
+Benchmark COMPRESS=DEFLATE contre le serveur IMAP local (benchmarks/fake_imap_server.py)
+Memes phases EmailReader avec et sans compression: octets envoyes sur le fil par le serveur
+(compresses quand DEFLATE est actif) et temps d'horloge
+
+Usage: python benchmarks/bench_compress.py [--bilans 200] [--photo-kb 256] [--latency 0.02]
+Les photos JPEG generees se compressent mal: le gain vient des headers, du texte et du base64.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_imap_server import start_server
+from mailbox_generator import generate_mailbox
+from bench_sync import PhaseRecorder, configure_env
+
+
+def run_phases(rec: PhaseRecorder, reader, args):
+    ok = lambda results: sum(1 for r in results if r and r.get("loaded"))
+    headers = rec.run("headers sans reponse", [lambda: reader.get_unanswered_emails(days=args.days, max_emails=10 ** 6)],
+                      count=lambda r: len(r[0]))[0]
+    rec.run("sync_changes complete", [lambda: reader.sync_changes(None, days=args.days, max_emails=10 ** 6)],
+            count=lambda r: len((r[0] or {}).get("new", [])))
+    uids = [e["id"] for e in headers][:args.bodies]
+    rec.run("contenu par lot", [lambda: list(reader.iter_email_contents(uids))], count=lambda r: ok(r[0]))
+    rec.run("threads X-GM-THRID", [lambda e=e: reader.get_thread(e["message_id"], e["id"]) for e in headers[:args.threads]],
+            count=lambda r: sum(len(t) for t in r))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bilans", type=int, default=200, help="bilans clients generes")
+    parser.add_argument("--photo-kb", type=int, default=256, help="taille moyenne des photos JPEG")
+    parser.add_argument("--days", type=int, default=180, help="fenetre de synchro / historique genere")
+    parser.add_argument("--bodies", type=int, default=40, help="emails dont on charge le contenu")
+    parser.add_argument("--threads", type=int, default=10, help="threads reconstitues")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence simulee par commande IMAP (s)")
+    args = parser.parse_args()
+
+    mailbox = generate_mailbox(args.bilans, photo_kb=args.photo_kb, days=args.days)
+    server = start_server(mailbox, latency=args.latency)
+    workdir = tempfile.mkdtemp(prefix="bench_compress_")
+    configure_env(server, mailbox, False, os.path.join(workdir, "raw_store"), False)
+    try:
+        import email_reader
+        runs = {}
+        for label, compress in (("sans", False), ("deflate", True)):
+            email_reader.IMAP_COMPRESS = compress  # lu a chaque ouverture de connexion du pool
+            reader = email_reader.EmailReader(pool_size=1)
+            rec = PhaseRecorder(server)
+            start = time.perf_counter()
+            run_phases(rec, reader, args)
+            runs[label] = (rec.results, time.perf_counter() - start, reader.pool.stats["compressed"])
+            reader.pool.close()
+
+        print()
+        print(f"{'phase':<26}{'Ko sans':>10}{'Ko deflate':>12}{'ratio':>8}{'ms sans':>10}{'ms deflate':>12}")
+        for plain, packed in zip(runs["sans"][0], runs["deflate"][0]):
+            ratio = plain["bytes"] / packed["bytes"] if packed["bytes"] else 0.0
+            print(f"{plain['phase']:<26}{plain['bytes'] / 1024:>10.0f}{packed['bytes'] / 1024:>12.0f}{ratio:>8.2f}"
+                  f"{plain['seconds'] * 1000:>10.0f}{packed['seconds'] * 1000:>12.0f}")
+        wire = {label: sum(r["bytes"] for r in results) for label, (results, _s, _c) in runs.items()}
+        print(f"{'total':<26}{wire['sans'] / 1024:>10.0f}{wire['deflate'] / 1024:>12.0f}"
+              f"{wire['sans'] / max(1, wire['deflate']):>8.2f}{runs['sans'][1] * 1000:>10.0f}{runs['deflate'][1] * 1000:>12.0f}")
+        print(f"[BENCH] connexions compressees: sans={runs['sans'][2]} deflate={runs['deflate'][2]}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark de la deduplication des headers a la synchro: une requete SQLite par email (ancien
+email_exists) vs DatabaseManager.get_new_message_ids (set en memoire + une requete par lot)
+
+Usage: python benchmarks/bench_dedup.py [emails_en_base] [headers_du_lot]
+Necessite streamlit (import de app.py).
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def legacy_exists(message_id: str) -> bool:
+    """Ancien email_exists: nouvelle connexion SQLite pour chaque email"""
+    conn = sqlite3.connect("coaching.db")
+    try:
+        return conn.execute("SELECT 1 FROM emails WHERE message_id = ?", (message_id,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def main():
+    stored = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    workdir = tempfile.mkdtemp(prefix="bench_dedup_")
+    os.chdir(workdir)  # coaching.db de app.py dans le dossier temporaire
+    try:
+        try:
+            import app
+        except ImportError as e:
+            print(f"[BENCH] app.py non importable ({e})")
+            return
+        db = app.DatabaseManager()
+        conn = sqlite3.connect(app.DB_PATH)
+        conn.executemany("INSERT INTO emails (message_id, client_email, subject, date, direction) VALUES (?, ?, ?, ?, ?)",
+                         [(f"<msg{i}@client.example>", f"client{i % 300}@client.example", "Bilan",
+                           "2026-01-01T00:00:00", "received") for i in range(stored)])
+        conn.commit()
+        conn.close()
+        # La moitie du lot est deja en base, l'autre moitie est nouvelle
+        ids = [f"<msg{i}@client.example>" for i in range(stored - batch // 2, stored + batch - batch // 2)]
+
+        start = time.perf_counter()
+        legacy_new = {m for m in ids if not legacy_exists(m)}
+        legacy_s = time.perf_counter() - start
+
+        app.DatabaseManager._known_ids = None  # set recharge: mesure du demarrage compris
+        start = time.perf_counter()
+        db._warm_known_ids()
+        warm_s = time.perf_counter() - start
+        start = time.perf_counter()
+        bulk_new = db.get_new_message_ids(ids)
+        bulk_s = time.perf_counter() - start
+        assert bulk_new == legacy_new, "resultats differents"
+
+        print(f"{stored} emails en base, lot de {batch} headers ({len(bulk_new)} nouveaux)")
+        print(f"{'methode':<34}{'total ms':>10}{'us/email':>10}")
+        print(f"{'email_exists (1 requete/email)':<34}{legacy_s * 1000:>10.1f}{legacy_s / batch * 1e6:>10.1f}")
+        print(f"{'get_new_message_ids (lot)':<34}{bulk_s * 1000:>10.1f}{bulk_s / batch * 1e6:>10.1f}")
+        print(f"{'chargement du set (demarrage)':<34}{warm_s * 1000:>10.1f}")
+    finally:
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
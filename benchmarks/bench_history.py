@@ -0,0 +1,108 @@
+"""
+Benchmark du chargement de l'historique d'un client avec pieces jointes: ancienne boucle N+1
+(une requete + un os.path.exists par email) vs DatabaseManager.get_client_history (deux requetes
+ensemblistes regroupees en une passe)
+
+Usage: python benchmarks/bench_history.py [emails_du_client] [emails_en_base]
+Necessite streamlit (import de app.py).
+"""
+
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+CLIENT = "julie.martin@client.example"
+
+
+def legacy_history(app, conn, client_email: str):
+    """Ancien get_client_history(load_attachments=True), filtre deja indexe: seul le N+1 est mesure"""
+    c = conn.cursor()
+    c.execute("SELECT * FROM emails WHERE client_key = ? ORDER BY date DESC", (app.client_key(client_email),))
+    history = []
+    for row in c.fetchall():
+        email_dict = dict(row)
+        email_dict['date'] = datetime.fromisoformat(email_dict['date'])
+        c.execute("SELECT filename, filepath, content_type FROM attachments WHERE message_id = ?", (email_dict['message_id'],))
+        attachments = []
+        for att_row in c.fetchall():
+            att = app.Attachment(att_row['filename'] or '', att_row['content_type'], filepath=att_row['filepath'])
+            if att.available:
+                attachments.append(att)
+        email_dict['attachments'] = attachments
+        history.append(email_dict)
+    history.sort(key=lambda x: x['date'])
+    return history
+
+
+def main():
+    client_emails = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    stored = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    runs = 20
+
+    workdir = tempfile.mkdtemp(prefix="bench_history_")
+    os.chdir(workdir)  # coaching.db et pieces jointes de app.py dans le dossier temporaire
+    try:
+        try:
+            import app
+        except ImportError as e:
+            print(f"[BENCH] app.py non importable ({e})")
+            return
+        db = app.DatabaseManager()
+        start_date = datetime(2024, 1, 1)
+        emails, attachments = [], []
+        for i in range(stored):
+            owner = CLIENT if i < client_emails else f"client{i % 2000}@client.example"
+            message_id = f"<msg{i}@client.example>"
+            body = f"Bilan semaine {i}: poids, sommeil, entrainements. " * 20
+            emails.append((message_id, owner, app.client_key(owner), "Bilan", (start_date + timedelta(hours=i)).isoformat(),
+                           body, "received" if i % 2 else "sent", 1))
+            for k in range(i % 4):  # 0 a 3 photos par email, fichiers reels sur disque
+                path = os.path.join(app.ATTACHMENTS_DIR, f"{i}_{k}.jpg")
+                if i < client_emails:
+                    with open(path, "wb") as f:
+                        f.write(b"\xff\xd8\xff" + b"\x00" * 64)
+                attachments.append((message_id, f"photo{k}.jpg", path, "image/jpeg"))
+        conn = sqlite3.connect(app.DB_PATH)
+        conn.row_factory = sqlite3.Row
+        conn.executemany("""INSERT INTO emails (message_id, client_email, client_key, subject, date, body, direction, body_loaded)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", emails)
+        conn.executemany("INSERT INTO attachments (message_id, filename, filepath, content_type) VALUES (?, ?, ?, ?)",
+                         attachments)
+        conn.commit()
+
+        results = {}
+        for name, load in (("boucle N+1 (ancienne)", lambda: legacy_history(app, conn, CLIENT)),
+                           ("get_client_history", lambda: db.get_client_history(CLIENT, load_attachments=True))):
+            with redirect_stdout(io.StringIO()):  # logs [DB] de chaque chargement
+                history = load()  # chauffe (cache de pages SQLite et du systeme de fichiers)
+                start = time.perf_counter()
+                for _ in range(runs):
+                    history = load()
+                results[name] = ((time.perf_counter() - start) / runs, history)
+        conn.close()
+
+        (_, old), (_, new) = results.values()
+        assert [e['message_id'] for e in old] == [e['message_id'] for e in new], "ordre different"
+        assert [len(e['attachments']) for e in old] == [len(e['attachments']) for e in new], "pieces jointes differentes"
+
+        print(f"{stored} emails en base, client de {len(new)} emails / {sum(len(e['attachments']) for e in new)} pieces jointes")
+        print(f"{'methode':<28}{'ms/chargement':>15}{'requetes':>10}")
+        for name, (seconds, history) in results.items():
+            queries = 1 + len(history) if name.startswith("boucle") else 2
+            print(f"{name:<28}{seconds * 1000:>15.1f}{queries:>10}")
+    finally:
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark extraction texte HTML: ancienne conversion par regex vs extracteur une passe
+Corps HTML marketing synthetiques (tableaux imbriques, CSS inline, preheader cache, pixels)
+
+Usage: python benchmarks/bench_html_to_text.py [taille_ko] [iterations]
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_text import html_to_text
+
+
+def legacy_html_to_text(html: str) -> str:
+    """Ancienne conversion de EmailReader._select_body (4 re.sub)"""
+    text = html
+    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'</p>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'<[^>]+>', ' ', text)
+    text = re.sub(r'&nbsp;', ' ', text)
+    return text.strip()
+
+
+def make_marketing_html(size_kb: int) -> str:
+    """Email HTML facon newsletter d'environ `size_kb` Ko"""
+    head = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Offre</title><style>"
+            + ".btn{background:#ff5a00;color:#fff;padding:12px 24px}" * 40
+            + "</style><!--[if mso]><xml><o:OfficeDocumentSettings/></xml><![endif]--></head><body>"
+            "<div style='display:none;max-height:0;overflow:hidden'>Decouvrez nos offres"
+            + "&zwnj;&nbsp;" * 120 + "</div>")
+    block = ("<table role='presentation' width='100%' cellpadding='0' cellspacing='0' style='max-width:600px'>"
+             "<tr><td style='padding:20px;font-family:Arial,sans-serif;font-size:16px;color:#333'>"
+             "<h2 style='margin:0'>Programme S&egrave;che &amp; Force &ndash; semaine {i}</h2>"
+             "<p style='line-height:1.5'>Bonjour&nbsp;! Voici votre s&eacute;ance du jour&nbsp;: "
+             "squat 5&times;5, d&eacute;velopp&eacute; couch&eacute; 4&times;8 &amp; 20&nbsp;min de cardio.</p>"
+             "<table><tr><td><a href='https://track.example.com/c/{i}?utm_source=nl' class='btn'>J&#8217;en profite</a>"
+             "</td><td><img src='https://track.example.com/o/{i}.gif' width='1' height='1' alt=''></td></tr></table>"
+             "<script>window.dataLayer=window.dataLayer||[];dataLayer.push({{'e':'{i}'}});</script>"
+             "</td></tr></table>")
+    parts = [head]
+    i = 0
+    while sum(len(p) for p in parts) < size_kb * 1024:
+        parts.append(block.format(i=i))
+        i += 1
+    parts.append("<p style='font-size:11px'>Se d&eacute;sinscrire</p></body></html>")
+    return "".join(parts)
+
+
+def bench(name, func, html: str, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        text = func(html)
+    elapsed = time.perf_counter() - start
+    mb = len(html.encode("utf-8")) * iterations / (1024 * 1024)
+    print(f"{name:<22} {mb / elapsed:8.1f} Mo/s  {elapsed / iterations * 1000:8.1f} ms/email  "
+          f"sortie {len(text):>8} car. (~{len(text) // 4} tokens)")
+    return text
+
+
+def main():
+    size_kb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    html = make_marketing_html(size_kb)
+    print(f"HTML marketing: {len(html) / 1024:.0f} Ko, {iterations} iterations")
+    legacy = bench("regex (ancien)", legacy_html_to_text, html, iterations)
+    text = bench("html_to_text (1 passe)", html_to_text, html, iterations)
+    print(f"Reduction de la sortie: {100 - 100 * len(text) / max(1, len(legacy)):.0f}%")
+    print("Extrait:", repr(text[:160]))
+
+
+if __name__ == "__main__":
+    main()
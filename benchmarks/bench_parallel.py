@@ -0,0 +1,99 @@
+"""
+Benchmark du fetch parallele (ParallelFetcher) contre le serveur IMAP local (benchmarks/fake_imap_server.py)
+Contenus de tout All Mail sur une connexion (iter_email_contents) puis sur N connexions, et backfill
+app.py avec workers=1 puis N. Le serveur plafonne le debit de chaque connexion, comme Gmail:
+c'est ce plafond que le parallelisme contourne.
+
+Usage: python benchmarks/bench_parallel.py [--bilans 120] [--photo-kb 256] [--bandwidth-kb 2048] [--workers 4]
+Les phases backfill ne tournent que si streamlit est installe (import de app.py).
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_imap_server import start_server, ALL_MAIL
+from mailbox_generator import generate_mailbox
+from bench_sync import PhaseRecorder, configure_env
+
+
+def bench_contents(rec: PhaseRecorder, reader, uids, workers: int):
+    from email_reader import ParallelFetcher
+    ok = lambda results: sum(1 for c in results[0] if c.get("loaded"))
+    rec.run("contenus: 1 connexion", [lambda: list(reader.iter_email_contents(uids, ALL_MAIL))], count=ok)
+    fetcher = ParallelFetcher(reader, workers=workers, chunk_size=max(1, len(uids) // (workers * 4)), folder=ALL_MAIL)
+    try:
+        with redirect_stdout(io.StringIO()):  # resume [FETCH] imprime a chaque appel
+            rec.run(f"contenus: {fetcher.workers} connexions", [lambda: list(fetcher.iter_contents(uids))], count=ok)
+    finally:
+        fetcher.close()
+
+
+def bench_backfill(rec: PhaseRecorder, reader, args):
+    try:
+        import app
+    except ImportError as e:
+        print(f"[BENCH] Phases backfill ignorees ({e})")
+        return
+    from db_connection import get_connection
+    db = app.DatabaseManager()
+    for workers in (1, args.workers):
+        conn = get_connection(app.DB_PATH)
+        with conn:  # base vide avant chaque run: memes emails a importer
+            for table in ("emails", "attachments", "backfill_state"):
+                conn.execute(f"DELETE FROM {table}")
+        app.DatabaseManager._known_ids = set()
+        with redirect_stdout(io.StringIO()):  # logs [BACKFILL] de chaque tranche
+            rec.run(f"backfill: workers={workers}",
+                    [lambda: app.run_backfill(reader, db, ALL_MAIL, chunk_size=args.chunk, pause=0, workers=workers)],
+                    count=lambda r: (r[0] or {}).get("saved", 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bilans", type=int, default=120, help="bilans clients generes")
+    parser.add_argument("--photo-kb", type=int, default=256, help="taille moyenne des photos JPEG")
+    parser.add_argument("--bandwidth-kb", type=float, default=2048, help="debit max par connexion (Ko/s)")
+    parser.add_argument("--latency", type=float, default=0.02, help="latence simulee par commande IMAP (s)")
+    parser.add_argument("--workers", type=int, default=4, help="connexions paralleles")
+    parser.add_argument("--chunk", type=int, default=100, help="UIDs par tranche de backfill")
+    args = parser.parse_args()
+
+    mailbox = generate_mailbox(args.bilans, photo_kb=args.photo_kb)
+    server = start_server(mailbox, latency=args.latency, bandwidth=args.bandwidth_kb * 1024)
+    workdir = tempfile.mkdtemp(prefix="bench_parallel_")
+    configure_env(server, mailbox, False, os.path.join(workdir, "raw_store"), False)
+    os.chdir(workdir)  # coaching.db et pieces jointes de app.py dans le dossier temporaire
+    try:
+        from email_reader import EmailReader
+        reader = EmailReader(pool_size=1)
+        uids = [str(uid) for uid in mailbox.folders[ALL_MAIL].uids()]
+        size = sum(len(m.raw) for _uid, m in mailbox.folders[ALL_MAIL].entries)
+        print(f"[BENCH] {len(uids)} emails dans All Mail ({size / 1e6:.0f} Mo), "
+              f"{args.bandwidth_kb:.0f} Ko/s par connexion, {args.latency * 1000:.0f} ms par commande")
+
+        rec = PhaseRecorder(server)
+        bench_contents(rec, reader, uids, args.workers)
+        bench_backfill(rec, reader, args)
+        rec.report()
+        results = {r["phase"]: r["seconds"] for r in rec.results}
+        phases = list(results)
+        for base, parallel in zip(phases[::2], phases[1::2]):
+            print(f"[BENCH] {parallel}: x{results[base] / max(results[parallel], 1e-9):.1f} vs {base}")
+        reader.pool.close()
+    finally:
+        server.shutdown()
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark de synchro de bout en bout contre le serveur IMAP local (benchmarks/fake_imap_server.py)
+Pilote EmailReader (et AsyncEmailReader) puis les fonctions de synchro de app.py sur une boite
+de coaching synthetique; rapporte messages/s, octets/s (cote serveur) et latence par phase
+
+Usage: python benchmarks/bench_sync.py [--bilans 200] [--photo-kb 1024] [--latency 0.02]
+                                       [--backend sync|async] [--cert cert.pem --key key.pem] [--store]
+Les phases app.py ne tournent que si streamlit est installe (import de app.py).
+"""
+
+import argparse
+import os
+import shutil
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_imap_server import FakeIMAPServer, start_server, ALL_MAIL
+from mailbox_generator import generate_mailbox
+
+
+class PhaseRecorder:
+    """Chronometre des phases: duree de chaque appel + octets envoyes par le serveur"""
+
+    def __init__(self, server: FakeIMAPServer):
+        self.server = server
+        self.results = []
+
+    def run(self, name: str, calls, count=None):
+        """Execute `calls` (liste de callables) et enregistre la phase
+        `count(resultats)` donne le nombre de messages traites (par defaut: un par appel)"""
+        self.server.reset_stats()
+        durations = []
+        results = []
+        start = time.perf_counter()
+        for call in calls:
+            t0 = time.perf_counter()
+            results.append(call())
+            durations.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+        messages = count(results) if count else len(calls)
+        self.results.append({"phase": name, "messages": messages, "seconds": total,
+                             "bytes": self.server.stats["bytes_out"], "commands": self.server.stats["commands"],
+                             "logins": self.server.stats["logins"], "durations": durations})
+        return results
+
+    def report(self):
+        print()
+        print(f"{'phase':<28}{'msgs':>7}{'total s':>9}{'msg/s':>9}{'Mo/s':>8}{'cmds':>7}{'logins':>7}"
+              f"{'p50 ms':>9}{'p95 ms':>9}")
+        for r in self.results:
+            secs = r["seconds"] or 1e-9
+            durations = sorted(r["durations"]) or [0.0]
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            print(f"{r['phase']:<28}{r['messages']:>7}{r['seconds']:>9.2f}{r['messages'] / secs:>9.1f}"
+                  f"{r['bytes'] / secs / 1e6:>8.1f}{r['commands']:>7}{r['logins']:>7}"
+                  f"{statistics.median(durations) * 1000:>9.1f}{p95 * 1000:>9.1f}")
+
+
+def configure_env(server: FakeIMAPServer, mailbox, tls: bool, store_dir: str, store: bool):
+    """Variables lues a l'import de email_reader / raw_store / app: a poser AVANT les imports"""
+    os.environ.update({"IMAP_SERVER": "127.0.0.1", "IMAP_PORT": str(server.port),
+                       "IMAP_SSL": "1" if tls else "0", "MAIL_USER": mailbox.user, "MAIL_PASS": mailbox.password,
+                       "RAW_STORE_DIR": store_dir, "RAW_STORE_MAX_MB": "2048" if store else "0",
+                       "IMAP_IDLE": "0"})
+
+
+def bench_reader(rec: PhaseRecorder, reader, args):
+    ok = lambda results: sum(1 for r in results if r and r.get("loaded"))
+
+    rec.run("connexion + STATUS", [lambda: reader.get_folder_status("INBOX")])
+    headers = rec.run("headers sans reponse", [lambda: reader.get_unanswered_emails(days=args.days, max_emails=10 ** 6)],
+                      count=lambda r: len(r[0]))[0]
+    changes = rec.run("sync_changes complete", [lambda: reader.sync_changes(None, days=args.days, max_emails=10 ** 6)],
+                      count=lambda r: len((r[0] or {}).get("new", [])))[0]
+    if changes:
+        rec.run("sync_changes incrementale", [lambda: reader.sync_changes(changes["checkpoint"], days=args.days)],
+                count=lambda r: len((r[0] or {}).get("new", [])))
+
+    uids = [e["id"] for e in headers][:args.bodies]
+    rec.run("contenu un par un", [lambda uid=uid: reader.load_email_content(uid) for uid in uids], count=ok)
+    rec.run("contenu par lot", [lambda: list(reader.iter_email_contents(uids))], count=lambda r: ok(r[0]))
+    rec.run("threads X-GM-THRID", [lambda e=e: reader.get_thread(e["message_id"], e["id"]) for e in headers[:args.threads]],
+            count=lambda r: sum(len(t) for t in r))
+
+
+def bench_app(rec: PhaseRecorder, reader, args):
+    try:
+        import app
+    except ImportError as e:
+        print(f"[BENCH] Phases app.py ignorees ({e})")
+        return
+    db = app.DatabaseManager()
+
+    def sync():
+        changes = app.load_sync_changes(reader, db, days=args.days, max_emails=10 ** 6)
+        saved = sum(1 for e in changes["new"] if db.save_email(e)) if changes else 0
+        if changes:
+            db.save_sync_state("INBOX", changes["checkpoint"])
+        return saved
+
+    rec.run("app: synchro + sauvegarde", [sync], count=lambda r: r[0])
+    rec.run("app: prefetch contenus", [lambda: app.prefetch_email_bodies(reader, db, limit=args.bodies)],
+            count=lambda r: r[0])
+    rec.run("app: backfill All Mail", [lambda: app.run_backfill(reader, db, ALL_MAIL, chunk_size=100, pause=0)],
+            count=lambda r: (r[0] or {}).get("saved", 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bilans", type=int, default=200, help="bilans clients generes")
+    parser.add_argument("--photo-kb", type=int, default=1024, help="taille moyenne des photos JPEG")
+    parser.add_argument("--days", type=int, default=180, help="fenetre de synchro / historique genere")
+    parser.add_argument("--bodies", type=int, default=40, help="emails dont on charge le contenu")
+    parser.add_argument("--threads", type=int, default=10, help="threads reconstitues")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence simulee par commande IMAP (s)")
+    parser.add_argument("--backend", choices=["sync", "async"], default="sync")
+    parser.add_argument("--pool-size", type=int, default=3)
+    parser.add_argument("--store", action="store_true", help="active le store local des messages bruts")
+    parser.add_argument("--cert", help="certificat PEM: active TLS")
+    parser.add_argument("--key", help="cle privee PEM")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    mailbox = generate_mailbox(args.bilans, photo_kb=args.photo_kb, days=args.days)
+    inbox = mailbox.folders["INBOX"].entries
+    size = sum(len(m.raw) for _uid, m in inbox)
+    print(f"[BENCH] Boite generee en {time.perf_counter() - t0:.1f}s: {len(inbox)} emails INBOX "
+          f"({size / 1e6:.0f} Mo), {len(mailbox.folders[ALL_MAIL].entries)} dans All Mail")
+
+    server_ctx = None
+    if args.cert:
+        server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_ctx.load_cert_chain(args.cert, args.key)
+    server = start_server(mailbox, ssl_context=server_ctx, latency=args.latency)
+
+    workdir = tempfile.mkdtemp(prefix="bench_sync_")
+    configure_env(server, mailbox, bool(server_ctx), os.path.join(workdir, "raw_store"), args.store)
+    os.chdir(workdir)  # coaching.db et pieces jointes de app.py dans le dossier temporaire
+    try:
+        if args.backend == "async":
+            from async_reader import AsyncEmailReader
+            client_ctx = None
+            if server_ctx:
+                client_ctx = ssl.create_default_context()
+                client_ctx.check_hostname = False
+                client_ctx.verify_mode = ssl.CERT_NONE  # certificat auto-signe du serveur local
+            reader = AsyncEmailReader(pool_size=args.pool_size, ssl_context=client_ctx)
+        else:
+            from email_reader import EmailReader
+            reader = EmailReader(pool_size=args.pool_size)
+
+        rec = PhaseRecorder(server)
+        bench_reader(rec, reader, args)
+        bench_app(rec, reader, args)
+        rec.report()
+        if args.backend == "async":
+            reader.close()
+        else:
+            reader.pool.close()
+    finally:
+        server.shutdown()
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
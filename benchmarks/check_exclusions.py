@@ -0,0 +1,82 @@
+"""
+Verification des exclusions: le filtre serveur (X-GM-RAW sur Gmail, SEARCH NOT FROM ailleurs) ne doit
+jamais ecarter un email que le filtre local is_excluded garderait, sinon le resultat depend du chemin
+(IDLE, synchro, backfill). Rejoue les deux regles sur un echantillon de sujets/expediteurs et affiche
+aussi les ecarts qu'aurait donnes l'ancienne requete serveur (mots-cles du sujet pousses au serveur).
+
+Usage: python benchmarks/check_exclusions.py
+Code retour 1 si un email garde localement est ecarte par le serveur.
+"""
+
+import os
+import re
+import sys
+from email.utils import parseaddr
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from exclusions import EXCLUDE_PATTERNS, EXCLUDE_SENDERS, is_excluded
+from mailbox_generator import NEWSLETTERS, NOTIFICATIONS
+
+# (From, Subject): emails de clients aux mots ambigus + notifications reelles
+SAMPLE = NEWSLETTERS + NOTIFICATIONS + [
+    ("Julie Martin <julie.martin@gmail.com>", "Bilan semaine 12 - Julie"),
+    ("Julie Martin <julie.martin@gmail.com>", "Re: mon login MyFitnessPal ne marche plus"),
+    ("Hugo Dubois <hugo.dubois@orange.fr>", "Alerte: douleur au genou apres la seance"),
+    ("Hugo Dubois <hugo.dubois@orange.fr>", "Recu ton programme, merci !"),
+    ("Chloe Bernard <chloe@bernard.fr>", "Commande de whey: laquelle prendre ?"),
+    ("Chloe Bernard <chloe@bernard.fr>", "Ordre des exercices du jeudi"),
+    ("Lea Petit <lea.petit@yahoo.fr>", "Confirmation rdv visio jeudi 18h"),
+    ("Lea Petit <lea.petit@yahoo.fr>", "Paiement du mois de mars"),
+    ("Tom Leroy <tom@leroy-security.fr>", "Question sur les macros"),
+    ("Sarah Noreply <sarah.n@gmail.com>", "Photos de la semaine"),
+    ("Marc <marc.facebook@gmail.com>", "Bilan du mois"),
+    ("Ines <ines@free.fr>", "Connexion a l'appli de suivi impossible"),
+    ("Ines <ines@free.fr>", "Security question: on garde les squats ?"),
+    ("Stripe <notifications@stripe.com>", "Payout of 300,00 EUR"),
+    ("LinkedIn <messages-noreply@linkedin.com>", "Vous apparaissez dans 12 recherches"),
+    ("Facebook <notification@facebookmail.com>", "Nouvelle connexion a votre compte"),
+    ("Google <no-reply@accounts.google.com>", "Security alert"),
+    ("Amazon <order-update@amazon.fr>", "Votre commande a ete expediee"),
+]
+
+
+def gmail_word(term: str, text: str) -> bool:
+    """X-GM-RAW: le terme doit apparaitre comme mot(s) entier(s), pas comme sous-chaine"""
+    return re.search(rf"(?<![a-z0-9]){re.escape(term)}(?![a-z0-9])", text.lower()) is not None
+
+
+def gmail_excluded(sender: str, subject: str, senders, subjects=()) -> bool:
+    return any(gmail_word(s, sender) for s in senders) or any(gmail_word(s, subject) for s in subjects)
+
+
+def imap_excluded(sender: str, senders) -> bool:
+    """SEARCH NOT FROM: sous-chaine insensible a la casse dans l'en-tete From"""
+    return any(s in sender.lower() for s in senders)
+
+
+def main():
+    mismatches = 0
+    legacy = 0
+    for sender, subject in SAMPLE:
+        local = is_excluded(subject, parseaddr(sender)[1])
+        server = gmail_excluded(sender, subject, EXCLUDE_SENDERS) or imap_excluded(sender, EXCLUDE_SENDERS)
+        # Resultat final = serveur puis filtre local: doit etre celui du filtre local seul
+        if server and not local:
+            mismatches += 1
+            print(f"[BENCH] ECART serveur/local: {sender!r} {subject!r}")
+        old_server = gmail_excluded(sender, subject, EXCLUDE_PATTERNS, EXCLUDE_PATTERNS)
+        if old_server != local:
+            legacy += 1
+            print(f"[BENCH] ancienne requete: {'exclu' if old_server else 'garde'} par le serveur, "
+                  f"{'exclu' if local else 'garde'} en local: {subject!r}")
+        print(f"[BENCH] {'exclu' if local else 'garde':5} serveur={'oui' if server else 'non':3} {subject}")
+    print(f"[BENCH] {len(SAMPLE)} emails, {mismatches} ecarts serveur/local "
+          f"({legacy} avec l'ancienne requete par mots-cles)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
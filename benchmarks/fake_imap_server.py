@@ -0,0 +1,919 @@
+"""
+Serveur IMAP4rev1 local (faux Gmail) pour tests et benchmarks de synchro
+Supporte UID SEARCH/FETCH/STORE, IDLE, CONDSTORE/QRESYNC, X-GM-*, COMPRESS=DEFLATE, TLS optionnel
+
+Usage autonome (pour lancer l'app contre une boite synthetique):
+    python benchmarks/fake_imap_server.py [--port 1143] [--messages 300] [--cert cert.pem --key key.pem]
+puis IMAP_SERVER=127.0.0.1 IMAP_PORT=1143 IMAP_SSL=0 MAIL_USER=coach@example.com MAIL_PASS=secret
+"""
+
+import email
+import email.policy
+import email.utils
+import re
+import select
+import socket
+import socketserver
+import ssl
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+ALL_MAIL = "[Gmail]/All Mail"
+SENT_MAIL = "[Gmail]/Sent Mail"
+
+CAPABILITIES = ("IMAP4rev1 UIDPLUS IDLE ENABLE CONDSTORE QRESYNC X-GM-EXT-1 "
+                "COMPRESS=DEFLATE LITERAL+ AUTH=PLAIN")
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+class FakeMessage:
+    """Message stocke par le serveur (partage entre dossiers comme les labels Gmail)"""
+
+    def __init__(self, raw: bytes, internaldate: datetime, flags=None, thrid: int = 0,
+                 gm_msgid: int = 0, category: str = "primary"):
+        self.raw = raw
+        self.internaldate = internaldate
+        self.flags = set(flags or [])
+        self.thrid = thrid
+        self.gm_msgid = gm_msgid
+        self.category = category
+        self.modseq = 1
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            self._parsed = email.message_from_bytes(self.raw, policy=email.policy.compat32)
+        return self._parsed
+
+
+class FakeFolder:
+    def __init__(self, name: str, uidvalidity: int):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.entries: List[List[Any]] = []  # [uid, FakeMessage]
+        self.vanished: List[tuple] = []  # (uid, modseq)
+
+    def uids(self) -> List[int]:
+        return [e[0] for e in self.entries]
+
+
+class FakeMailbox:
+    """Boite mail en memoire, thread-safe, avec compteur MODSEQ global"""
+
+    def __init__(self, user: str = "coach@example.com", password: str = "secret"):
+        self.user = user
+        self.password = password
+        self.lock = threading.RLock()
+        self.folders: Dict[str, FakeFolder] = {}
+        self.highestmodseq = 1
+        self.listeners: List[Any] = []
+        self._next_msgid = 1000
+        for i, name in enumerate(["INBOX", SENT_MAIL, ALL_MAIL]):
+            self.folders[name] = FakeFolder(name, uidvalidity=1700000000 + i)
+
+    def _bump(self) -> int:
+        self.highestmodseq += 1
+        return self.highestmodseq
+
+    def append(self, raw: bytes, folder: str = "INBOX", internaldate: Optional[datetime] = None,
+               flags=None, thrid: int = 0, category: str = "primary") -> FakeMessage:
+        """Ajoute un message dans `folder` et dans All Mail, notifie les clients en IDLE"""
+        with self.lock:
+            self._next_msgid += 1
+            msg = FakeMessage(raw, internaldate or datetime.now(timezone.utc), flags,
+                              thrid or self._next_msgid, self._next_msgid, category)
+            msg.modseq = self._bump()
+            for name in {folder, ALL_MAIL}:
+                f = self.folders.setdefault(name, FakeFolder(name, 1700000000 + len(self.folders)))
+                f.entries.append([f.uidnext, msg])
+                f.uidnext += 1
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener.notify(folder)
+            if folder != ALL_MAIL:
+                listener.notify(ALL_MAIL)
+        return msg
+
+    def expunge(self, folder: str, uid: int):
+        with self.lock:
+            f = self.folders[folder]
+            for idx, (u, _m) in enumerate(f.entries):
+                if u == uid:
+                    del f.entries[idx]
+                    f.vanished.append((uid, self._bump()))
+                    break
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener.notify(folder)
+
+    def set_flags(self, msg: FakeMessage, flags, mode: str):
+        with self.lock:
+            before = set(msg.flags)
+            if mode == "+":
+                msg.flags |= set(flags)
+            elif mode == "-":
+                msg.flags -= set(flags)
+            else:
+                msg.flags = set(flags)
+            if msg.flags != before:
+                msg.modseq = self._bump()
+
+
+# --- Parsing des commandes ---
+
+class Literal(bytes):
+    pass
+
+
+def tokenize(data: bytes, literals: List[bytes]) -> List[Any]:
+    """Decoupe une ligne de commande IMAP en atomes / chaines / listes imbriquees"""
+    pos = 0
+    stack: List[List[Any]] = [[]]
+    n = len(data)
+    while pos < n:
+        ch = data[pos:pos + 1]
+        if ch == b" ":
+            pos += 1
+        elif ch == b"(":
+            stack.append([])
+            pos += 1
+        elif ch == b")":
+            inner = stack.pop()
+            stack[-1].append(inner)
+            pos += 1
+        elif ch == b'"':
+            pos += 1
+            out = bytearray()
+            while pos < n and data[pos:pos + 1] != b'"':
+                if data[pos:pos + 1] == b"\\":
+                    pos += 1
+                out += data[pos:pos + 1]
+                pos += 1
+            pos += 1
+            stack[-1].append(bytes(out).decode("utf-8", "replace"))
+        elif ch == b"\x00":
+            end = data.index(b"\x00", pos + 1)
+            stack[-1].append(Literal(literals[int(data[pos + 1:end])]))
+            pos = end + 1
+        else:
+            start = pos
+            depth = 0
+            while pos < n:
+                c = data[pos:pos + 1]
+                if c == b"[":
+                    depth += 1
+                elif c == b"]":
+                    depth -= 1
+                elif depth == 0 and c in (b" ", b"(", b")"):
+                    break
+                pos += 1
+            stack[-1].append(data[start:pos].decode("utf-8", "replace"))
+    return stack[0]
+
+
+def parse_seqset(spec: str, max_value: int) -> set:
+    out = set()
+    for chunk in spec.split(","):
+        if ":" in chunk:
+            a, b = chunk.split(":")
+            a = max_value if a == "*" else int(a)
+            b = max_value if b == "*" else int(b)
+            lo, hi = min(a, b), max(a, b)
+            out.update(range(lo, hi + 1))
+        else:
+            out.add(max_value if chunk == "*" else int(chunk))
+    return out
+
+
+def quote(value) -> bytes:
+    if value is None:
+        return b"NIL"
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if b"\r" in value or b"\n" in value or b'"' in value and b"\\" in value:
+        return b"{%d}\r\n" % len(value) + value
+    return b'"' + value.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+
+
+def imap_date(dt: datetime) -> str:
+    return "%02d-%s-%04d %02d:%02d:%02d +0000" % (dt.day, MONTHS[dt.month - 1], dt.year,
+                                                   dt.hour, dt.minute, dt.second)
+
+
+def _addresses(value) -> bytes:
+    if not value:
+        return b"NIL"
+    out = []
+    for name, addr in email.utils.getaddresses([value]):
+        mailbox, _, host = addr.partition("@")
+        out.append(b"(" + b" ".join([quote(name or None), b"NIL", quote(mailbox or None),
+                                      quote(host or None)]) + b")")
+    return b"(" + b"".join(out) + b")"
+
+
+def envelope(msg) -> bytes:
+    frm = msg.get("From")
+    fields = [
+        quote(msg.get("Date")),
+        quote(msg.get("Subject")),
+        _addresses(frm),
+        _addresses(msg.get("Sender") or frm),
+        _addresses(msg.get("Reply-To") or frm),
+        _addresses(msg.get("To")),
+        _addresses(msg.get("Cc")),
+        _addresses(msg.get("Bcc")),
+        quote(msg.get("In-Reply-To")),
+        quote(msg.get("Message-ID")),
+    ]
+    return b"(" + b" ".join(fields) + b")"
+
+
+def _split_headers(raw: bytes):
+    idx = raw.find(b"\r\n\r\n")
+    if idx < 0:
+        idx = raw.find(b"\n\n")
+        return (raw, b"") if idx < 0 else (raw[:idx + 2], raw[idx + 2:])
+    return raw[:idx + 4], raw[idx + 4:]
+
+
+def _part_bytes(part) -> bytes:
+    return part.as_bytes(policy=email.policy.compat32.clone(linesep="\r\n"))
+
+
+def bodystructure(part) -> bytes:
+    if part.get_content_type() == "message/rfc822":
+        inner = part.get_payload()[0]
+        body = _split_headers(_part_bytes(part))[1]
+        return b"(" + b" ".join([b'"message" "rfc822" NIL NIL NIL', quote(part.get("Content-Transfer-Encoding", "7bit").upper()),
+                                 str(len(body)).encode(), envelope(inner), bodystructure(inner),
+                                 str(body.count(b"\n")).encode()]) + b")"
+    if part.is_multipart():
+        subs = b"".join(bodystructure(p) for p in part.get_payload())
+        return subs.join([b"(", b" " + quote(part.get_content_subtype()) + b" NIL NIL NIL NIL)"])
+    maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+    params = part.get_params() or []
+    plist = [quote(k) + b" " + quote(v) for k, v in params[1:]]
+    params_b = b"(" + b" ".join(plist) + b")" if plist else b"NIL"
+    body = _split_headers(_part_bytes(part))[1]
+    enc = part.get("Content-Transfer-Encoding", "7bit")
+    fields = [quote(maintype), quote(subtype), params_b, quote(part.get("Content-ID")), b"NIL",
+              quote(enc.upper()), str(len(body)).encode()]
+    if maintype == "text":
+        fields.append(str(body.count(b"\n")).encode())
+    fields.append(b"NIL")
+    disp = part.get("Content-Disposition")
+    if disp:
+        kind = disp.split(";")[0].strip()
+        fname = part.get_filename()
+        dparams = b"(" + quote("filename") + b" " + quote(fname) + b")" if fname else b"NIL"
+        fields.append(b"(" + quote(kind) + b" " + dparams + b")")
+    else:
+        fields.append(b"NIL")
+    fields.append(b"NIL")
+    return b"(" + b" ".join(fields) + b")"
+
+
+def find_part(msg, path: List[int]):
+    part = msg
+    for num in path:
+        if part.get_content_type() == "message/rfc822":
+            part = part.get_payload()[0]
+        if part.is_multipart():
+            part = part.get_payload()[num - 1]
+        elif num != 1:
+            return None
+    return part
+
+
+def section_bytes(fm: FakeMessage, section: str) -> bytes:
+    raw = fm.raw
+    sec = section.upper()
+    if sec == "":
+        return raw
+    if sec == "HEADER":
+        return _split_headers(raw)[0]
+    if sec == "TEXT":
+        return _split_headers(raw)[1]
+    m = re.match(r"HEADER\.FIELDS(\.NOT)?\s*\((.*)\)", section, re.I)
+    if m:
+        wanted = {f.lower() for f in m.group(2).split()}
+        negate = bool(m.group(1))
+        lines = []
+        for k, v in fm.parsed.items():
+            if (k.lower() in wanted) != negate:
+                lines.append(f"{k}: {v}".encode("utf-8", "replace"))
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+    m = re.match(r"([\d.]+?)(?:\.(MIME|HEADER|TEXT))?$", sec)
+    if m:
+        part = find_part(fm.parsed, [int(x) for x in m.group(1).split(".")])
+        if part is None:
+            return b""
+        headers, body = _split_headers(_part_bytes(part))
+        if m.group(2) in ("MIME", "HEADER"):
+            return headers
+        if part is fm.parsed:
+            return _split_headers(raw)[1]
+        return body
+    return b""
+
+
+class Listener:
+    """File de notifications pour une session en IDLE"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.event = threading.Event()
+
+    def notify(self, folder: str):
+        if folder == self.folder:
+            self.event.set()
+
+
+class FakeIMAPHandler(socketserver.BaseRequestHandler):
+    """Session IMAP: IO bufferisee avec couche DEFLATE optionnelle"""
+
+    def setup(self):
+        self.mailbox: FakeMailbox = self.server.mailbox
+        self.sock = self.request
+        # Une reponse = plusieurs send(): sans TCP_NODELAY, Nagle + ACK retarde ajoutent ~40 ms par reponse
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = b""
+        self.inflater = None
+        self.deflater = None
+        self.folder: Optional[FakeFolder] = None
+        self.known: List[int] = []  # UIDs connus du client (pour EXPUNGE)
+        self.enabled = set()
+        self.authenticated = False
+        self.server.stats["connections"] += 1
+
+    # IO
+    def _recv(self) -> bool:
+        try:
+            chunk = self.sock.recv(65536)
+        except (OSError, ssl.SSLError):
+            return False
+        if not chunk:
+            return False
+        self.server.stats["bytes_in"] += len(chunk)
+        if self.inflater is not None:
+            chunk = self.inflater.decompress(chunk)
+        self.buffer += chunk
+        return True
+
+    def readline(self) -> Optional[bytes]:
+        while b"\r\n" not in self.buffer:
+            if not self._recv():
+                return None
+        line, self.buffer = self.buffer.split(b"\r\n", 1)
+        return line
+
+    def read(self, n: int) -> Optional[bytes]:
+        while len(self.buffer) < n:
+            if not self._recv():
+                return None
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def send(self, data: bytes):
+        if self.deflater is not None:
+            data = self.deflater.compress(data) + self.deflater.flush(zlib.Z_SYNC_FLUSH)
+        self.server.stats["bytes_out"] += len(data)
+        self.sock.sendall(data)
+        if self.server.bandwidth:
+            time.sleep(len(data) / self.server.bandwidth)  # debit plafonne par connexion, comme Gmail
+
+    def read_command(self):
+        line = self.readline()
+        if line is None:
+            return None
+        literals = []
+        parts = []
+        while True:
+            m = re.search(rb"\{(\d+)(\+?)\}$", line)
+            if not m:
+                parts.append(line)
+                break
+            parts.append(line[:m.start()] + b"\x00%d\x00" % len(literals))
+            if not m.group(2):
+                self.send(b"+ go ahead\r\n")
+            lit = self.read(int(m.group(1)))
+            if lit is None:
+                return None
+            literals.append(lit)
+            line = self.readline()
+            if line is None:
+                return None
+        return b"".join(parts), literals
+
+    def handle(self):
+        if self.server.ssl_context is not None:
+            try:
+                self.sock = self.server.ssl_context.wrap_socket(self.sock, server_side=True)
+            except (OSError, ssl.SSLError):
+                return  # sonde TCP sans handshake TLS
+        self.send(b"* OK [CAPABILITY " + CAPABILITIES.encode() + b"] Fake Gmail ready\r\n")
+        while True:
+            cmd = self.read_command()
+            if cmd is None:
+                break
+            line, literals = cmd
+            tokens = tokenize(line, literals)
+            if len(tokens) < 2:
+                self.send(b"* BAD empty command\r\n")
+                continue
+            tag, name, args = tokens[0], tokens[1].upper(), tokens[2:]
+            self.server.stats["commands"] += 1
+            if self.server.latency:
+                time.sleep(self.server.latency)  # aller-retour reseau simule, une fois par commande
+            try:
+                if name == "UID":
+                    sub, args = args[0].upper(), args[1:]
+                    handler = getattr(self, "cmd_uid_" + sub.lower(), None)
+                else:
+                    handler = getattr(self, "cmd_" + name.lower(), None)
+                if handler is None:
+                    self.send(f"{tag} BAD unknown command {name}\r\n".encode())
+                    continue
+                result = handler(tag, args)
+                if result == "close":
+                    break
+            except Exception as e:  # erreur de parsing: le client recoit un BAD
+                self.send(f"{tag} BAD {type(e).__name__}: {e}\r\n".encode())
+
+    # --- commandes ---
+    def cmd_capability(self, tag, args):
+        self.send(b"* CAPABILITY " + CAPABILITIES.encode() + b"\r\n")
+        self.send(f"{tag} OK CAPABILITY completed\r\n".encode())
+
+    def cmd_login(self, tag, args):
+        user = args[0].decode() if isinstance(args[0], bytes) else str(args[0])
+        pwd = args[1].decode() if isinstance(args[1], bytes) else str(args[1])
+        if self.server.login_delay:
+            time.sleep(self.server.login_delay)
+        if user == self.mailbox.user and pwd == self.mailbox.password:
+            self.authenticated = True
+            self.server.stats["logins"] += 1
+            self.send(f"{tag} OK LOGIN completed\r\n".encode())
+        else:
+            self.send(f"{tag} NO [AUTHENTICATIONFAILED] Invalid credentials\r\n".encode())
+
+    def cmd_logout(self, tag, args):
+        self.send(b"* BYE logging out\r\n")
+        self.send(f"{tag} OK LOGOUT completed\r\n".encode())
+        return "close"
+
+    def cmd_noop(self, tag, args):
+        self._pending_updates()
+        self.send(f"{tag} OK NOOP completed\r\n".encode())
+
+    def cmd_enable(self, tag, args):
+        caps = {str(a).upper() for a in args}
+        if "QRESYNC" in caps:
+            caps.add("CONDSTORE")
+        self.enabled |= caps & {"CONDSTORE", "QRESYNC"}
+        self.send(b"* ENABLED " + " ".join(sorted(caps & {"CONDSTORE", "QRESYNC"})).encode() + b"\r\n")
+        self.send(f"{tag} OK ENABLE completed\r\n".encode())
+
+    def cmd_compress(self, tag, args):
+        if str(args[0]).upper() != "DEFLATE" or self.deflater is not None:
+            self.send(f"{tag} NO [COMPRESSIONACTIVE] compression already active\r\n".encode())
+            return
+        self.send(f"{tag} OK DEFLATE active\r\n".encode())
+        self.inflater = zlib.decompressobj(-15)
+        self.deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        if self.buffer:
+            self.buffer = self.inflater.decompress(self.buffer)
+
+    def cmd_list(self, tag, args):
+        with self.mailbox.lock:
+            names = list(self.mailbox.folders)
+        special = {ALL_MAIL: " \\All", SENT_MAIL: " \\Sent"}
+        for name in names:
+            self.send(b'* LIST (\\HasNoChildren' + special.get(name, "").encode() + b') "/" ' + quote(name) + b"\r\n")
+        self.send(f"{tag} OK LIST completed\r\n".encode())
+
+    def cmd_status(self, tag, args):
+        name = str(args[0])
+        f = self.mailbox.folders.get(name)
+        if f is None:
+            self.send(f"{tag} NO no such mailbox\r\n".encode())
+            return
+        items = []
+        for item in args[1]:
+            item = str(item).upper()
+            value = {"MESSAGES": len(f.entries), "UIDNEXT": f.uidnext, "UIDVALIDITY": f.uidvalidity,
+                     "UNSEEN": sum(1 for _u, m in f.entries if "\\Seen" not in m.flags),
+                     "HIGHESTMODSEQ": self.mailbox.highestmodseq}.get(item)
+            if value is not None:
+                items.append(f"{item} {value}")
+        self.send(b"* STATUS " + quote(name) + f" ({' '.join(items)})\r\n".encode())
+        self.send(f"{tag} OK STATUS completed\r\n".encode())
+
+    def cmd_select(self, tag, args, readonly=False):
+        name = str(args[0])
+        if name.upper() == "INBOX":
+            name = "INBOX"
+        f = self.mailbox.folders.get(name)
+        if f is None:
+            self.send(f"{tag} NO [NONEXISTENT] Unknown mailbox {name}\r\n".encode())
+            return
+        self.folder = f
+        with self.mailbox.lock:
+            self.known = f.uids()
+            count = len(f.entries)
+            modseq = self.mailbox.highestmodseq
+        self.send(b"* FLAGS (\\Answered \\Flagged \\Draft \\Deleted \\Seen)\r\n")
+        self.send(f"* {count} EXISTS\r\n* 0 RECENT\r\n".encode())
+        self.send(f"* OK [UIDVALIDITY {f.uidvalidity}] UIDs valid\r\n".encode())
+        self.send(f"* OK [UIDNEXT {f.uidnext}] Predicted next UID\r\n".encode())
+        self.send(f"* OK [HIGHESTMODSEQ {modseq}]\r\n".encode())
+        # QRESYNC: SELECT mbox (QRESYNC (uidvalidity modseq [known-uids]))
+        if len(args) > 1 and isinstance(args[1], list) and args[1] and str(args[1][0]).upper() == "QRESYNC":
+            params = args[1][1]
+            if int(params[0]) == f.uidvalidity:
+                since = int(params[1])
+                with self.mailbox.lock:
+                    vanished = [u for u, ms in f.vanished if ms > since]
+                    changed = [(i + 1, e) for i, e in enumerate(f.entries) if e[1].modseq > since]
+                if vanished:
+                    self.send(b"* VANISHED (EARLIER) " + ",".join(map(str, vanished)).encode() + b"\r\n")
+                for seq, (uid, msg) in changed:
+                    self.send(f"* {seq} FETCH (UID {uid} FLAGS ({' '.join(sorted(msg.flags))}) "
+                              f"MODSEQ ({msg.modseq}))\r\n".encode())
+        mode = "READ-ONLY" if readonly else "READ-WRITE"
+        self.send(f"{tag} OK [{mode}] SELECT completed\r\n".encode())
+
+    def cmd_examine(self, tag, args):
+        return self.cmd_select(tag, args, readonly=True)
+
+    def cmd_close(self, tag, args):
+        self.folder = None
+        self.send(f"{tag} OK CLOSE completed\r\n".encode())
+
+    def cmd_idle(self, tag, args):
+        if self.folder is None:
+            self.send(f"{tag} BAD no mailbox selected\r\n".encode())
+            return
+        listener = Listener(self.folder.name)
+        with self.mailbox.lock:
+            self.mailbox.listeners.append(listener)
+        self.send(b"+ idling\r\n")
+        try:
+            while True:
+                if b"\r\n" in self.buffer:
+                    line = self.readline()
+                    if line is not None and line.strip().upper() == b"DONE":
+                        break
+                if listener.event.is_set():
+                    listener.event.clear()
+                    self._pending_updates()
+                ready, _, _ = select.select([self.sock], [], [], 0.05)
+                if ready or (hasattr(self.sock, "pending") and self.sock.pending()):
+                    if not self._recv():
+                        return "close"
+        finally:
+            with self.mailbox.lock:
+                self.mailbox.listeners.remove(listener)
+        self.send(f"{tag} OK IDLE terminated\r\n".encode())
+
+    def _pending_updates(self):
+        """Envoie EXPUNGE / EXISTS pour les changements depuis la derniere vue du client"""
+        if self.folder is None:
+            return
+        with self.mailbox.lock:
+            current = self.folder.uids()
+        current_set = set(current)
+        for idx in range(len(self.known) - 1, -1, -1):
+            if self.known[idx] not in current_set:
+                if "QRESYNC" in self.enabled:
+                    self.send(f"* VANISHED {self.known[idx]}\r\n".encode())
+                else:
+                    self.send(f"* {idx + 1} EXPUNGE\r\n".encode())
+                del self.known[idx]
+        if len(current) != len(self.known):
+            self.known = current
+            self.send(f"* {len(current)} EXISTS\r\n".encode())
+
+    # SEARCH
+    def _match(self, crit: List[Any], idx: int, uid: int, msg: FakeMessage, total: int):
+        """Consomme un critere de `crit` et retourne (match, reste)"""
+        key = crit[0]
+        rest = crit[1:]
+        if isinstance(key, list):
+            ok, _ = self._match_all(key, idx, uid, msg, total), None
+            return ok, rest
+        k = str(key).upper()
+        parsed = msg.parsed
+        if k == "ALL":
+            return True, rest
+        if k in ("ANSWERED", "UNANSWERED", "SEEN", "UNSEEN", "FLAGGED", "DELETED"):
+            flag = "\\" + k.replace("UN", "", 1).capitalize() if k.startswith("UN") else "\\" + k.capitalize()
+            has = flag in msg.flags
+            return (not has if k.startswith("UN") else has), rest
+        if k in ("SINCE", "BEFORE", "ON", "SENTSINCE", "SENTBEFORE"):
+            day = datetime.strptime(str(rest[0]), "%d-%b-%Y").date()
+            d = msg.internaldate.date()
+            ok = d >= day if "SINCE" in k else (d < day if "BEFORE" in k else d == day)
+            return ok, rest[1:]
+        if k in ("FROM", "TO", "CC", "SUBJECT", "BODY", "TEXT"):
+            needle = str(rest[0]).lower()
+            if k in ("BODY", "TEXT"):
+                hay = msg.raw.decode("utf-8", "ignore").lower()
+            else:
+                hay = str(parsed.get(k.capitalize(), "")).lower()
+            return needle in hay, rest[1:]
+        if k == "HEADER":
+            hay = str(parsed.get(str(rest[0]), "")).lower()
+            return str(rest[1]).lower() in hay, rest[2:]
+        if k == "NOT":
+            ok, rest2 = self._match(rest, idx, uid, msg, total)
+            return not ok, rest2
+        if k == "OR":
+            a, rest2 = self._match(rest, idx, uid, msg, total)
+            b, rest3 = self._match(rest2, idx, uid, msg, total)
+            return a or b, rest3
+        if k == "UID":
+            return uid in parse_seqset(str(rest[0]), self.folder.uidnext - 1 or 1), rest[1:]
+        if k == "MODSEQ":
+            return msg.modseq > int(rest[0]) - 1, rest[1:]
+        if k == "LARGER":
+            return len(msg.raw) > int(rest[0]), rest[1:]
+        if k == "SMALLER":
+            return len(msg.raw) < int(rest[0]), rest[1:]
+        if k == "X-GM-THRID":
+            return msg.thrid == int(rest[0]), rest[1:]
+        if k == "X-GM-MSGID":
+            return msg.gm_msgid == int(rest[0]), rest[1:]
+        if k == "X-GM-RAW":
+            return self._gm_raw(str(rest[0]), msg), rest[1:]
+        if re.match(r"^[\d:*,]+$", k):
+            return (idx + 1) in parse_seqset(k, total), rest
+        raise ValueError(f"critere SEARCH inconnu: {k}")
+
+    def _match_all(self, crit, idx, uid, msg, total) -> bool:
+        ok = True
+        while crit:
+            res, crit = self._match(crit, idx, uid, msg, total)
+            ok = ok and res
+        return ok
+
+    def _gm_raw(self, query: str, msg: FakeMessage) -> bool:
+        """Sous-ensemble de la syntaxe de recherche Gmail: from:, to:, category:, subject:, mots"""
+        parsed = msg.parsed
+        ok = True
+        for term in re.findall(r'-?\w+:"[^"]*"|-?\S+', query):
+            negate = term.startswith("-")
+            term = term.lstrip("-")
+            if term.startswith("{") or term.startswith("("):
+                continue
+            if ":" in term:
+                field, value = term.split(":", 1)
+                value = value.strip('"').lower()
+                field = field.lower()
+                if field == "category":
+                    hit = msg.category == value
+                elif field == "rfc822msgid":
+                    hit = value.strip("<>") == str(parsed.get("Message-ID", "")).strip().strip("<>").lower()
+                elif field == "in" and value in ("sent", "inbox"):
+                    hit = (value == "sent") == ("\\Sent" in msg.flags)
+                else:
+                    hit = value in str(parsed.get(field.capitalize(), "")).lower()
+            else:
+                hit = term.lower() in msg.raw.decode("utf-8", "ignore").lower()
+            ok = ok and (not hit if negate else hit)
+        return ok
+
+    def _search(self, args, by_uid: bool):
+        if self.folder is None:
+            return None
+        crit = list(args)
+        if crit and str(crit[0]).upper() == "CHARSET":
+            crit = crit[2:]
+        with self.mailbox.lock:
+            entries = list(self.folder.entries)
+        total = len(entries)
+        hits = []
+        for idx, (uid, msg) in enumerate(entries):
+            if self._match_all(list(crit), idx, uid, msg, total):
+                hits.append(uid if by_uid else idx + 1)
+        return hits
+
+    def cmd_search(self, tag, args, by_uid=False):
+        hits = self._search(args, by_uid)
+        if hits is None:
+            self.send(f"{tag} BAD no mailbox selected\r\n".encode())
+            return
+        self.send(b"* SEARCH" + b"".join(b" %d" % h for h in hits) + b"\r\n")
+        self.send(f"{tag} OK SEARCH completed\r\n".encode())
+
+    def cmd_uid_search(self, tag, args):
+        return self.cmd_search(tag, args, by_uid=True)
+
+    # FETCH
+    def _resolve(self, spec: str, by_uid: bool):
+        with self.mailbox.lock:
+            entries = list(self.folder.entries)
+        if by_uid:
+            max_uid = entries[-1][0] if entries else 0
+            wanted = parse_seqset(spec, max_uid)
+            return [(i + 1, e[0], e[1]) for i, e in enumerate(entries) if e[0] in wanted]
+        wanted = parse_seqset(spec, len(entries))
+        return [(i + 1, e[0], e[1]) for i, e in enumerate(entries) if i + 1 in wanted]
+
+    def _fetch_item(self, item: str, uid: int, msg: FakeMessage) -> Optional[bytes]:
+        up = item.upper()
+        if up == "UID":
+            return b"UID %d" % uid
+        if up == "FLAGS":
+            return b"FLAGS (" + " ".join(sorted(msg.flags)).encode() + b")"
+        if up == "INTERNALDATE":
+            return b'INTERNALDATE "' + imap_date(msg.internaldate).encode() + b'"'
+        if up == "RFC822.SIZE":
+            return b"RFC822.SIZE %d" % len(msg.raw)
+        if up == "ENVELOPE":
+            return b"ENVELOPE " + envelope(msg.parsed)
+        if up in ("BODYSTRUCTURE", "BODY"):
+            return up.encode() + b" " + bodystructure(msg.parsed)
+        if up == "MODSEQ":
+            return b"MODSEQ (%d)" % msg.modseq
+        if up == "X-GM-THRID":
+            return b"X-GM-THRID %d" % msg.thrid
+        if up == "X-GM-MSGID":
+            return b"X-GM-MSGID %d" % msg.gm_msgid
+        if up == "X-GM-LABELS":
+            labels = "\\\\Sent" if "\\Sent" in msg.flags else "\\\\Inbox"
+            return b'X-GM-LABELS ("' + labels.encode() + b'")'
+        if up in ("RFC822", "RFC822.HEADER", "RFC822.TEXT"):
+            section = {"RFC822": "", "RFC822.HEADER": "HEADER", "RFC822.TEXT": "TEXT"}[up]
+            data = section_bytes(msg, section)
+            return up.encode() + b" {%d}\r\n" % len(data) + data
+        m = re.match(r"BODY(\.PEEK)?\[(.*)\](?:<(\d+)\.(\d+)>)?$", item, re.I | re.S)
+        if m:
+            section = m.group(2)
+            data = section_bytes(msg, section)
+            label = "BODY[" + section + "]"
+            if m.group(3) is not None:
+                start, length = int(m.group(3)), int(m.group(4))
+                data = data[start:start + length]
+                label += f"<{start}>"
+            if not m.group(1):
+                self.mailbox.set_flags(msg, ["\\Seen"], "+")
+            return label.encode() + b" {%d}\r\n" % len(data) + data
+        return None
+
+    def cmd_fetch(self, tag, args, by_uid=False):
+        if self.folder is None:
+            self.send(f"{tag} BAD no mailbox selected\r\n".encode())
+            return
+        spec = str(args[0])
+        items = args[1] if isinstance(args[1], list) else [args[1]]
+        items = [i if isinstance(i, str) else "(" + " ".join(map(str, i)) + ")" for i in items]
+        # Macros
+        expanded = []
+        for it in items:
+            up = it.upper()
+            if up == "ALL":
+                expanded += ["FLAGS", "INTERNALDATE", "RFC822.SIZE", "ENVELOPE"]
+            elif up == "FAST":
+                expanded += ["FLAGS", "INTERNALDATE", "RFC822.SIZE"]
+            elif up == "FULL":
+                expanded += ["FLAGS", "INTERNALDATE", "RFC822.SIZE", "ENVELOPE", "BODY"]
+            else:
+                expanded.append(it)
+        items = expanded
+        changedsince = None
+        vanished = False
+        if len(args) > 2 and isinstance(args[2], list):
+            mods = [str(x).upper() for x in args[2]]
+            if "CHANGEDSINCE" in mods:
+                changedsince = int(mods[mods.index("CHANGEDSINCE") + 1])
+                if "MODSEQ" not in [i.upper() for i in items]:
+                    items.append("MODSEQ")
+            vanished = "VANISHED" in mods
+        if by_uid and "UID" not in [i.upper() for i in items]:
+            items.insert(0, "UID")
+        targets = self._resolve(spec, by_uid)
+        if vanished and changedsince is not None:
+            max_uid = self.folder.uidnext - 1
+            wanted = parse_seqset(spec, max_uid or 1)
+            with self.mailbox.lock:
+                gone = [u for u, ms in self.folder.vanished if ms > changedsince and u in wanted]
+            if gone:
+                self.send(b"* VANISHED (EARLIER) " + ",".join(map(str, gone)).encode() + b"\r\n")
+        for seq, uid, msg in targets:
+            if changedsince is not None and msg.modseq <= changedsince:
+                continue
+            chunks = []
+            for it in items:
+                data = self._fetch_item(it, uid, msg)
+                if data is not None:
+                    chunks.append(data)
+            self.send(b"* %d FETCH (" % seq + b" ".join(chunks) + b")\r\n")
+        self.send(f"{tag} OK FETCH completed\r\n".encode())
+
+    def cmd_uid_fetch(self, tag, args):
+        return self.cmd_fetch(tag, args, by_uid=True)
+
+    def cmd_store(self, tag, args, by_uid=False):
+        if self.folder is None:
+            self.send(f"{tag} BAD no mailbox selected\r\n".encode())
+            return
+        spec = str(args[0])
+        rest = args[1:]
+        if isinstance(rest[0], list):  # (UNCHANGEDSINCE n)
+            rest = rest[1:]
+        op = str(rest[0]).upper()
+        flags = rest[1] if isinstance(rest[1], list) else [rest[1]]
+        flags = [str(f) for f in flags]
+        mode = "+" if op.startswith("+") else "-" if op.startswith("-") else "="
+        silent = op.endswith(".SILENT")
+        for seq, uid, msg in self._resolve(spec, by_uid):
+            self.mailbox.set_flags(msg, flags, mode)
+            if not silent:
+                self.send(f"* {seq} FETCH (UID {uid} FLAGS ({' '.join(sorted(msg.flags))}))\r\n".encode())
+        self.send(f"{tag} OK STORE completed\r\n".encode())
+
+    def cmd_uid_store(self, tag, args):
+        return self.cmd_store(tag, args, by_uid=True)
+
+    def cmd_append(self, tag, args):
+        name = str(args[0])
+        raw = [a for a in args if isinstance(a, Literal)][-1]
+        flags = next((a for a in args[1:] if isinstance(a, list)), [])
+        self.mailbox.append(bytes(raw), folder=name, flags=[str(f) for f in flags])
+        self.send(f"{tag} OK APPEND completed\r\n".encode())
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox: FakeMailbox, host: str = "127.0.0.1", port: int = 0,
+                 ssl_context: Optional[ssl.SSLContext] = None, latency: float = 0.0,
+                 login_delay: float = 0.0, bandwidth: float = 0.0):
+        self.mailbox = mailbox
+        self.ssl_context = ssl_context
+        self.latency = latency
+        self.bandwidth = bandwidth  # octets/s par connexion (0 = illimite)
+        self.login_delay = login_delay
+        self.stats = {"connections": 0, "logins": 0, "commands": 0, "bytes_in": 0, "bytes_out": 0}
+        super().__init__((host, port), FakeIMAPHandler)
+
+    def handle_error(self, request, client_address):
+        pass  # deconnexions brutales des clients: attendues dans les benchmarks
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
+
+
+def start_server(mailbox: FakeMailbox, **kwargs) -> FakeIMAPServer:
+    """Demarre le serveur dans un thread daemon et retourne l'instance"""
+    server = FakeIMAPServer(mailbox, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True, name="fake-imap")
+    thread.start()
+    return server
+
+
+def main():
+    import argparse
+    from mailbox_generator import generate_mailbox
+
+    parser = argparse.ArgumentParser(description="Serveur IMAP local avec une boite de coaching synthetique")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--messages", type=int, default=300, help="nombre de bilans clients")
+    parser.add_argument("--photo-kb", type=int, default=2048, help="taille des photos JPEG")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence simulee par commande (s)")
+    parser.add_argument("--bandwidth-kb", type=float, default=0.0, help="debit max par connexion en Ko/s (0 = illimite)")
+    parser.add_argument("--cert", help="certificat PEM (active TLS)")
+    parser.add_argument("--key", help="cle privee PEM")
+    args = parser.parse_args()
+
+    mailbox = generate_mailbox(args.messages, photo_kb=args.photo_kb)
+    ssl_context = None
+    if args.cert:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.cert, args.key)
+    server = FakeIMAPServer(mailbox, port=args.port, ssl_context=ssl_context, latency=args.latency,
+                            bandwidth=args.bandwidth_kb * 1024)
+    mode = "TLS" if ssl_context else "clair"
+    print(f"[FAKE IMAP] {mailbox.user} / {mailbox.password} sur 127.0.0.1:{server.port} ({mode}), "
+          f"{len(mailbox.folders['INBOX'].entries)} emails dans INBOX")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
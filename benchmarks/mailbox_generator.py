@@ -0,0 +1,212 @@
+"""
+Generateur de boites mail de coaching synthetiques (deterministe, graine fixe)
+Bilans hebdo en francais, photos JPEG de plusieurs Mo, PDF de suivi, reponses du coach
+et relances client dans le meme thread Gmail, newsletters et notifications a exclure
+"""
+
+import email.policy
+import email.utils
+import random
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import List, Optional
+
+from fake_imap_server import FakeMailbox, SENT_MAIL
+
+COACH = "coach@example.com"
+
+FIRST_NAMES = ["Camille", "Lucas", "Manon", "Hugo", "Léa", "Théo", "Chloé", "Nathan", "Inès",
+               "Louis", "Sarah", "Raphaël", "Jade", "Mathis", "Zoé", "Antoine", "Anaïs", "Julien"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy",
+              "Moreau", "Simon", "Laurent", "Lefèvre", "Michel", "Garcia", "François"]
+
+SLEEP = ["7h en moyenne, réveils nocturnes", "6h30, difficile cette semaine", "8h, très bon sommeil",
+         "7h mais endormissement long"]
+TRAINING = ["3 séances sur 4 (jambes ratée)", "4/4 séances, charges en hausse sur le squat",
+            "2 séances seulement, boulot chargé", "4 séances + 2 sorties vélo"]
+NUTRITION = ["plan suivi à 90%, un écart samedi soir", "difficile le week-end, grignotage",
+             "protéines OK, légumes en baisse", "tout respecté, faim en fin de journée"]
+FEELINGS = ["Motivé(e), je vois les progrès sur les photos.", "Un peu fatigué(e), stress au travail.",
+            "Très content(e) de la semaine !", "Moral moyen, la balance ne bouge pas."]
+QUESTIONS = ["Est-ce que je peux remplacer le riz par des patates douces ?",
+             "Faut-il augmenter le cardio ?", "Je pars en vacances la semaine prochaine, comment gérer ?",
+             "Douleur au genou sur les fentes, j'adapte comment ?", ""]
+COACH_REPLIES = ["Super semaine, on garde le cap ! On ajoute 100 g de glucides les jours d'entraînement.",
+                 "Pas d'inquiétude pour la balance, le tour de taille baisse. On continue.",
+                 "On remplace les fentes par de la presse pour soulager le genou.",
+                 "Pour les vacances: 3 séances full body au poids du corps, je t'envoie le PDF."]
+NEWSLETTERS = [("Muscle & Co <newsletter@muscle-co.example>", "-40% sur la whey ce week-end"),
+               ("FitShop <promo@fitshop.example>", "Nouveautés: leggings et brassières"),
+               ("Le Mag Nutrition <news@magnutrition.example>", "5 recettes riches en protéines")]
+NOTIFICATIONS = [("Stripe <receipts@stripe.com>", "Your receipt from Coaching Pro"),
+                 ("Typeform <notifications@typeform.com>", "Nouvelle réponse au formulaire"),
+                 ("PayPal <service@paypal.fr>", "Vous avez reçu un paiement")]
+
+
+def fake_jpeg(rng: random.Random, size: int) -> bytes:
+    """Octets JPEG plausibles (SOI + APP0 JFIF + donnees incompressibles + EOI)"""
+    header = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    return header + rng.randbytes(max(0, size - len(header) - 2)) + b"\xff\xd9"
+
+
+def fake_pdf(rng: random.Random, size: int, title: str) -> bytes:
+    """PDF minimal valide suivi d'un flux binaire pour atteindre `size` octets"""
+    text = f"BT /F1 18 Tf 72 720 Td ({title}) Tj ET".encode("latin-1", "replace")
+    body = (b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+            b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
+            b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >> endobj\n"
+            + b"4 0 obj << /Length %d >> stream\n" % len(text) + text + b"\nendstream endobj\n")
+    padding = max(0, size - len(body) - 64)
+    body += b"5 0 obj << /Length %d >> stream\n" % padding + rng.randbytes(padding) + b"\nendstream endobj\n"
+    return body + b"trailer << /Root 1 0 R >>\n%%EOF\n"
+
+
+def _message(sender: str, to: str, subject: str, date: datetime, message_id: str,
+             in_reply_to: Optional[str] = None, references: Optional[List[str]] = None) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = to
+    msg["Subject"] = subject
+    msg["Date"] = email.utils.format_datetime(date)
+    msg["Message-ID"] = message_id
+    if in_reply_to:
+        msg["In-Reply-To"] = in_reply_to
+        msg["References"] = " ".join(references or [in_reply_to])
+    return msg
+
+
+def _bilan_text(rng: random.Random, first_name: str, week: int, weight: float) -> str:
+    question = rng.choice(QUESTIONS)
+    lines = [f"Salut coach,", "", f"Voici mon bilan de la semaine {week} :", "",
+             f"- Poids moyen : {weight:.1f} kg",
+             f"- Tour de taille : {rng.randint(70, 95)} cm",
+             f"- Sommeil : {rng.choice(SLEEP)}",
+             f"- Entraînements : {rng.choice(TRAINING)}",
+             f"- Nutrition : {rng.choice(NUTRITION)}",
+             f"- Pas quotidiens : {rng.randint(4, 14) * 1000}", "",
+             rng.choice(FEELINGS)]
+    if question:
+        lines += ["", question]
+    lines += ["", "Merci !", first_name]
+    return "\n".join(lines)
+
+
+def _text_to_html(text: str) -> str:
+    paragraphs = "".join(f"<p>{p.replace(chr(10), '<br>')}</p>" for p in text.split("\n\n"))
+    return f"<html><body><div style=\"font-family:Arial\">{paragraphs}</div></body></html>"
+
+
+def _newsletter_html(rng: random.Random, title: str) -> str:
+    rows = "".join(f"<tr><td style=\"padding:8px\"><img src=\"https://cdn.example/p{i}.jpg\" width=\"120\"></td>"
+                   f"<td><h3>Produit {i}</h3><p>{rng.randint(15, 80)},99 € au lieu de "
+                   f"{rng.randint(81, 120)},99 €</p></td></tr>" for i in range(rng.randint(6, 15)))
+    return (f"<html><head><style>td{{font-family:Arial}}</style></head><body>"
+            f"<div style=\"display:none\">{title} - offre limitée</div>"
+            f"<table width=\"600\">{rows}</table>"
+            f"<p><a href=\"https://example.com/unsubscribe\">Se désinscrire</a></p>"
+            f"<img src=\"https://track.example/open.gif\" width=\"1\" height=\"1\"></body></html>")
+
+
+def generate_mailbox(bilans: int = 200, photo_kb: int = 2048, photo_ratio: float = 0.25,
+                     pdf_ratio: float = 0.1, reply_ratio: float = 0.7, newsletter_ratio: float = 0.3,
+                     days: int = 180, seed: int = 42, mailbox: Optional[FakeMailbox] = None) -> FakeMailbox:
+    """Boite de coaching realiste: `bilans` bilans clients repartis sur `days` jours, plus les
+    reponses du coach (Sent Mail, meme X-GM-THRID), les relances client et le bruit (newsletters,
+    notifications) dans les proportions donnees. Les bilans de la derniere semaine restent sans reponse."""
+    rng = random.Random(seed)
+    mailbox = mailbox or FakeMailbox(user=COACH)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(days=days)
+    clients = []
+    for i in range(max(3, bilans // 8)):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        address = f"{first}.{last}{i}".lower().encode("ascii", "ignore").decode() + "@client.example"
+        clients.append({"name": f"{first} {last}", "first": first, "email": address,
+                        "weight": rng.uniform(55, 100), "week": 0})
+
+    # Tous les evenements sont dates puis ajoutes dans l'ordre chronologique (UIDs croissants)
+    events = []
+    for n in range(bilans):
+        client = rng.choice(clients)
+        date = start + timedelta(seconds=rng.randint(0, days * 86400))
+        events.append((date, "bilan", client, n))
+    for n in range(int(bilans * newsletter_ratio)):
+        date = start + timedelta(seconds=rng.randint(0, days * 86400))
+        events.append((date, "newsletter" if n % 3 else "notification", None, n))
+    events.sort(key=lambda e: e[0])
+
+    pending = []  # (date, callable) des reponses a inserer plus tard dans la chronologie
+    photo_size = photo_kb * 1024
+    for date, kind, client, n in events:
+        while pending and pending[0][0] <= date:
+            pending.pop(0)[1]()
+        if kind == "bilan":
+            client["week"] += 1
+            client["weight"] += rng.uniform(-0.8, 0.4)
+            _add_bilan(mailbox, rng, client, date, n, now, photo_size, photo_ratio, pdf_ratio, reply_ratio, pending)
+            pending.sort(key=lambda p: p[0])
+        elif kind == "newsletter":
+            sender, subject = rng.choice(NEWSLETTERS)
+            msg = _message(sender, COACH, subject, date, f"<news{n}@mailer.example>")
+            msg.set_content(f"{subject}\nVersion texte indisponible.")
+            msg.add_alternative(_newsletter_html(rng, subject), subtype="html")
+            mailbox.append(msg.as_bytes(policy=email.policy.SMTP), internaldate=date, category="promotions")
+        else:
+            sender, subject = rng.choice(NOTIFICATIONS)
+            msg = _message(sender, COACH, subject, date, f"<notif{n}@notify.example>")
+            msg.set_content(f"{subject}\nMontant : {rng.randint(50, 300)},00 EUR")
+            mailbox.append(msg.as_bytes(policy=email.policy.SMTP), internaldate=date, category="updates")
+    for _date, add in pending:
+        add()
+    return mailbox
+
+
+def _add_bilan(mailbox: FakeMailbox, rng: random.Random, client, date: datetime, n: int, now: datetime,
+               photo_size: int, photo_ratio: float, pdf_ratio: float, reply_ratio: float, pending: list):
+    week = client["week"]
+    message_id = f"<bilan{n}.{week}@client.example>"
+    sender = f"{client['name']} <{client['email']}>"
+    msg = _message(sender, COACH, f"Bilan semaine {week} - {client['name']}", date, message_id)
+    text = _bilan_text(rng, client["first"], week, client["weight"])
+    msg.set_content(text)
+    msg.add_alternative(_text_to_html(text), subtype="html")
+    if rng.random() < photo_ratio:
+        for view in ["face", "profil", "dos"][:rng.randint(1, 3)]:
+            size = int(photo_size * rng.uniform(0.7, 1.3))
+            msg.add_attachment(fake_jpeg(rng, size), maintype="image", subtype="jpeg",
+                               filename=f"photo_{view}_S{week}.jpg")
+    if rng.random() < pdf_ratio:
+        msg.add_attachment(fake_pdf(rng, rng.randint(80, 400) * 1024, f"Suivi semaine {week}"),
+                           maintype="application", subtype="pdf", filename=f"suivi_S{week}.pdf")
+
+    answered = date < now - timedelta(days=7) and rng.random() < reply_ratio
+    fm = mailbox.append(msg.as_bytes(policy=email.policy.SMTP), internaldate=date,
+                        flags=["\\Seen", "\\Answered"] if answered else [])
+    if not answered:
+        return
+
+    thrid = fm.thrid
+    reply_date = date + timedelta(hours=rng.randint(2, 48))
+    reply_id = f"<reply{n}@coach.example>"
+
+    def add_reply():
+        reply = _message(f"Coach <{COACH}>", sender, f"Re: Bilan semaine {week} - {client['name']}",
+                         reply_date, reply_id, in_reply_to=message_id)
+        reply.set_content(f"Salut {client['first']},\n\n{rng.choice(COACH_REPLIES)}\n\nCoach")
+        mailbox.append(reply.as_bytes(policy=email.policy.SMTP), folder=SENT_MAIL, internaldate=reply_date,
+                       flags=["\\Seen"], thrid=thrid)
+
+    pending.append((reply_date, add_reply))
+    if rng.random() < 0.3:
+        # Relance du client dans le meme thread
+        followup_date = reply_date + timedelta(hours=rng.randint(1, 72))
+
+        def add_followup():
+            followup = _message(sender, COACH, f"Re: Bilan semaine {week} - {client['name']}", followup_date,
+                                f"<followup{n}@client.example>", in_reply_to=reply_id,
+                                references=[message_id, reply_id])
+            followup.set_content(f"Merci coach, c'est noté !\n{client['first']}")
+            mailbox.append(followup.as_bytes(policy=email.policy.SMTP), internaldate=followup_date,
+                           flags=["\\Seen"] if followup_date < now - timedelta(days=7) else [], thrid=thrid)
+
+        pending.append((followup_date, add_followup))
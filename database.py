@@ -3,12 +3,13 @@ Gestion de la base de donnees locale (SQLite) sur disque persistant
 Stocke les clients, emails et analyses pour un acces instantane
 """
 
-import sqlite3
 import json
 import os
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+from db_connection import get_connection
+
 # Chemin de la DB: sur disque persistant /data si dispo, sinon local
 DB_PATH = "/data/coaching.db" if os.path.exists("/data") else "coaching.db"
 ATTACHMENTS_DIR = "/data/attachments" if os.path.exists("/data") else "attachments"
@@ -20,7 +21,7 @@ class DatabaseManager:
 
     def _init_db(self):
         """Cree les tables si elles n'existent pas"""
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         c = conn.cursor()
         
         # Table Clients
@@ -56,7 +57,6 @@ class DatabaseManager:
                       FOREIGN KEY(message_id) REFERENCES emails(message_id))''')
                       
         conn.commit()
-        conn.close()
 
     def _init_dirs(self):
         """Cree le dossier pieces jointes"""
@@ -64,27 +64,20 @@ class DatabaseManager:
 
     def get_client(self, email: str) -> Optional[Dict]:
         """Recupere infos client"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM clients WHERE email = ?", (email,))
-        row = c.fetchone()
-        conn.close()
+        row = get_connection(DB_PATH).execute("SELECT * FROM clients WHERE email = ?", (email,)).fetchone()
         return dict(row) if row else None
 
     def save_client(self, email: str, nom: str = "", objectif: str = "", date_debut: str = "", duree: int = 12):
         """Sauvegarde/Update client"""
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""INSERT OR REPLACE INTO clients (email, nom, objectif, date_debut, duree_semaines, last_updated)
-                     VALUES (?, ?, ?, ?, ?, ?)""",
-                  (email, nom, objectif, date_debut, duree, datetime.now()))
-        conn.commit()
-        conn.close()
+        conn = get_connection(DB_PATH)
+        with conn:
+            conn.execute("""INSERT OR REPLACE INTO clients (email, nom, objectif, date_debut, duree_semaines, last_updated)
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                         (email, nom, objectif, date_debut, duree, datetime.now()))
 
     def save_email(self, email_data: Dict) -> bool:
         """Sauvegarde un email et ses pieces jointes"""
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         c = conn.cursor()
         
         try:
@@ -130,15 +123,12 @@ class DatabaseManager:
             return True
         except Exception as e:
             print(f"Erreur save DB: {e}")
+            conn.rollback()  # connexion partagee: pas de transaction laissee ouverte
             return False
-        finally:
-            conn.close()
 
     def get_client_history(self, client_email: str) -> List[Dict]:
         """Recupere tout l'historique d'un client depuis la DB"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        c = get_connection(DB_PATH).cursor()
         
         c.execute("""SELECT * FROM emails 
                      WHERE client_email = ? 
@@ -161,17 +151,11 @@ class DatabaseManager:
             
             history.append(email_dict)
             
-        conn.close()
         return history
 
     def email_exists(self, message_id: str) -> bool:
         """Verifie si un email est deja en base"""
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT 1 FROM emails WHERE message_id = ?", (message_id,))
-        exists = c.fetchone() is not None
-        conn.close()
-        return exists
+        return get_connection(DB_PATH).execute("SELECT 1 FROM emails WHERE message_id = ?", (message_id,)).fetchone() is not None
 
 
 
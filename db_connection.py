@@ -0,0 +1,93 @@
+"""
+Connexions SQLite partagees: un pool de connexions longue duree par fichier, pretees aux threads
+WAL + pragmas: l'interface Streamlit lit pendant que la synchro ecrit, sans "database is locked"
+ni reconnexion a chaque requete. Streamlit execute chaque rerun sur un nouveau thread: la
+connexion d'un thread termine retourne au pool et sert, deja configuree, au thread suivant.
+Le cache de requetes preparees de sqlite3 sert enfin puisque la connexion survit aux appels.
+"""
+
+import os
+import sqlite3
+import threading
+import weakref
+
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 15))  # secondes d'attente sur un verrou d'ecriture
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", 256))  # lectures via mmap (0 = desactive)
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", 256))  # requetes preparees par connexion
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", 8))  # connexions libres gardees par fichier
+
+_local = threading.local()  # {chemin absolu: _Lease} du thread courant, liberes avec le thread
+_idle = {}  # {chemin absolu: [connexions libres]}
+_idle_lock = threading.Lock()
+
+
+class _Lease:
+    """Connexion pretee a un thread: rendue au pool quand le thread se termine (threading.local libere)"""
+    __slots__ = ("conn", "finalizer", "__weakref__")
+
+    def __init__(self, key: str, conn: sqlite3.Connection):
+        self.conn = conn
+        self.finalizer = weakref.finalize(self, _release, key, conn)
+
+
+def _open(path: str) -> sqlite3.Connection:
+    # check_same_thread=False: la connexion change de thread, mais n'est utilisee que par un thread a la fois
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=SQLITE_CACHED_STATEMENTS,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row  # row[0] et dict(row) fonctionnent tous les deux
+    conn.execute("PRAGMA journal_mode=WAL")  # lecteurs et ecrivain ne se bloquent plus
+    conn.execute("PRAGMA synchronous=NORMAL")  # fsync au checkpoint seulement (sur en WAL)
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}")
+    return conn
+
+
+def _close(conn: sqlite3.Connection):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _release(key: str, conn: sqlite3.Connection):
+    """Retour au pool (transaction oubliee annulee), ou fermeture si le pool est plein"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        _close(conn)
+        return
+    with _idle_lock:
+        idle = _idle.setdefault(key, [])
+        if len(idle) < SQLITE_POOL_SIZE:
+            idle.append(conn)
+            return
+    _close(conn)
+
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """Connexion du thread courant vers `path` (reprise du pool, ou ouverte et configuree)
+
+    Ne jamais la fermer: l'utiliser telle quelle pour les lectures et avec `with conn:` pour les
+    ecritures (commit, ou rollback si exception: aucune transaction ne reste ouverte)."""
+    key = os.path.abspath(path)
+    leases = getattr(_local, "leases", None)
+    if leases is None:
+        leases = _local.leases = {}
+    lease = leases.get(key)
+    if lease is None:
+        with _idle_lock:
+            idle = _idle.get(key)
+            conn = idle.pop() if idle else None
+        lease = leases[key] = _Lease(key, conn or _open(key))
+    return lease.conn
+
+
+def close_connections():
+    """Ferme les connexions du thread courant (au lieu de les rendre au pool)"""
+    leases = getattr(_local, "leases", None) or {}
+    _local.leases = {}
+    for lease in leases.values():
+        lease.finalizer.detach()
+        _close(lease.conn)
@@ -9,77 +9,721 @@ from email.header import decode_header
 from email.utils import parsedate_to_datetime
 import os
 import base64
+import quopri
 import time
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import select
+import socket
+import threading
+import itertools
+import queue
+import random
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from urllib.parse import unquote
 import re
+from raw_store import RawMessageStore, RAW_STORE_DIR, RAW_STORE_MAX_MB, get_store
+from exclusions import gmail_raw_query, imap_search_criteria
+from html_text import html_to_text
+from attachments import Attachment
+from accounts import MailAccount, PRIMARY_ACCOUNT
 
 load_dotenv()
 
-IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
-IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
-MAIL_USER = os.getenv("MAIL_USER")
-MAIL_PASS = os.getenv("MAIL_PASS")
+IMAP_POOL_SIZE = int(os.getenv("IMAP_POOL_SIZE", 3))
+IMAP_KEEPALIVE = int(os.getenv("IMAP_KEEPALIVE", 120))  # secondes entre deux NOOP
+IMAP_IDLE_RENEW = int(os.getenv("IMAP_IDLE_RENEW", 25 * 60))  # Gmail coupe l'IDLE apres ~29 min
+IMAP_FETCH_WORKERS = int(os.getenv("IMAP_FETCH_WORKERS", 4))  # connexions paralleles pour les gros fetchs
+GMAIL_MAX_CONNECTIONS = 15  # limite Gmail de connexions IMAP simultanees par compte
+IMAP_ALL_MAIL = os.getenv("IMAP_ALL_MAIL", "[Gmail]/All Mail")  # si le LIST special-use echoue
+IMAP_PREVIEW_THRESHOLD = int(os.getenv("IMAP_PREVIEW_THRESHOLD_KB", 1024)) * 1024  # au-dela: apercu d'abord
+IMAP_PREVIEW_BYTES = int(os.getenv("IMAP_PREVIEW_KB", 32)) * 1024  # texte telecharge pour l'apercu
+ATTACHMENT_BUDGET = int(os.getenv("ATTACHMENT_BUDGET_MB", 15)) * 1024 * 1024  # pieces jointes auto par email
+IMAP_BREAKER_THRESHOLD = int(os.getenv("IMAP_BREAKER_THRESHOLD", 2))  # echecs consecutifs avant ouverture
+IMAP_BACKOFF_BASE = float(os.getenv("IMAP_BACKOFF_BASE", 5))  # secondes avant le premier essai
+IMAP_BACKOFF_MAX = float(os.getenv("IMAP_BACKOFF_MAX", 300))
+IMAP_OP_TIMEOUT = float(os.getenv("IMAP_OP_TIMEOUT", 60))  # secondes sans donnees avant d'abandonner une commande
+IMAP_COMPRESS = os.getenv("IMAP_COMPRESS", "1") != "0"  # COMPRESS=DEFLATE (RFC 4978) si le serveur le propose
+IMAP_COMPRESS_LEVEL = int(os.getenv("IMAP_COMPRESS_LEVEL", 6))  # commandes client: petites, peu importe
 
+# Headers de synchro: ENVELOPE pre-decoupe par le serveur + taille pour planifier les fetchs
+HEADER_ITEMS = "(UID ENVELOPE INTERNALDATE RFC822.SIZE FLAGS)"
 
-def create_connection():
-    """Cree une nouvelle connexion IMAP avec diagnostics"""
+_TAG_COUNTER = itertools.count(1)
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+_FETCH_RE = re.compile(rb"\* \d+ FETCH ")
+
+
+def _next_tag() -> str:
+    """Tag unique pour les commandes envoyees a la main (hors imaplib._command)"""
+    return f"EX{next(_TAG_COUNTER)}"
+
+
+def _tokenize_imap(data: bytes, literals: List[bytes]) -> List[Any]:
+    """Decoupe une reponse IMAP en atomes (str) / litteraux (bytes) / listes imbriquees
+    Les litteraux sont deja extraits et remplaces par \\x00<index>\\x00."""
+    stack: List[List[Any]] = [[]]
+    pos, n = 0, len(data)
+    while pos < n:
+        ch = data[pos]
+        if ch in b" \r\n":
+            pos += 1
+        elif ch == 0x28:  # (
+            stack.append([])
+            pos += 1
+        elif ch == 0x29:  # )
+            inner = stack.pop()
+            stack[-1].append(inner)
+            pos += 1
+        elif ch == 0x22:  # "
+            pos += 1
+            out = bytearray()
+            while pos < n and data[pos] != 0x22:
+                if data[pos] == 0x5C:  # backslash
+                    pos += 1
+                out.append(data[pos])
+                pos += 1
+            pos += 1
+            stack[-1].append(out.decode("utf-8", "replace"))
+        elif ch == 0:
+            end = data.index(b"\x00", pos + 1)
+            stack[-1].append(literals[int(data[pos + 1:end])])
+            pos = end + 1
+        else:
+            start, depth = pos, 0
+            while pos < n:
+                c = data[pos]
+                if c == 0x5B:  # [
+                    depth += 1
+                elif c == 0x5D:  # ]
+                    depth -= 1
+                elif depth == 0 and c in b" ()\r\n":
+                    break
+                pos += 1
+            atom = data[start:pos].decode("utf-8", "replace")
+            stack[-1].append(None if atom.upper() == "NIL" else atom)
+    while len(stack) > 1:  # reponse tronquee: on ferme les listes ouvertes
+        inner = stack.pop()
+        stack[-1].append(inner)
+    return stack[0]
+
+
+def _imap_str(value) -> str:
+    """Valeur d'une reponse IMAP (atome, chaine quotee, litteral ou NIL) en texte"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+def _envelope_address(addresses) -> str:
+    """Premiere adresse d'une liste ENVELOPE ((nom adl boite domaine) ...) -> boite@domaine"""
+    for address in addresses if isinstance(addresses, list) else []:
+        if isinstance(address, list) and len(address) >= 4 and address[2] and address[3]:
+            return f"{_imap_str(address[2])}@{_imap_str(address[3])}".lower()
+    return ""
+
+
+def _parse_internaldate(value) -> Optional[datetime]:
+    """INTERNALDATE "17-Jul-1996 02:44:25 -0700" -> datetime avec fuseau"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(_imap_str(value).strip(), "%d-%b-%Y %H:%M:%S %z")
+    except ValueError:
+        return None
+
+
+def quote_mailbox(name: str) -> str:
+    """Nom de dossier entre guillemets ("[Gmail]/All Mail" contient un espace, imaplib ne quote pas)"""
+    if name.startswith('"'):
+        return name
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def compress_uid_set(uids) -> str:
+    """[1, 2, 3, 7, 9, 10] -> "1:3,7,9:10" (commande courte meme pour des milliers d'UIDs)"""
+    values = sorted({int(u) for u in uids})
+    ranges = []
+    for uid in values:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+def stream_fetch(conn, uid_set: str, items: str, modifiers: str = "") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Envoie UN seul UID FETCH et rend (uid, {ITEM: valeur}) au fil de l'eau, sans attendre
+    la fin de la reponse (imaplib bufferise tout avant de rendre la main)."""
+    tag = _next_tag()
+    command = f"{tag} UID FETCH {uid_set} {items}" + (f" {modifiers}" if modifiers else "")
+    conn.send(command.encode() + b"\r\n")
+    tag_prefix = tag.encode() + b" "
+    while True:
+        line = conn.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connexion fermee pendant FETCH")
+        if line.startswith(tag_prefix):
+            if not line[len(tag_prefix):].upper().startswith(b"OK"):
+                raise imaplib.IMAP4.error(line.decode("utf-8", "ignore").strip())
+            return
+        literals = []
+        size = _LITERAL_RE.search(line)
+        while size:
+            literals.append(conn.read(int(size.group(1))))
+            rest = conn.readline()
+            if not rest:
+                raise imaplib.IMAP4.abort("connexion fermee pendant FETCH")
+            line = line[:size.start()] + b"\x00%d\x00" % (len(literals) - 1) + rest
+            size = _LITERAL_RE.search(line)
+        parsed = parse_fetch_line(line, literals)
+        if parsed is not None:
+            yield parsed
+
+
+def parse_fetch_line(line: bytes, literals: List[bytes]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """"* n FETCH (...)" (litteraux deja extraits) -> (uid, {ITEM: valeur}), None pour les autres reponses"""
+    header = _FETCH_RE.match(line)
+    if not header:
+        return None  # EXISTS / EXPUNGE / OK... recus entre-temps
+    tokens = _tokenize_imap(line[header.end():], literals)
+    pairs = tokens[0] if tokens and isinstance(tokens[0], list) else []
+    fields = {str(pairs[i]).upper(): pairs[i + 1] for i in range(0, len(pairs) - 1, 2)}
+    return str(fields.get("UID", "")), fields
+
+
+class DeflateStream:
+    """Flux IMAP compresse (COMPRESS=DEFLATE, RFC 4978) branche sous imaplib
+
+    Remplace conn.file (readline/read) et conn.send: imaplib, stream_fetch et le pool n'y voient
+    que du texte IMAP en clair. conn.sock reste la vraie socket (timeouts, fermeture)."""
+
+    def __init__(self, sock, level: int = IMAP_COMPRESS_LEVEL):
+        self.sock = sock
+        self._inflater = zlib.decompressobj(-15)
+        self._deflater = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self._buffer = bytearray()
+        self._lock = threading.Lock()  # sendall peut croiser un NOOP de keepalive
+        self.stats = {"wire_in": 0, "data_in": 0, "wire_out": 0, "data_out": 0}
+
+    def _fill(self) -> bool:
+        """Lit un bloc compresse de la socket et l'ajoute au tampon decompresse (False si EOF)"""
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            return False
+        data = self._inflater.decompress(chunk)
+        self.stats["wire_in"] += len(chunk)
+        self.stats["data_in"] += len(data)
+        self._buffer += data
+        return True
+
+    def readline(self, limit: int = -1) -> bytes:
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start)
+            if end >= 0:
+                end += 1
+                break
+            if 0 <= limit <= len(self._buffer):
+                end = limit
+                break
+            start = len(self._buffer)
+            if not self._fill():
+                end = len(self._buffer)
+                break
+        if 0 <= limit < end:
+            end = limit
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return line
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            while self._fill():
+                pass
+            size = len(self._buffer)
+        while len(self._buffer) < size and self._fill():
+            pass
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def sendall(self, data: bytes):
+        with self._lock:
+            wire = self._deflater.compress(data) + self._deflater.flush(zlib.Z_SYNC_FLUSH)
+            self.stats["data_out"] += len(data)
+            self.stats["wire_out"] += len(wire)
+            self.sock.sendall(wire)
+
+    def buffered(self) -> int:
+        """Octets deja decompresses mais pas encore lus (invisibles pour un select() sur la socket)"""
+        return len(self._buffer)
+
+    def close(self):
+        self._buffer.clear()
+
+    @property
+    def ratio(self) -> float:
+        """Octets decompresses / octets recus sur le fil (1.0 = aucun gain)"""
+        return self.stats["data_in"] / self.stats["wire_in"] if self.stats["wire_in"] else 1.0
+
+
+def enable_compression(conn) -> bool:
+    """Negocie COMPRESS DEFLATE sur une connexion authentifiee (avant le SELECT)
+
+    Envoye a la main (imaplib ne connait pas la commande); la reponse taguee arrive encore
+    en clair, tout ce qui suit est compresse."""
+    if not IMAP_COMPRESS or "COMPRESS=DEFLATE" not in conn.capabilities or getattr(conn, "_compress", None):
+        return False
+    try:
+        tag = _next_tag()
+        conn.send(f"{tag} COMPRESS DEFLATE\r\n".encode())
+        tag_prefix = tag.encode() + b" "
+        while True:
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connexion fermee pendant COMPRESS")
+            if line.startswith(tag_prefix):
+                break
+        if not line[len(tag_prefix):].upper().startswith(b"OK"):
+            print(f"[IMAP] COMPRESS refuse: {line.decode('utf-8', 'ignore').strip()}")
+            return False
+        stream = DeflateStream(conn.sock)
+        conn.file.close()
+        conn.file = stream
+        conn.send = stream.sendall
+        conn._compress = stream
+        return True
+    except (imaplib.IMAP4.abort, OSError):
+        raise
+    except Exception as e:
+        print(f"[IMAP] COMPRESS DEFLATE ignore: {e}")
+        return False
+
+
+class ConnectionBreaker:
+    """Etat de sante de la connectivite IMAP d'un compte, partage par tout le process (pools, IDLE, backfill)
+
+    closed: connexions autorisees. Apres `threshold` echecs consecutifs -> open: toute tentative
+    echoue immediatement (l'app sert la DB locale) jusqu'a la fin du backoff exponentiel avec
+    jitter. half-open: un seul essai passe; succes -> closed, echec -> open avec un delai double.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold: int = IMAP_BREAKER_THRESHOLD, base_delay: float = IMAP_BACKOFF_BASE,
+                 max_delay: float = IMAP_BACKOFF_MAX, probe_timeout: float = 60):
+        self.threshold = max(1, threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.probe_timeout = probe_timeout  # essai half-open sans reponse: on en autorise un autre
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0  # echecs consecutifs
+        self.opened = 0  # ouvertures consecutives (exposant du backoff)
+        self.retry_at = 0.0
+        self.probe_started = 0.0
+        self.last_error = None
+        self.stats = {"total_failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """True si une tentative de connexion peut partir maintenant"""
+        with self._lock:
+            now = time.time()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now >= self.retry_at:
+                self.state = self.HALF_OPEN
+                self.probe_started = now
+                return True
+            if self.state == self.HALF_OPEN and now - self.probe_started > self.probe_timeout:
+                self.probe_started = now
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("[IMAP] Circuit referme: connectivite retablie")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened = 0
+            self.last_error = None
+
+    def record_failure(self, error: str = None):
+        with self._lock:
+            self.failures += 1
+            self.stats["total_failures"] += 1
+            self.last_error = error
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                # Backoff exponentiel, jitter sur la seconde moitie pour desynchroniser les threads
+                delay = min(self.max_delay, self.base_delay * 2 ** self.opened)
+                delay = random.uniform(delay / 2, delay)
+                self.state = self.OPEN
+                self.opened += 1
+                self.retry_at = time.time() + delay
+                self.stats["opened"] += 1
+                print(f"[IMAP] Circuit ouvert ({error}): prochain essai dans {delay:.0f}s")
+
+    def retry_in(self) -> float:
+        """Secondes avant le prochain essai autorise (0 si ferme)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(0.0, self.retry_at - time.time())
+
+    def get_state(self) -> Dict[str, Any]:
+        retry_in = self.retry_in()
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "retry_in": round(retry_in),
+                    "last_error": self.last_error, **self.stats}
+
+
+IMAP_BREAKER = ConnectionBreaker()  # compte principal
+_ACCOUNT_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(account: Optional[MailAccount] = None) -> ConnectionBreaker:
+    """Circuit d'un compte: un mot de passe revoque ne bloque pas les autres boites"""
+    if account is None or account.name == PRIMARY_ACCOUNT.name:
+        return IMAP_BREAKER
+    with _BREAKERS_LOCK:
+        return _ACCOUNT_BREAKERS.setdefault(account.name, ConnectionBreaker())
+
+
+def create_connection(account: Optional[MailAccount] = None):
+    """Cree une nouvelle connexion IMAP avec diagnostics (compte principal par defaut)
+    Echoue immediatement (None) tant que le circuit IMAP du compte est ouvert"""
     import sys
+
+    account = account or PRIMARY_ACCOUNT
+    breaker = get_breaker(account)
     
     # Validation env
-    if not MAIL_USER or not MAIL_PASS:
-        print("[IMAP] ERREUR: MAIL_USER ou MAIL_PASS non definis dans l'environnement!")
+    if not account.configured:
+        print(f"[IMAP] ERREUR: identifiants du compte {account.name} non definis (MAIL_USER/MAIL_PASS ou MAIL_ACCOUNTS)!")
         sys.stdout.flush()
         return None
 
+    if not breaker.allow():
+        print(f"[IMAP] Circuit ouvert ({account.name}): pas de tentative avant {breaker.retry_in():.0f}s")
+        return None
+
     try:
-        import socket
         timeout = 10
         # socket.setdefaulttimeout(timeout) # Deactive pour eviter de bloquer d'autres threads
         
-        print(f"[IMAP] 1. Test socket vers {IMAP_SERVER}:{IMAP_PORT}...")
+        print(f"[IMAP] 1. Test socket vers {account.imap_server}:{account.imap_port}...")
         sys.stdout.flush()
         
         # Test socket pur avant SSL
         try:
-            sock = socket.create_connection((IMAP_SERVER, IMAP_PORT), timeout=5)
+            sock = socket.create_connection((account.imap_server, account.imap_port), timeout=5)
             sock.close()
             print("[IMAP] TCP Port OK")
             sys.stdout.flush()
         except Exception as se:
             print(f"[IMAP] TCP Port ECHEC: {se}")
             sys.stdout.flush()
+            breaker.record_failure(f"TCP: {se}")
             return None
 
-        print(f"[IMAP] 2. Connexion SSL imaplib (timeout={timeout})...")
+        mode = "SSL" if account.imap_ssl else "clair"
+        print(f"[IMAP] 2. Connexion {mode} imaplib (timeout={timeout})...")
         sys.stdout.flush()
         
         start_time = time.time()
-        conn = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
-        print(f"[IMAP] SSL Connect OK en {time.time() - start_time:.2f}s")
+        # Timeout borne le connect TLS + LOGIN (un Gmail lent ne fige plus l'UI indefiniment)
+        if account.imap_ssl:
+            conn = imaplib.IMAP4_SSL(account.imap_server, account.imap_port, timeout=timeout)
+        else:
+            conn = imaplib.IMAP4(account.imap_server, account.imap_port, timeout=timeout)
+        print(f"[IMAP] {mode} Connect OK en {time.time() - start_time:.2f}s")
         sys.stdout.flush()
         
-        print(f"[IMAP] 3. Login pour {MAIL_USER}...")
+        print(f"[IMAP] 3. Login pour {account.user}...")
         sys.stdout.flush()
         
         start_time = time.time()
-        conn.login(MAIL_USER, MAIL_PASS)
+        conn.login(account.user, account.password)
         print(f"[IMAP] Login OK en {time.time() - start_time:.2f}s")
         sys.stdout.flush()
         
+        # Timeout par lecture (pas sur la commande entiere): un gros FETCH qui progresse n'expire pas,
+        # une connexion a moitie morte leve socket.timeout au lieu de bloquer. L'IDLE attend via select.
+        conn.sock.settimeout(IMAP_OP_TIMEOUT)
+        breaker.record_success()
         return conn
     except Exception as e:
         print(f"[IMAP] ECHEC CRITIQUE: {type(e).__name__}: {e}")
         import traceback
         traceback.print_exc()
         sys.stdout.flush()
+        breaker.record_failure(f"{type(e).__name__}: {e}")
         return None
 
 
+class IMAPConnectionPool:
+    """Pool thread-safe de connexions IMAP deja authentifiees (et dossier deja selectionne)
+
+    Evite le TCP + TLS + LOGIN a chaque clic: les connexions sont rendues au pool apres usage,
+    maintenues en vie par des NOOP et remplacees automatiquement si Gmail les coupe.
+    """
+
+    def __init__(self, max_size: int = IMAP_POOL_SIZE, keepalive: int = IMAP_KEEPALIVE,
+                 account: Optional[MailAccount] = None):
+        self.account = account or PRIMARY_ACCOUNT
+        self.max_size = max(1, max_size)
+        self.keepalive = keepalive
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)  # connexion rendue ou fermee (place liberee)
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = []  # [(conn, last_used)]
+        self._count = 0  # connexions ouvertes: en usage + inactives + en NOOP par le keepalive (<= max_size)
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+        self.stats = {"hits": 0, "misses": 0, "reconnects": 0, "connect_time": 0.0, "compressed": 0}
+        self.uidvalidity = {}  # dernier UIDVALIDITY vu par dossier (cle du store local)
+
+    def _open(self):
+        """Ouvre une nouvelle connexion et mesure le temps de connexion"""
+        start_time = time.time()
+        conn = create_connection(self.account)
+        if conn is not None:
+            try:
+                if enable_compression(conn):
+                    with self._lock:
+                        self.stats["compressed"] += 1
+            except Exception as e:
+                print(f"[IMAP POOL] COMPRESS DEFLATE: connexion perdue ({e})")
+                self._record_timeout(e)
+                self._close(conn)
+                return None
+            self._enable_extensions(conn)
+            with self._lock:
+                self.stats["connect_time"] += time.time() - start_time
+        return conn
+
+    def _enable_extensions(self, conn):
+        """ENABLE QRESYNC/CONDSTORE (uniquement possible avant le SELECT)"""
+        caps = set(conn.capabilities)
+        conn._pool_enabled = set()
+        wanted = "QRESYNC" if "QRESYNC" in caps else "CONDSTORE" if "CONDSTORE" in caps else None
+        if wanted and "ENABLE" in caps:
+            try:
+                status, _ = conn.enable(wanted)
+                if status == "OK":
+                    conn._pool_enabled = {"CONDSTORE", wanted}
+            except Exception as e:
+                print(f"[IMAP POOL] ENABLE {wanted} refuse: {e}")
+
+    def _is_alive(self, conn) -> bool:
+        try:
+            status, _ = conn.noop()
+            return status == "OK"
+        except Exception as e:
+            self._record_timeout(e)
+            return False
+
+    def _record_timeout(self, error: Exception):
+        """Serveur muet (IMAP_OP_TIMEOUT depasse): compte comme un echec pour le circuit du compte"""
+        if isinstance(error, socket.timeout):
+            get_breaker(self.account).record_failure(f"timeout: {error}")
+
+    def _close(self, conn):
+        try:
+            conn.logout()
+        except Exception:
+            pass
+
+    def _discard(self, conn):
+        """Ferme une connexion du pool (ou une ouverture ratee si None) et libere sa place dans max_size"""
+        if conn is not None:
+            self._close(conn)
+        with self._lock:
+            self._count -= 1
+            self._changed.notify()
+
+    def _select(self, conn, folder: str) -> bool:
+        """Selectionne le dossier seulement s'il change (evite un aller-retour)"""
+        if getattr(conn, "_pool_folder", None) == folder:
+            return True
+        status, _ = conn.select(quote_mailbox(folder))
+        if status != "OK":
+            return False
+        conn._pool_folder = folder
+        _, data = conn.response('UIDVALIDITY')
+        if data and data[-1]:
+            self.uidvalidity[folder] = int(data[-1])
+        return True
+
+    def checkout(self, folder: str = "INBOX", timeout: float = 30):
+        """Emprunte une connexion prete a l'emploi (None si IMAP indisponible)"""
+        deadline = time.time() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            print("[IMAP POOL] Pool sature, aucune connexion disponible")
+            return None
+
+        conn = None
+        with self._lock:
+            # Compte fait sous le verrou, connexions du keepalive comprises: on n'ouvre qu'en dessous
+            # de max_size, sinon on attend qu'il rende (ou ferme) celles qu'il est en train de tester
+            ready = self._changed.wait_for(lambda: bool(self._idle) or self._count < self.max_size,
+                                           timeout=max(0, deadline - time.time()))
+            if ready and self._idle:
+                conn, last_used = self._idle.pop()
+            elif ready:
+                self._count += 1  # place reservee pour la connexion a ouvrir
+        if not ready:
+            self._slots.release()
+            print("[IMAP POOL] Pool sature, aucune connexion disponible")
+            return None
+
+        if conn is not None and time.time() - last_used > self.keepalive and not self._is_alive(conn):
+            # Connexion morte pendant l'inactivite: on la remplace (meme place dans max_size)
+            self._close(conn)
+            conn = None
+            with self._lock:
+                self.stats["reconnects"] += 1
+        elif conn is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+        else:
+            with self._lock:
+                self.stats["misses"] += 1
+
+        if conn is None:
+            conn = self._open()
+        try:
+            if conn is not None and self._select(conn, folder):
+                return conn
+        except Exception as e:
+            print(f"[IMAP POOL] Erreur SELECT {folder}: {e}")
+        self._discard(conn)
+        self._slots.release()
+        return None
+
+    def checkin(self, conn, broken: bool = False):
+        """Rend une connexion au pool (fermee si cassee)"""
+        if conn is None:
+            return
+        try:
+            if broken or self._stop.is_set():
+                self._discard(conn)
+                return
+            with self._lock:
+                self._idle.append((conn, time.time()))
+                self._changed.notify()
+            self._ensure_keepalive()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, folder: str = "INBOX"):
+        """Context manager: `with pool.connection() as conn:` (conn peut etre None)"""
+        conn = self.checkout(folder)
+        broken = False
+        try:
+            yield conn
+        except (imaplib.IMAP4.abort, OSError) as e:
+            broken = True
+            self._record_timeout(e)
+            raise
+        finally:
+            self.checkin(conn, broken=broken)
+
+    def execute(self, operation: Callable, folder: str = "INBOX", retries: int = 1):
+        """Execute operation(conn) sur une connexion du pool, reconnecte sur IMAP4.abort"""
+        last_error = None
+        for attempt in range(retries + 1):
+            conn = self.checkout(folder)
+            if conn is None:
+                raise ConnectionError("Connexion IMAP impossible")
+            try:
+                result = operation(conn)
+            except (imaplib.IMAP4.abort, OSError) as e:
+                self.checkin(conn, broken=True)
+                self._record_timeout(e)
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                print(f"[IMAP POOL] Connexion perdue ({e}), reconnexion {attempt + 1}/{retries}...")
+                last_error = e
+                continue
+            except Exception:
+                self.checkin(conn)
+                raise
+            self.checkin(conn)
+            return result
+        raise last_error
+
+    def _ensure_keepalive(self):
+        if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True,
+                                                      name="imap-keepalive")
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        """NOOP periodique sur les connexions inactives pour que Gmail ne les coupe pas"""
+        interval = max(1, self.keepalive / 2)
+        while not self._stop.wait(interval):
+            now = time.time()
+            with self._lock:
+                stale = [(c, t) for c, t in self._idle if now - t >= interval]
+                self._idle = [(c, t) for c, t in self._idle if now - t < interval]
+            for conn, _ in stale:
+                if self._is_alive(conn):
+                    with self._lock:
+                        self._idle.append((conn, time.time()))
+                        self._changed.notify()
+                else:
+                    self._discard(conn)
+
+    def close(self):
+        """Ferme toutes les connexions inactives et arrete le keepalive"""
+        self._stop.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs hit/miss/reconnexion + estimation du temps de connexion economise"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["idle"] = len(self._idle)
+            stats["open"] = self._count
+        stats["connect_time"] = round(stats["connect_time"], 3)
+        opened = stats["misses"] + stats["reconnects"]
+        avg_connect = stats["connect_time"] / opened if opened else 0.0
+        stats["avg_connect_time"] = round(avg_connect, 3)
+        stats["saved_seconds"] = round(stats["hits"] * avg_connect, 2)
+        return stats
+
+
 class EmailReader:
-    def __init__(self):
+    def __init__(self, pool_size: int = IMAP_POOL_SIZE, store: Optional[RawMessageStore] = None,
+                 account: Optional[MailAccount] = None):
         self.connection = None
+        self.account = account or PRIMARY_ACCOUNT
+        self.pool = IMAPConnectionPool(max_size=pool_size, account=self.account)
+        self._background = None  # telechargements des grosses parties (cree a la demande)
+        self._all_mail = None
+        self.store = store
+        if self.store is None and RAW_STORE_MAX_MB > 0:
+            try:
+                # Un store par compte (les UIDs ne sont uniques que dans une boite), partage par ses lecteurs
+                self.store = (get_store() if self.account is PRIMARY_ACCOUNT
+                              else get_store(os.path.join(RAW_STORE_DIR, self.account.name)))
+            except Exception as e:
+                print(f"[RAW STORE] Store local indisponible: {e}")
 
     def _decode_header_value(self, value: str) -> str:
         """Decode les headers d'email"""
@@ -130,19 +774,17 @@ class EmailReader:
                     if msg.get_content_type() == "text/html": html_body = text
                     else: text_body = text
 
-            if text_body and len(text_body.strip()) > 10: return text_body.strip()
-            if html_body:
-                text = html_body
-                text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
-                text = re.sub(r'</p>', '\n', text, flags=re.IGNORECASE)
-                text = re.sub(r'<[^>]+>', ' ', text)
-                text = re.sub(r'&nbsp;', ' ', text)
-                return text.strip()
-            return text_body.strip() if text_body else ""
+            return self._select_body(text_body, html_body)
         except: return ""
 
-    def _get_attachments(self, msg) -> List[Dict[str, Any]]:
-        """Extrait les pieces jointes"""
+    def _select_body(self, text_body: str, html_body: str) -> str:
+        """Choisit le texte brut si exploitable, sinon convertit le HTML en texte"""
+        if text_body and len(text_body.strip()) > 10: return text_body.strip()
+        if html_body: return html_to_text(html_body)
+        return text_body.strip() if text_body else ""
+
+    def _get_attachments(self, msg) -> List[Attachment]:
+        """Extrait les pieces jointes (octets decodes, pas de base64)"""
         attachments = []
         try:
             if msg.is_multipart():
@@ -155,86 +797,1073 @@ class EmailReader:
                         try:
                             data = part.get_payload(decode=True)
                             if data:
-                                attachments.append({
-                                    "filename": filename,
-                                    "content_type": part.get_content_type(),
-                                    "data": base64.b64encode(data).decode('utf-8')
-                                })
+                                attachments.append(Attachment(filename, part.get_content_type(), data))
                         except: pass
         except: pass
         return attachments
 
     def get_unanswered_emails(self, days: int = 7, folder: str = "INBOX", max_emails: int = 50) -> List[Dict[str, Any]]:
         """Recupere les emails sans reponse via UID"""
-        conn = create_connection()
-        if not conn: return []
-        emails = []
         try:
-            conn.select(folder)
-            since_date = (datetime.now() - timedelta(days=days)).strftime("%d-%b-%Y")
-            status, data = conn.uid('search', None, f'(UNANSWERED SINCE "{since_date}")')
-            if status != "OK" or not data[0]:
-                conn.logout()
-                return []
-            
-            uids = data[0].split()
-            if len(uids) > max_emails: uids = uids[-max_emails:]
-            
-            # Fetch headers in batch
-            if uids:
-                uids_str = ",".join([u.decode() for u in uids])
-                status, fetch_data = conn.uid('fetch', uids_str, "(BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)])")
-                if status == "OK":
-                    for part in fetch_data:
-                        if isinstance(part, tuple):
-                            msg = email.message_from_bytes(part[1])
-                            # Extraire UID de response_part[0]
-                            resp_str = part[0].decode('utf-8', errors='ignore')
-                            uid_match = re.search(r'UID\s+(\d+)', resp_str, re.IGNORECASE)
-                            uid = uid_match.group(1) if uid_match else ""
-                            
-                            subject = self._decode_header_value(msg["Subject"])
-                            from_email = self._extract_email_address(self._decode_header_value(msg["From"]))
-                            try: date = parsedate_to_datetime(msg["Date"])
-                            except: date = datetime.now()
-                            
-                            emails.append({
-                                "id": uid, # Persistent UID
-                                "message_id": msg.get("Message-ID", f"no-id-{uid}"),
-                                "from_email": from_email,
-                                "subject": subject,
-                                "date": date,
-                                "direction": "received",
-                                "body": "",
-                                "attachments": []
-                            })
-            conn.logout()
+            emails = self.pool.execute(lambda conn: self._fetch_unanswered(conn, days, max_emails), folder)
         except Exception as e:
             print(f"Error sync: {e}")
-            try: conn.logout()
-            except: pass
+            return []
         return sorted(emails, key=lambda x: x["date"], reverse=True)
 
-    def load_email_content(self, uid: str, folder: str = "INBOX") -> Dict[str, Any]:
-        """Charge le contenu complet via UID"""
-        conn = create_connection()
-        if not conn: return {"loaded": False, "error": "Connexion impossible"}
-        try:
-            conn.select(folder)
-            status, data = conn.uid('fetch', uid.encode(), "(BODY.PEEK[])")
-            if status == "OK" and data and data[0]:
-                msg = email.message_from_bytes(data[0][1])
-                body = self._get_email_body(msg)
-                attachments = self._get_attachments(msg)
-                conn.logout()
-                return {"loaded": True, "body": body, "attachments": attachments}
-            conn.logout()
+    def _fetch_unanswered(self, conn, days: int, max_emails: int) -> List[Dict[str, Any]]:
+        emails = []
+        status, data = conn.uid('search', None, self._unanswered_criteria(conn, days))
+        if status != "OK" or not data[0]:
+            return []
+
+        uids = data[0].split()
+        if len(uids) > max_emails: uids = uids[-max_emails:]
+
+        # Fetch headers in batch
+        if uids:
+            emails = self._fetch_headers(conn, b",".join(uids).decode())
+        return emails
+
+    def _unanswered_criteria(self, conn, days: int) -> str:
+        since_date = (datetime.now() - timedelta(days=days)).strftime("%d-%b-%Y")
+        return f'(UNANSWERED SINCE "{since_date}" {self._exclusion_criteria(conn)})'
+
+    def _exclusion_criteria(self, conn) -> str:
+        """Exclusions d'expediteurs poussees au serveur (jamais telecharges), les mots-cles restent locaux:
+        X-GM-RAW sur Gmail, NOT FROM sur un serveur IMAP standard"""
+        if "X-GM-EXT-1" in conn.capabilities:
+            return f'X-GM-RAW "{gmail_raw_query()}"'
+        return " ".join(imap_search_criteria())
+
+    def sync_changes(self, checkpoint: Optional[Dict[str, Any]] = None, folder: str = "INBOX",
+                     days: int = 7, max_emails: int = 50) -> Optional[Dict[str, Any]]:
+        """Synchro incrementale CONDSTORE/QRESYNC depuis un checkpoint
+        {uidvalidity, last_uid, highestmodseq, exists}
+
+        Retourne {new, answered, unanswered, vanished, present_uids, full_resync, checkpoint}
+        ou None en cas d'erreur. Sans checkpoint valide: synchro classique par fenetre de dates.
+        """
+        try:
+            return self.pool.execute(
+                lambda conn: self._sync_changes(conn, checkpoint or {}, folder, days, max_emails), folder)
+        except Exception as e:
+            print(f"Error sync incrementale: {e}")
+            return None
+
+    def _response_int(self, conn, code: str) -> Optional[int]:
+        _, data = conn.response(code)
+        try:
+            return int(data[-1]) if data and data[-1] else None
+        except (TypeError, ValueError):
+            return None
+
+    def _sync_changes(self, conn, checkpoint: Dict[str, Any], folder: str, days: int, max_emails: int) -> Dict[str, Any]:
+        # Re-SELECT: un seul aller-retour pour UIDVALIDITY / UIDNEXT / HIGHESTMODSEQ a jour
+        status, data = conn.select(quote_mailbox(folder))
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"SELECT {folder} refuse")
+        exists = int(data[0]) if data and data[0] else 0
+        uidvalidity = self._response_int(conn, 'UIDVALIDITY')
+        if uidvalidity:
+            self.pool.uidvalidity[folder] = uidvalidity
+        uidnext = self._response_int(conn, 'UIDNEXT')
+        modseq = self._response_int(conn, 'HIGHESTMODSEQ')
+
+        changes = {"new": [], "answered": [], "unanswered": [], "vanished": [], "present_uids": None,
+                   "full_resync": False}
+        last_uid = checkpoint.get("last_uid") or 0
+
+        if not checkpoint or checkpoint.get("uidvalidity") != uidvalidity or not modseq:
+            # Pas de checkpoint exploitable (premier run, UIDVALIDITY change ou pas de CONDSTORE)
+            changes["full_resync"] = True
+            changes["new"] = self._fetch_unanswered(conn, days, max_emails)
+            new_last = max([int(e["id"]) for e in changes["new"] if e["id"]] or [0])
+            last_uid = max(new_last, (uidnext or 1) - 1)
+        elif modseq != checkpoint.get("highestmodseq"):
+            # 1. Nouveaux messages (UIDs > dernier vu)
+            status, data = conn.uid('search', None, f'UID {last_uid + 1}:*')
+            new_uids = [u for u in (data[0].split() if status == "OK" and data[0] else []) if int(u) > last_uid]
+            if new_uids:
+                status, data = conn.uid('search', None, f'UID {compress_uid_set(new_uids)} UNANSWERED '
+                                                        f'{self._exclusion_criteria(conn)}')
+                pending = data[0].split()[-max_emails:] if status == "OK" and data[0] else []
+                if pending:
+                    changes["new"] = self._fetch_headers(conn, b",".join(pending).decode())
+
+            # 2. Flags modifies (\Answered...) et UIDs disparus depuis le dernier MODSEQ
+            if last_uid:
+                qresync = "QRESYNC" in getattr(conn, "_pool_enabled", ())
+                modifier = f'(CHANGEDSINCE {checkpoint["highestmodseq"]}{" VANISHED" if qresync else ""})'
+                conn.response('VANISHED')  # purge des anciennes reponses
+                status, data = conn.uid('fetch', f'1:{last_uid}', '(UID FLAGS)', modifier)
+                for item in data if status == "OK" else []:
+                    line = item[0] if isinstance(item, tuple) else item
+                    if not isinstance(line, bytes):
+                        continue
+                    uid_match = re.search(rb'UID (\d+)', line)
+                    flags_match = re.search(rb'FLAGS \(([^)]*)\)', line)
+                    if not uid_match or not flags_match:
+                        continue
+                    target = "answered" if b"\\Answered" in flags_match.group(1) else "unanswered"
+                    changes[target].append(uid_match.group(1).decode())
+                if qresync:
+                    _, vanished = conn.response('VANISHED')
+                    for spec in vanished or []:
+                        if spec:
+                            changes["vanished"] += self._expand_uid_set(spec.decode().replace("(EARLIER)", "").strip())
+                elif exists != (checkpoint.get("exists") or 0) + len(new_uids):
+                    # CONDSTORE seul (Gmail): on ne liste les UIDs presents que si le compte ne colle pas
+                    status, data = conn.uid('search', None, f'UID 1:{last_uid}')
+                    changes["present_uids"] = {u.decode() for u in data[0].split()} if status == "OK" and data[0] else set()
+
+            if new_uids:
+                last_uid = max(int(u) for u in new_uids)
+
+        changes["checkpoint"] = {"uidvalidity": uidvalidity, "last_uid": last_uid,
+                                 "highestmodseq": modseq, "exists": exists}
+        return changes
+
+    def _expand_uid_set(self, spec: str) -> List[str]:
+        uids = []
+        for chunk in spec.split(","):
+            if ":" in chunk:
+                lo, hi = sorted(int(x) for x in chunk.split(":"))
+                uids.extend(str(u) for u in range(lo, hi + 1))
+            elif chunk.strip().isdigit():
+                uids.append(chunk.strip())
+        return uids
+
+    def _fetch_headers(self, conn, uid_set: str) -> List[Dict[str, Any]]:
+        """Fetch batch des headers via ENVELOPE: deja decoupes par le serveur, aucun parsing MIME
+        Chaque enregistrement porte aussi la taille (RFC822.SIZE) et les flags."""
+        return [self._envelope_record(uid, fields)
+                for uid, fields in stream_fetch(conn, uid_set, HEADER_ITEMS) if uid]
+
+    def _envelope_record(self, uid: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """ENVELOPE = (date subject from sender reply-to to cc bcc in-reply-to message-id)"""
+        env = fields.get("ENVELOPE") or []
+        env = list(env) + [None] * (10 - len(env))
+        flags = fields.get("FLAGS") or []
+        date = None
+        if env[0]:
+            try: date = parsedate_to_datetime(_imap_str(env[0]))
+            except (TypeError, ValueError): date = None
+        if date is None:
+            date = _parse_internaldate(fields.get("INTERNALDATE")) or datetime.now(timezone.utc)
+        elif date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)  # "-0000": heure UTC sans fuseau connu
+        size = fields.get("RFC822.SIZE")
+        return {
+            "id": uid,  # Persistent UID
+            "message_id": _imap_str(env[9]).strip() or f"no-id-{uid}",
+            "from_email": _envelope_address(env[2]),
+            "to_email": _envelope_address(env[5]),
+            "subject": self._decode_header_value(_imap_str(env[1])),
+            "date": date,
+            "size": int(size) if size and str(size).isdigit() else 0,
+            "flags": [str(f) for f in flags],
+            "answered": "\\Answered" in flags,
+            "direction": "received",
+            "account": self.account.tag,
+            "body": "",
+            "attachments": []
+        }
+
+    def _parse_content(self, uid: str, raw: bytes, folder: str = None, uidvalidity: int = None) -> Dict[str, Any]:
+        """Parse un message brut; s'il vient du reseau (folder fourni), il est garde dans le store local"""
+        msg = email.message_from_bytes(raw)
+        if folder and self.store:
+            try:
+                self.store.put(raw, folder, uidvalidity or self.pool.uidvalidity.get(folder), uid, msg.get("Message-ID"))
+            except Exception as e:  # cache au mieux: le message recu reste utilisable
+                print(f"[RAW STORE] UID {uid} non garde: {e}")
+        return {"uid": uid, "loaded": True, "body": self._get_email_body(msg),
+                "attachments": self._get_attachments(msg)}
+
+    def _cached_content(self, uid: str, folder: str, uidvalidity: int = None,
+                        message_id: str = None) -> Optional[Dict[str, Any]]:
+        """Contenu reparse depuis le store local (aucun acces reseau), None si absent"""
+        if not self.store:
+            return None
+        try:
+            raw = self.store.get(folder, uidvalidity or self.pool.uidvalidity.get(folder), uid, message_id)
+            if raw is None:
+                return None
+            result = self._parse_content(uid, raw)
+        except Exception as e:  # store illisible: chargement reseau
+            print(f"[RAW STORE] Lecture UID {uid} impossible: {e}")
+            return None
+        result.update({"parts": [], "cached": True})
+        return result
+
+    def _store_uidvalidity(self, folder: str) -> Optional[int]:
+        """UIDVALIDITY du dossier (cle du store local), releve par le SELECT d'une connexion du pool
+        Lecteur neuf: une connexion est empruntee pour ce SELECT, puis reutilisee par le fetch."""
+        if self.store and folder not in self.pool.uidvalidity:
+            try:
+                self.pool.execute(lambda conn: None, folder)
+            except Exception as e:
+                print(f"[IMAP] UIDVALIDITY de {folder} indisponible: {e}")
+        return self.pool.uidvalidity.get(folder)
+
+    def load_email_content(self, uid: str, folder: str = "INBOX", with_attachments: bool = True,
+                           message_id: str = None) -> Dict[str, Any]:
+        """Charge le contenu via UID: store local d'abord, sinon BODYSTRUCTURE puis uniquement les sections utiles
+
+        with_attachments=False: seul le texte est telecharge (quelques Ko), les pieces jointes sont
+        decrites dans "parts" et se chargent ensuite avec load_attachments() / load_parts_background().
+        Message plus gros que IMAP_PREVIEW_THRESHOLD (RFC822.SIZE): le texte est tronque a
+        IMAP_PREVIEW_BYTES (fetch partiel) et "text_parts" liste les sections a completer.
+        with_attachments=True: message complet en un FETCH, garde dans le store local.
+        Depuis le store local, le message complet (pieces jointes comprises) est deja disponible.
+        """
+        cached = self._cached_content(uid, folder, self._store_uidvalidity(folder), message_id)
+        if cached:
+            return cached
+        try:
+            return self.pool.execute(lambda conn: self._fetch_content_selective(conn, uid, with_attachments), folder)
+        except ConnectionError:
+            return {"loaded": False, "error": "Connexion impossible"}
         except Exception as e:
             print(f"Error load: {e}")
-            try: conn.logout()
-            except: pass
         return {"loaded": False, "error": "Fetch fail"}
 
+    def load_parts_background(self, uid: str, parts: List[Dict[str, Any]], folder: str = "INBOX",
+                              text_parts: List[Dict[str, Any]] = None, budget: int = ATTACHMENT_BUDGET):
+        """Telecharge en arriere-plan le texte complet (si l'apercu etait tronque) et les pieces jointes
+        du manifest dans la limite de `budget` octets. Retourne un Future:
+        {body: texte complet ou None, attachments: [...], skipped: parties hors budget}"""
+        if self._background is None:
+            self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="imap-parts")
+        return self._background.submit(self._load_parts, uid, parts or [], folder, text_parts or [], budget)
+
+    def _load_parts(self, uid: str, parts: List[Dict[str, Any]], folder: str,
+                    text_parts: List[Dict[str, Any]], budget: int) -> Dict[str, Any]:
+        wanted, skipped, used = [], [], 0
+        for p in parts:
+            if used + p.get("size", 0) <= budget:
+                wanted.append(p)
+                used += p.get("size", 0)
+            else:
+                skipped.append(p)
+
+        def fetch(conn):
+            if not skipped and (wanted or text_parts):
+                # Tout tient dans le budget: message complet en un FETCH, garde dans le store local
+                # (la prochaine ouverture se fait sans reseau)
+                content = self._fetch_content(conn, uid)
+                if content.get("loaded"):
+                    return content["body"], content["attachments"]
+            body = None
+            if text_parts:
+                body = self._body_from_sections(text_parts, self._fetch_sections(conn, uid, text_parts))
+            return body, self._fetch_parts(conn, uid, wanted) if wanted else []
+
+        try:
+            body, attachments = self.pool.execute(fetch, folder)
+        except Exception as e:
+            print(f"Error load background: {e}")
+            return {"body": None, "attachments": [], "skipped": parts, "error": str(e)}
+        if skipped:
+            print(f"[IMAP] UID {uid}: {len(skipped)} piece(s) jointe(s) hors budget "
+                  f"({sum(p.get('size', 0) for p in skipped) / (1024 * 1024):.1f} Mo), chargement manuel")
+        return {"body": body, "attachments": attachments, "skipped": skipped}
+
+    def load_attachments(self, uid: str, parts: List[Dict[str, Any]], folder: str = "INBOX") -> List[Attachment]:
+        """Telecharge uniquement les sections pieces jointes listees (manifest "parts")"""
+        if not parts:
+            return []
+        try:
+            return self.pool.execute(lambda conn: self._fetch_parts(conn, uid, parts), folder)
+        except Exception as e:
+            print(f"Error load attachments: {e}")
+            return []
+
+    def _fetch_content_selective(self, conn, uid: str, with_attachments: bool) -> Dict[str, Any]:
+        if with_attachments:
+            # Toutes les sections seraient telechargees: le message brut, lui, peut aller dans le store local
+            result = self._fetch_content(conn, uid)
+            result.setdefault("parts", [])
+            return result
+        fields = {}
+        for fetched_uid, item in list(stream_fetch(conn, uid, "(UID RFC822.SIZE BODYSTRUCTURE)")):
+            if fetched_uid == str(uid):
+                fields = item
+        size = int(fields.get("RFC822.SIZE") or 0)
+        limit = self._preview_limit(size, with_attachments)
+        parts = self._parse_bodystructure(fields.get("BODYSTRUCTURE"))
+        if not parts:
+            # Structure illisible: on retombe sur le message complet (ou son debut si trop gros)
+            if limit:
+                return self._fetch_raw_preview(conn, uid, size, limit)
+            return self._fetch_content(conn, uid)
+
+        text_parts, attachment_parts = self._split_parts(parts)
+        sections = self._fetch_sections(conn, uid, text_parts, limit) if text_parts else {}
+        return self._content_result(text_parts, attachment_parts, sections, size, limit)
+
+    def _preview_limit(self, size: int, with_attachments: bool) -> Optional[int]:
+        """Taille du fetch partiel du texte pour un message trop gros (None: texte complet)"""
+        if with_attachments or size <= IMAP_PREVIEW_THRESHOLD:
+            return None
+        return IMAP_PREVIEW_BYTES
+
+    def _fetch_sections(self, conn, uid: str, parts: List[Dict[str, Any]], limit: int = None) -> Dict[str, Any]:
+        sections = {}
+        for fetched_uid, item in list(stream_fetch(conn, uid, self._sections_items(parts, limit))):
+            if fetched_uid == str(uid):
+                sections = item
+        return sections
+
+    def _content_result(self, text_parts: List[Dict[str, Any]], attachment_parts: List[Dict[str, Any]],
+                        sections: Dict[str, Any], size: int, limit: int = None) -> Dict[str, Any]:
+        truncated = [p for p in text_parts if limit and p["size"] > limit]
+        return {"loaded": True, "body": self._body_from_sections(text_parts, sections, partial=bool(truncated)),
+                "attachments": [], "parts": attachment_parts, "size": size,
+                "preview": bool(truncated), "text_parts": text_parts if truncated else []}
+
+    def _fetch_raw_preview(self, conn, uid: str, size: int, limit: int) -> Dict[str, Any]:
+        """Apercu d'un message sans BODYSTRUCTURE exploitable: BODY.PEEK[]<0.N> parse tel quel"""
+        raw = b""
+        for fetched_uid, item in list(stream_fetch(conn, uid, f"(UID BODY.PEEK[]<0.{limit}>)")):
+            if fetched_uid == str(uid) and isinstance(item.get("BODY[]<0>"), bytes):
+                raw = item["BODY[]<0>"]
+        if not raw:
+            return {"loaded": False, "error": "Fetch fail"}
+        msg = email.message_from_bytes(raw)
+        return {"loaded": True, "body": self._get_email_body(msg), "attachments": [], "parts": [],
+                "size": size, "preview": True, "text_parts": []}
+
+    def _split_parts(self, parts: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Sections texte du corps / sections pieces jointes (images inline comprises)"""
+        text_parts = [p for p in parts
+                      if p["content_type"] in ("text/plain", "text/html") and "attachment" not in p["disposition"]]
+        attachment_parts = [p for p in parts
+                            if "attachment" in p["disposition"] or p["content_type"].startswith("image/")]
+        return text_parts, attachment_parts
+
+    def _sections_items(self, parts: List[Dict[str, Any]], limit: int = None) -> str:
+        """BODY.PEEK[section] par partie, ou BODY.PEEK[section]<0.limit> (fetch partiel)"""
+        partial = f"<0.{limit}>" if limit else ""
+        return "(UID " + " ".join(f"BODY.PEEK[{p['section']}]{partial}" for p in parts) + ")"
+
+    def _section_data(self, sections: Dict[str, Any], part: Dict[str, Any]):
+        """Donnees d'une section, complete ou partielle (le serveur repond BODY[1]<0>)"""
+        data = sections.get(f"BODY[{part['section']}]")
+        if data is None:
+            data = sections.get(f"BODY[{part['section']}]<0>")
+        return data
+
+    def _body_from_sections(self, text_parts: List[Dict[str, Any]], sections: Dict[str, Any],
+                            partial: bool = False) -> str:
+        text_body = ""
+        html_body = ""
+        for p in text_parts:
+            data = self._section_data(sections, p)
+            if not isinstance(data, bytes) or not data:
+                continue
+            text = self._decode_part(data, p["encoding"], partial).decode(p["charset"] or 'utf-8', errors='ignore')
+            if p["content_type"] == "text/plain": text_body = text
+            else: html_body = text
+        return self._select_body(text_body, html_body)
+
+    def _fetch_parts(self, conn, uid: str, parts: List[Dict[str, Any]]) -> List[Attachment]:
+        """Un seul FETCH pour toutes les sections demandees, decodees en octets bruts"""
+        return self._attachments_from_sections(parts, self._fetch_sections(conn, uid, parts))
+
+    def _attachments_from_sections(self, parts: List[Dict[str, Any]], sections: Dict[str, Any]) -> List[Attachment]:
+        attachments = []
+        for p in parts:
+            data = sections.get(f"BODY[{p['section']}]")
+            if not isinstance(data, bytes) or not data:
+                continue
+            try:
+                decoded = self._decode_part(data, p["encoding"])
+            except Exception:
+                continue
+            attachments.append(Attachment(p.get("filename") or f"attachment_{len(attachments)}",
+                                          p["content_type"], decoded))
+        return attachments
+
+    def _decode_part(self, data: bytes, encoding: str, partial: bool = False) -> bytes:
+        """Decode le Content-Transfer-Encoding d'une section (partial: coupee en plein milieu)"""
+        if encoding == "base64":
+            if partial:
+                data = b"".join(data.split())
+                data = data[:len(data) // 4 * 4]  # on ignore le dernier bloc incomplet
+            return base64.b64decode(data)
+        if encoding == "quoted-printable" and partial:
+            data = re.sub(rb"=[0-9A-Fa-f]?$", b"", data)  # sequence =XX coupee
+        if encoding == "quoted-printable":
+            return quopri.decodestring(data)
+        return data
+
+    def _parse_bodystructure(self, node, section: str = "") -> List[Dict[str, Any]]:
+        """Aplatit un BODYSTRUCTURE tokenise en parties feuilles numerotees (1, 1.1, 2...)"""
+        if not isinstance(node, list) or not node:
+            return []
+        parts = []
+        if isinstance(node[0], list):  # multipart: enfants, puis sous-type et extensions
+            children = []
+            for child in node:
+                if not isinstance(child, list):
+                    break
+                children.append(child)
+            for idx, child in enumerate(children):
+                parts += self._parse_bodystructure(child, f"{section}.{idx + 1}" if section else str(idx + 1))
+            return parts
+
+        sec = section or "1"
+        maintype = str(node[0] or "").lower()
+        subtype = str(node[1] or "").lower() if len(node) > 1 else ""
+        params = self._param_dict(node[2] if len(node) > 2 else None)
+        encoding = str(node[5] or "7bit").lower() if len(node) > 5 else "7bit"
+        try: size = int(node[6])
+        except: size = 0
+        is_rfc822 = (maintype, subtype) == ("message", "rfc822")
+        disp_idx = 9 if maintype == "text" else 11 if is_rfc822 else 8
+        disposition = node[disp_idx] if len(node) > disp_idx and isinstance(node[disp_idx], list) else []
+        disp_kind = str(disposition[0] or "").lower() if disposition else ""
+        disp_params = self._param_dict(disposition[1] if len(disposition) > 1 else None)
+
+        if is_rfc822 and len(node) > 8 and isinstance(node[8], list):
+            # Email transfere: on descend dans le message embarque comme email.walk()
+            nested = node[8]
+            return self._parse_bodystructure(nested, sec if nested and isinstance(nested[0], list) else f"{sec}.1")
+
+        return [{
+            "section": sec,
+            "content_type": f"{maintype}/{subtype}",
+            "charset": params.get("charset"),
+            "encoding": encoding,
+            "size": size,
+            "disposition": disp_kind,
+            "filename": self._part_filename(disp_params, params),
+        }]
+
+    def _param_dict(self, plist) -> Dict[str, str]:
+        if not isinstance(plist, list):
+            return {}
+        return {str(plist[i]).lower(): plist[i + 1] for i in range(0, len(plist) - 1, 2)
+                if isinstance(plist[i + 1], str)}
+
+    def _part_filename(self, disp_params: Dict[str, str], params: Dict[str, str]) -> str:
+        for key in ("filename", "name"):
+            for source in (disp_params, params):
+                if source.get(key):
+                    return self._decode_header_value(source[key])
+                if source.get(key + "*"):
+                    # RFC 2231: charset'langue'valeur%20encodee
+                    charset, _, rest = source[key + "*"].partition("'")
+                    _, _, value = rest.partition("'")
+                    return unquote(value or source[key + "*"], encoding=charset or 'utf-8', errors='replace')
+        return ""
+
+    def _fetch_content(self, conn, uid: str) -> Dict[str, Any]:
+        status, data = conn.uid('fetch', uid.encode(), "(BODY.PEEK[])")
+        if status == "OK" and data and data[0]:
+            content = self._parse_content(uid, data[0][1], getattr(conn, "_pool_folder", None))
+            del content["uid"]
+            return content
+        return {"loaded": False, "error": "Fetch fail"}
+
+    def iter_email_contents(self, uids: List[str], folder: str = "INBOX") -> Iterator[Dict[str, Any]]:
+        """Charge le contenu de plusieurs emails en UN seul UID FETCH sur une connexion du pool
+        Generateur: chaque {uid, loaded, body, attachments} est rendu des que le message est recu."""
+        pending = []
+        uidvalidity = self._store_uidvalidity(folder)
+        for uid in (str(u) for u in uids if u):
+            cached = self._cached_content(uid, folder, uidvalidity)
+            if cached:
+                yield cached
+            else:
+                pending.append(uid)
+        if not pending:
+            return
+        conn = self.pool.checkout(folder)
+        if conn is None:
+            for uid in pending:
+                yield {"uid": uid, "loaded": False, "error": "Connexion impossible"}
+            return
+
+        remaining = set(pending)
+        completed = False
+        try:
+            for uid, fields in stream_fetch(conn, ",".join(pending), "(UID BODY.PEEK[])"):
+                raw = fields.get("BODY[]")
+                if uid not in remaining or not isinstance(raw, bytes):
+                    continue
+                remaining.discard(uid)
+                yield self._parse_content(uid, raw, folder)
+            completed = True
+        except Exception as e:
+            print(f"Error load batch: {e}")
+        finally:
+            # Si le consommateur s'arrete en cours de route, la reponse n'est pas lue jusqu'au bout:
+            # la connexion n'est plus reutilisable
+            self.pool.checkin(conn, broken=not completed)
+
+        for uid in pending:
+            if uid in remaining:
+                yield {"uid": uid, "loaded": False, "error": "Fetch fail"}
+
+    def get_folder_status(self, folder: str = "INBOX") -> Optional[Dict[str, int]]:
+        """STATUS du dossier: {uidvalidity, uidnext, messages} (None si indisponible)"""
+        def status(conn):
+            typ, data = conn.status(quote_mailbox(folder), "(UIDVALIDITY UIDNEXT MESSAGES)")
+            if typ != "OK" or not data or not data[0]:
+                return None
+            values = dict(re.findall(rb'(UIDVALIDITY|UIDNEXT|MESSAGES) (\d+)', data[0]))
+            return {key.decode().lower(): int(value) for key, value in values.items()}
+        try:
+            return self.pool.execute(status, folder)
+        except Exception as e:
+            print(f"Error status {folder}: {e}")
+            return None
+
+    def mark_answered(self, uids, folder: str = "INBOX") -> bool:
+        """Pose \\Answered (et \\Seen) cote serveur via le pool: le message sort de la recherche UNANSWERED"""
+        uids = [str(uid) for uid in ([uids] if isinstance(uids, (str, int)) else uids) if str(uid).isdigit()]
+        if not uids:
+            return False
+        def store(conn):
+            typ, _ = conn.uid('store', compress_uid_set(uids), '+FLAGS.SILENT', '(\\Answered \\Seen)')
+            return typ == "OK"
+        try:
+            done = self.pool.execute(store, folder)
+            print(f"[IMAP] \\Answered pose sur {len(uids)} message(s) de {folder}" if done
+                  else f"[IMAP] STORE \\Answered refuse ({folder})")
+            return done
+        except Exception as e:
+            print(f"[IMAP] Erreur STORE \\Answered {folder}: {e}")
+            return False
+
+    def fetch_uid_range(self, first_uid: int, last_uid: int, folder: str = "INBOX",
+                        with_bodies: bool = True, unseen: Optional[Callable[[List[str]], set]] = None,
+                        fetcher: Optional["ParallelFetcher"] = None) -> Iterator[Dict[str, Any]]:
+        """Emails d'une tranche fixe d'UIDs first_uid:last_uid (backfill), expediteurs exclus filtres par le serveur
+        Generateur: headers + flag answered de la tranche, puis chaque email est rendu des que son contenu
+        est recu (un seul FETCH en flux si with_bodies): un seul message complet en memoire a la fois.
+        Seuls les emails dont le Message-ID est dans `unseen(message_ids)` sont gardes (un seul appel
+        pour la tranche). `fetcher`: contenus repartis sur ses connexions au lieu d'une seule.
+        Leve une exception si IMAP est indisponible (la tranche sera rejouee)."""
+        def headers(conn):
+            status, data = conn.uid('search', None, f'UID {first_uid}:{last_uid} {self._exclusion_criteria(conn)}')
+            # "UID n:m" renvoie toujours le dernier message si n > UID max: on borne
+            uids = [u for u in (data[0].split() if status == "OK" and data[0] else [])
+                    if first_uid <= int(u) <= last_uid]
+            if not uids:
+                return []
+            uid_set = compress_uid_set(uids)
+            status, data = conn.uid('search', None, f'UID {uid_set} ANSWERED')
+            answered = {u.decode() for u in (data[0].split() if status == "OK" and data[0] else [])}
+            emails = self._fetch_headers(conn, uid_set)
+            for e in emails:
+                e["answered"] = e["id"] in answered
+                if folder != "INBOX":
+                    e["folder"] = folder
+            return emails
+
+        emails = self.pool.execute(headers, folder)
+        if unseen and emails:
+            new_ids = unseen([e["message_id"] for e in emails])
+            emails = [e for e in emails if str(e["message_id"]) in new_ids]
+        if not with_bodies:
+            yield from emails
+            return
+        # Plus aucune reference aux emails deja rendus: le consommateur les libere apres sauvegarde
+        pending = {e["id"]: e for e in emails}
+        del emails
+        contents = (fetcher.iter_contents(list(pending), folder) if fetcher
+                    else self.iter_email_contents(list(pending), folder))
+        for content in contents:
+            e = pending.pop(content["uid"], None)
+            if e is None:
+                continue
+            if content.get("loaded"):
+                e["body"] = content["body"]
+                e["attachments"] = content["attachments"]
+            yield e
+        # Sans contenu (reponse incomplete): headers seuls, le corps viendra du prefetch
+        yield from pending.values()
+
+    def get_all_mail_folder(self) -> str:
+        """Nom du dossier "Tous les messages" (attribut special-use \\All, depend de la langue Gmail)"""
+        if self._all_mail is None:
+            try:
+                self._all_mail = self.pool.execute(self._find_all_mail)
+            except Exception as e:
+                print(f"[IMAP] LIST impossible: {e}")
+                return IMAP_ALL_MAIL
+        return self._all_mail
+
+    def _find_all_mail(self, conn) -> str:
+        status, data = conn.list()
+        for line in (data if status == "OK" and data else []):
+            if not isinstance(line, bytes):
+                continue
+            flags, _, rest = line.partition(b")")
+            if b"\\All" in flags.lstrip(b"(").split():
+                # (\HasNoChildren \All) "/" "[Gmail]/Tous les messages"
+                match = re.search(rb'"((?:[^"\\]|\\.)*)"\s*$', rest) or re.search(rb'(\S+)\s*$', rest)
+                if match:
+                    return match.group(1).decode('utf-8', errors='ignore')
+        return IMAP_ALL_MAIL
+
+    def get_thread(self, message_id: str = None, uid: str = None, folder: str = "INBOX") -> List[Dict[str, Any]]:
+        """Thread Gmail complet (emails recus ET nos reponses) en une seule recherche X-GM-THRID sur All Mail
+
+        Headers uniquement: chaque email porte "folder" et "id" (UID dans All Mail) pour charger
+        ensuite le contenu a la demande avec iter_email_contents(uids, folder).
+        """
+        all_mail = self.get_all_mail_folder()
+        try:
+            thrid = None
+            if uid:
+                thrid = self.pool.execute(lambda conn: self._fetch_thrid(conn, str(uid)), folder)
+            if thrid is None and message_id:
+                thrid = self.pool.execute(lambda conn: self._search_thrid(conn, message_id), all_mail)
+            if thrid is None:
+                return []
+            return self.pool.execute(lambda conn: self._fetch_thread(conn, thrid, all_mail), all_mail)
+        except Exception as e:
+            print(f"Error thread: {e}")
+            return []
+
+    def _fetch_thrid(self, conn, uid: str) -> Optional[int]:
+        for fetched_uid, fields in list(stream_fetch(conn, uid, "(UID X-GM-THRID)")):
+            if fetched_uid == uid and fields.get("X-GM-THRID"):
+                return int(fields["X-GM-THRID"])
+        return None
+
+    def _search_thrid(self, conn, message_id: str) -> Optional[int]:
+        msgid = message_id.strip().strip("<>").replace('"', '')
+        status, data = conn.uid('search', None, 'X-GM-RAW', f'"rfc822msgid:{msgid}"')
+        uids = data[0].split() if status == "OK" and data and data[0] else []
+        return self._fetch_thrid(conn, uids[-1].decode()) if uids else None
+
+    def _fetch_thread(self, conn, thrid: int, folder: str) -> List[Dict[str, Any]]:
+        status, data = conn.uid('search', None, 'X-GM-THRID', str(thrid))
+        uids = data[0].split() if status == "OK" and data and data[0] else []
+        if not uids:
+            return []
+        me = (self.account.user or "").lower()
+        emails = self._fetch_headers(conn, compress_uid_set(uids))
+        for e in emails:
+            e["folder"] = folder  # UID dans All Mail
+            e["thread_id"] = str(thrid)
+            e["direction"] = "sent" if me and e["from_email"] == me else "received"
+        emails.sort(key=lambda e: int(e["id"]))
+        return emails
+
+    def search_client_uids(self, client_email: str, folder: str = None) -> List[str]:
+        """UIDs de tous les emails echanges avec un client (OR FROM x TO x), par defaut sur All Mail"""
+        address = (client_email or "").strip().replace('"', '').replace("\\", "")
+        if not address:
+            return []
+        def search(conn):
+            status, data = conn.uid('search', None, f'OR FROM "{address}" TO "{address}"')
+            return [u.decode() for u in (data[0].split() if status == "OK" and data and data[0] else [])]
+        return self.pool.execute(search, folder or self.get_all_mail_folder())
+
+    def iter_client_history(self, client_email: str, known_uids: set = None,
+                            unseen: Optional[Callable[[List[str]], set]] = None,
+                            chunk_size: int = 50) -> Iterator[List[Dict[str, Any]]]:
+        """Backfill d'un client sur All Mail, par lots du plus recent au plus ancien
+        UIDs deja connus (known_uids) ignores avant tout FETCH, puis seuls les Message-IDs rendus par
+        `unseen(message_ids)` sont gardes apres les headers: seul le contenu manquant est telecharge.
+        Chaque lot (headers + contenu, direction sent/received) est rendu des qu'il est pret.
+        Leve une exception si IMAP est indisponible."""
+        all_mail = self.get_all_mail_folder()
+        uids = [u for u in self.search_client_uids(client_email, all_mail) if u not in (known_uids or ())]
+        uids.sort(key=int, reverse=True)  # Le plus recent d'abord: utile tout de suite pour l'analyse
+        me = (self.account.user or "").lower()
+
+        def headers(conn, uid_set):
+            status, data = conn.uid('search', None, f'UID {uid_set} ANSWERED')
+            answered = {u.decode() for u in (data[0].split() if status == "OK" and data[0] else [])}
+            emails = self._fetch_headers(conn, uid_set)
+            for e in emails:
+                e["answered"] = e["id"] in answered
+                e["folder"] = all_mail  # UID dans All Mail
+                e["direction"] = "sent" if me and e["from_email"] == me else "received"
+            return emails
+
+        for i in range(0, len(uids), max(1, chunk_size)):
+            uid_set = compress_uid_set(uids[i:i + chunk_size])
+            emails = self.pool.execute(lambda conn: headers(conn, uid_set), all_mail)
+            if unseen and emails:
+                new_ids = unseen([e["message_id"] for e in emails])
+                emails = [e for e in emails if str(e["message_id"]) in new_ids]
+            if emails:
+                contents = {c["uid"]: c for c in self.iter_email_contents([e["id"] for e in emails], all_mail)}
+                for e in emails:
+                    content = contents.get(e["id"])
+                    if content and content.get("loaded"):
+                        e["body"] = content["body"]
+                        e["attachments"] = content["attachments"]
+            yield emails
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Statistiques du pool IMAP (hits, misses, reconnexions, temps economise)"""
+        return self.pool.get_stats()
+
+    def get_connection_state(self) -> Dict[str, Any]:
+        """Etat du circuit IMAP du compte (closed / open / half-open) pour l'affichage"""
+        return get_breaker(self.account).get_state()
+
+    def get_store_stats(self) -> Optional[Dict[str, Any]]:
+        """Statistiques du store local des messages bruts (None si desactive)"""
+        return self.store.get_stats() if self.store else None
+
     def get_recent_emails(self, days: int = 7, folder: str = "INBOX", unread_only: bool = True, max_emails: int = 50) -> List[Dict[str, Any]]:
         # Version simplifiee UID
         return self.get_unanswered_emails(days=days, folder=folder, max_emails=max_emails)
+
+
+# Connexions de fetch parallele ouvertes par compte, tous ParallelFetcher confondus (backfill,
+# prechargement, sessions Streamlit): marge sous la limite Gmail pour l'app, l'IDLE et le webmail
+PARALLEL_FETCH_BUDGET = GMAIL_MAX_CONNECTIONS - 5
+_FETCH_RESERVED = {}  # {nom du compte: connexions reservees}
+_FETCH_BUDGET_LOCK = threading.Lock()
+
+
+def reserve_fetch_connections(account: MailAccount, wanted: int) -> int:
+    """Reserve jusqu'a `wanted` connexions dans le budget du compte, retourne le nombre obtenu (0 si epuise)"""
+    with _FETCH_BUDGET_LOCK:
+        used = _FETCH_RESERVED.get(account.name, 0)
+        granted = max(0, min(wanted, PARALLEL_FETCH_BUDGET - used))
+        _FETCH_RESERVED[account.name] = used + granted
+    return granted
+
+
+def release_fetch_connections(account: MailAccount, count: int):
+    with _FETCH_BUDGET_LOCK:
+        _FETCH_RESERVED[account.name] = max(0, _FETCH_RESERVED.get(account.name, 0) - count)
+
+
+class ParallelFetcher:
+    """Moteur de fetch parallele pour les gros volumes (backfill, prechargement)
+
+    Decoupe les UIDs en lots repartis sur `workers` connexions authentifiees (pool dedie, pour ne
+    pas affamer l'interface), reservees dans le budget du compte jusqu'a close(). Les messages sont
+    rendus au fil de l'eau: au plus `window` messages recus attendent le consommateur.
+    Budget epuise: tout passe par une seule connexion du lecteur (iter_email_contents).
+    """
+
+    def __init__(self, reader: "EmailReader", workers: int = IMAP_FETCH_WORKERS, chunk_size: int = 50,
+                 folder: str = "INBOX", window: int = None):
+        self.reader = reader
+        self.account = reader.account
+        self.workers = reserve_fetch_connections(self.account, max(1, workers))
+        self.chunk_size = max(1, chunk_size)
+        self.folder = folder
+        self.window = max(1, window or self.workers * 2)
+        self.pool = IMAPConnectionPool(max_size=max(1, self.workers), account=self.account)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"messages": 0, "bytes": 0, "chunks": 0, "errors": 0, "elapsed": 0.0}
+        if not self.workers:
+            print(f"[FETCH] Budget de {PARALLEL_FETCH_BUDGET} connexions atteint ({self.account.name}): "
+                  f"fetch sur la connexion du lecteur")
+
+    def fetch(self, uids, items: str = "(UID BODY.PEEK[])",
+              folder: str = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Rend (uid, {ITEM: valeur}) dans l'ordre d'arrivee, lots fetches en parallele
+        Si le consommateur s'arrete en cours de route, les lots restants sont abandonnes."""
+        uid_list = sorted({int(u) for u in uids if str(u).isdigit()})
+        chunks = deque(uid_list[i:i + self.chunk_size] for i in range(0, len(uid_list), self.chunk_size))
+        if not chunks or not self.workers:
+            return
+        folder = folder or self.folder
+        start_time = time.time()
+        rows = queue.Queue(maxsize=self.window)
+        stop = threading.Event()
+        threads = [threading.Thread(target=self._worker, args=(chunks, items, folder, rows, stop), daemon=True,
+                                    name="imap-fetch") for _ in range(min(self.workers, len(chunks)))]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        try:
+            while running:
+                row = rows.get()
+                if row is None:  # un worker a termine
+                    running -= 1
+                    continue
+                yield row
+        finally:
+            stop.set()
+            # Vide la file pour debloquer les workers encore en cours (consommateur arrete avant la fin)
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    rows.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            with self._lock:
+                self.stats["elapsed"] += time.time() - start_time
+            stats = self.get_stats()
+            print(f"[FETCH] {stats['messages']} messages en {stats['elapsed']}s "
+                  f"({stats['messages_per_s']} msg/s, {stats['mb_per_s']} Mo/s) sur {self.workers} connexions")
+
+    def _worker(self, chunks: deque, items: str, folder: str, rows: queue.Queue, stop: threading.Event):
+        try:
+            while not stop.is_set():
+                try:
+                    chunk = chunks.popleft()
+                except IndexError:
+                    break
+                self._fetch_chunk(chunk, items, folder, rows, stop)
+        finally:
+            rows.put(None)
+
+    def _fetch_chunk(self, chunk: List[int], items: str, folder: str, rows: queue.Queue, stop: threading.Event):
+        """Un UID FETCH en flux: chaque message part vers le consommateur des qu'il est lu"""
+        conn = self.pool.checkout(folder)
+        if conn is None:
+            print(f"[FETCH] Lot {chunk[0]}-{chunk[-1]}: connexion impossible")
+            with self._lock:
+                self.stats["errors"] += 1
+            return
+        completed = False
+        count = size = 0
+        try:
+            for row in stream_fetch(conn, compress_uid_set(chunk), items):
+                if stop.is_set():
+                    return  # reponse non lue jusqu'au bout: connexion fermee au checkin
+                rows.put(row)
+                count += 1
+                size += sum(len(v) for v in row[1].values() if isinstance(v, bytes))
+            completed = True
+        except Exception as e:
+            print(f"[FETCH] Erreur lot {chunk[0]}-{chunk[-1]}: {e}")
+            self.pool._record_timeout(e)
+            with self._lock:
+                self.stats["errors"] += 1
+        finally:
+            self.pool.checkin(conn, broken=not completed)
+            with self._lock:
+                self.stats["messages"] += count
+                self.stats["bytes"] += size
+                self.stats["chunks"] += 1 if completed else 0
+
+    def iter_contents(self, uids, folder: str = None) -> Iterator[Dict[str, Any]]:
+        """Comme EmailReader.iter_email_contents, mais reparti sur plusieurs connexions"""
+        folder = folder or self.folder
+        if not self.workers:
+            yield from self.reader.iter_email_contents(uids, folder)
+            return
+        wanted = [str(u) for u in uids if str(u).isdigit()]
+        seen = set()
+        # Connexions du fetcher pas encore ouvertes: UIDVALIDITY via le SELECT du pool du lecteur
+        uidvalidity = self.pool.uidvalidity.get(folder) or self.reader._store_uidvalidity(folder)
+        for uid in wanted:
+            cached = self.reader._cached_content(uid, folder, uidvalidity)
+            if cached:
+                seen.add(uid)
+                yield cached
+        for uid, fields in self.fetch([u for u in wanted if u not in seen], "(UID BODY.PEEK[])", folder):
+            raw = fields.get("BODY[]")
+            if uid in seen or not isinstance(raw, bytes):
+                continue
+            seen.add(uid)
+            yield self.reader._parse_content(uid, raw, folder, self.pool.uidvalidity.get(folder) or uidvalidity)
+        for uid in wanted:
+            if uid not in seen:
+                yield {"uid": uid, "loaded": False, "error": "Fetch fail"}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Debit: messages/s et Mo/s sur la duree cumulee des fetchs"""
+        with self._lock:
+            stats = dict(self.stats)
+        elapsed = stats["elapsed"] or 0.0
+        stats["elapsed"] = round(elapsed, 2)
+        stats["messages_per_s"] = round(stats["messages"] / elapsed, 1) if elapsed else 0.0
+        stats["mb_per_s"] = round(stats["bytes"] / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+        return stats
+
+    def close(self):
+        """Ferme les connexions et rend leur place dans le budget du compte"""
+        self.pool.close()
+        with self._lock:
+            closed, self._closed = self._closed, True
+        if not closed:
+            release_fetch_connections(self.account, self.workers)
+
+
+class IdleWatcher:
+    """Ecoute IMAP IDLE (push) et ingere les nouveaux emails dans la DB en temps reel
+
+    Utilise une connexion dediee (hors pool: IDLE bloque la connexion). Sur EXISTS on ne
+    fetch que les headers des UIDs > dernier UID vu, puis on passe par db.save_email().
+    """
+
+    def __init__(self, reader: EmailReader, db, folder: str = "INBOX", renew_interval: int = IMAP_IDLE_RENEW,
+                 on_new: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.reader = reader
+        self.db = db
+        self.folder = folder
+        self.renew_interval = renew_interval
+        self.on_new = on_new
+        self.last_uid = 0
+        self.uidvalidity = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._tag_counter = 0
+        self.stats = {"saved": 0, "ignored": 0, "expunged": 0, "reconnects": 0,
+                      "connected": False, "last_event": None}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="imap-idle")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        backoff = 5
+        while not self._stop.is_set():
+            try:
+                self._watch()
+                backoff = 5
+            except Exception as e:
+                print(f"[IDLE] Connexion perdue: {type(e).__name__}: {e}")
+            self.stats["connected"] = False
+            if self._stop.is_set():
+                break
+            self.stats["reconnects"] += 1
+            # Circuit ouvert: inutile de reessayer avant le prochain essai autorise
+            self._stop.wait(max(backoff, get_breaker(self.reader.account).retry_in()))
+            backoff = min(backoff * 2, 300)
+
+    def _watch(self):
+        conn = create_connection(self.reader.account)
+        if conn is None:
+            raise ConnectionError("Connexion IMAP impossible")
+        try:
+            status, _ = conn.select(self.folder)
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"SELECT {self.folder} refuse")
+            _, validity = conn.response('UIDVALIDITY')
+            _, uidnext = conn.response('UIDNEXT')
+            validity = int(validity[0]) if validity and validity[0] else None
+            uidnext = int(uidnext[0]) if uidnext and uidnext[0] else 1
+
+            if self.uidvalidity is None or validity != self.uidvalidity or not self.last_uid:
+                # Premier demarrage: l'existant est gere par la synchro classique
+                self.last_uid = uidnext - 1
+            else:
+                # Reconnexion: rattraper ce qui est arrive pendant la coupure
+                self._ingest_new(conn)
+            self.uidvalidity = validity
+            self.stats["connected"] = True
+            print(f"[IDLE] En ecoute sur {self.folder} (dernier UID {self.last_uid})")
+
+            use_idle = b"IDLE" in [c.encode() if isinstance(c, str) else c for c in conn.capabilities]
+            while not self._stop.is_set():
+                if not use_idle:
+                    # Serveur sans IDLE: simple polling des nouveaux UIDs
+                    self._stop.wait(IMAP_KEEPALIVE)
+                    self._ingest_new(conn)
+                    continue
+                events = self._idle(conn, self.renew_interval)
+                if any(re.match(rb"\* \d+ EXISTS", line) for line in events):
+                    self._ingest_new(conn)
+                expunged = sum(1 for line in events if re.match(rb"\* (\d+ EXPUNGE|VANISHED)", line))
+                if expunged:
+                    # On garde l'historique local: un email supprime cote Gmail reste dans le CRM
+                    self.stats["expunged"] += expunged
+                    self.stats["last_event"] = datetime.now().isoformat()
+        finally:
+            try: conn.logout()
+            except: pass
+
+    def _idle(self, conn, timeout: float) -> List[bytes]:
+        """Une session IDLE: rend la main des qu'une notification arrive (ou au timeout)"""
+        self._tag_counter += 1
+        tag = f"IDLE{self._tag_counter}".encode()
+        conn.send(tag + b" IDLE\r\n")
+        resp = conn.readline()
+        if not resp.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE refuse: {resp!r}")
+
+        lines = []
+        deadline = time.time() + timeout
+        while not self._stop.is_set() and time.time() < deadline:
+            pending = getattr(conn.sock, "pending", lambda: 0)() or self._buffered(conn)
+            if not pending:
+                ready, _, _ = select.select([conn.sock], [], [], min(1.0, max(0.0, deadline - time.time())))
+                if not ready:
+                    continue
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connexion fermee pendant IDLE")
+            lines.append(line.rstrip())
+            break
+
+        # DONE puis lecture jusqu'a la reponse taggee (recupere aussi les notifs groupees)
+        conn.send(b"DONE\r\n")
+        while True:
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connexion fermee pendant IDLE")
+            if line.startswith(tag):
+                break
+            lines.append(line.rstrip())
+        return lines
+
+    @staticmethod
+    def _buffered(conn) -> bool:
+        """Une notification deja lue depuis la socket attend dans le tampon de conn.file (ou de DeflateStream)
+        select() ne la verrait pas: elle arrive souvent dans le meme paquet que le "+ idling"."""
+        stream = getattr(conn, "_compress", None)
+        if stream is not None:
+            return stream.buffered() > 0
+        peek = getattr(conn.file, "peek", None)
+        if peek is None:
+            return False
+        timeout = conn.sock.gettimeout()
+        conn.sock.settimeout(0)  # tampon vide: peek ne doit pas attendre la socket
+        try:
+            return bool(peek(1))
+        except OSError:  # EAGAIN / SSLWantReadError: rien en attente
+            return False
+        finally:
+            conn.sock.settimeout(timeout)
+
+    def _ingest_new(self, conn):
+        """Fetch uniquement les headers des UIDs arrives depuis last_uid et les sauvegarde
+        last_uid n'avance qu'apres save_email sur tout le lot (les doublons rejoues sont filtres par Message-ID)"""
+        status, data = conn.uid('search', None, f'UID {self.last_uid + 1}:*')
+        new_uids = [u for u in (data[0].split() if status == "OK" and data[0] else []) if int(u) > self.last_uid]
+        if not new_uids:
+            return
+        # Exclusions filtrees par le serveur: seuls les headers utiles sont telecharges
+        status, data = conn.uid('search', None,
+                                f'UID {compress_uid_set(new_uids)} {self.reader._exclusion_criteria(conn)}')
+        kept = data[0].split() if status == "OK" and data[0] else []
+        self.stats["ignored"] += len(new_uids) - len(kept)
+        new_emails = self.reader._fetch_headers(conn, compress_uid_set(kept)) if kept else []
+        new_ids = self.db.get_new_message_ids(e.get("message_id") or e.get("id") for e in new_emails)
+        saved = []
+        for email_data in new_emails:
+            message_id = email_data.get("message_id") or email_data.get("id")
+            if str(message_id) not in new_ids:
+                continue
+            if self.db.save_email(email_data):
+                saved.append(email_data)
+                self.stats["saved"] += 1
+            else:
+                self.stats["ignored"] += 1
+        # Seulement une fois le lot en base: une coupure avant ce point fait rejouer ces UIDs a la reconnexion
+        self.last_uid = max(self.last_uid, max(int(u) for u in new_uids))
+        self.stats["last_event"] = datetime.now().isoformat()
+        print(f"[IDLE] {len(new_uids)} nouveaux emails, {len(saved)} sauvegardes")
+        if saved and self.on_new:
+            try: self.on_new(saved)
+            except Exception as e: print(f"[IDLE] Erreur callback: {e}")
@@ -2,21 +2,12 @@
 Module d'envoi d'emails via Gmail SMTP
 """
 
-import os
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from typing import Optional, List, Dict
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-MAIL_USER = os.getenv("MAIL_USER")
-MAIL_PASS = os.getenv("MAIL_PASS")
-FROM_NAME = "Achzod Coaching"
+from accounts import MailAccount, PRIMARY_ACCOUNT
 
 
 def send_email(
@@ -24,7 +15,8 @@ def send_email(
     subject: str,
     body: str,
     reply_to_message_id: Optional[str] = None,
-    original_subject: Optional[str] = None
+    original_subject: Optional[str] = None,
+    account: Optional[MailAccount] = None
 ) -> Dict[str, any]:
     """
     Envoie un email de reponse
@@ -35,7 +27,9 @@ def send_email(
         body: Corps du message (texte brut)
         reply_to_message_id: Message-ID pour threading
         original_subject: Sujet original pour le Re:
+        account: Boite d'envoi (compte principal par defaut)
     """
+    account = account or PRIMARY_ACCOUNT
     try:
         # Preparation du sujet
         if not subject and original_subject:
@@ -49,7 +43,7 @@ def send_email(
         # Creation du message
         msg = MIMEMultipart('alternative')
         msg['Subject'] = subject
-        msg['From'] = f"{FROM_NAME} <{MAIL_USER}>"
+        msg['From'] = f"{account.from_name} <{account.user}>"
         msg['To'] = to_email
 
         # Headers pour le threading (reponse dans le meme fil)
@@ -78,9 +72,9 @@ def send_email(
         msg.attach(MIMEText(html, 'html', 'utf-8'))
 
         # Envoi
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+        with smtplib.SMTP(account.smtp_server, account.smtp_port) as server:
             server.starttls()
-            server.login(MAIL_USER, MAIL_PASS)
+            server.login(account.user, account.password)
             server.send_message(msg)
 
         return {
@@ -98,11 +92,13 @@ def send_email(
 def preview_email(
     to_email: str,
     subject: str,
-    body: str
+    body: str,
+    account: Optional[MailAccount] = None
 ) -> str:
     """
     Genere un apercu HTML de l'email
     """
+    account = account or PRIMARY_ACCOUNT
     html_body = body.replace('\n', '<br>')
 
     preview = f"""
@@ -122,7 +118,7 @@ def preview_email(
     <body>
         <div class="email-container">
             <div class="email-header">
-                <div class="email-field"><span class="email-label">De:</span> Achzod Coaching &lt;{MAIL_USER}&gt;</div>
+                <div class="email-field"><span class="email-label">De:</span> {account.from_name} &lt;{account.user}&gt;</div>
                 <div class="email-field"><span class="email-label">A:</span> {to_email}</div>
                 <div class="email-field"><span class="email-label">Sujet:</span> {subject}</div>
             </div>
@@ -0,0 +1,47 @@
+"""
+Configuration unique des exclusions (spam, notifications, factures...)
+Seuls les expediteurs sans ambiguite sont filtres cote serveur; les mots-cles (sujet ou expediteur)
+restent un filtre local, applique avant sauvegarde
+"""
+from typing import List
+
+# Expediteurs jamais utiles pour le coaching, filtres par le serveur (SEARCH FROM / X-GM-RAW from:).
+# Uniquement des domaines: X-GM-RAW compare des mots entiers (nom affiche compris) alors que le filtre
+# local compare des sous-chaines de l'adresse, un mot generique donnerait deux resultats differents
+EXCLUDE_SENDERS = [
+    'typeform.com', 'stripe.com', 'paypal.com', 'paypal.fr',
+    'linkedin.com', 'facebookmail.com', 'instagram.com', 'twitter.com', 'youtube.com', 'pinterest.com'
+]
+
+# Mots exclus dans l'expediteur ou le sujet (filtre local uniquement, sous-chaine)
+EXCLUDE_PATTERNS = [
+    'typeform', 'followup', 'newsletter', 'noreply', 'no-reply',
+    'stripe', 'paypal', 'billing', 'invoice', 'facture', 'recu', 'receipt',
+    'paiement', 'payment',
+    'confirmation', 'commande', 'order', 'shipping', 'livraison',
+    'publicite', 'promo', 'soldes', 'unsubscribe', 'desinscription',
+    'linkedin', 'instagram', 'facebook', 'twitter', 'youtube', 'pinterest',
+    'notification', 'alert', 'security', 'securite', 'connexion', 'login'
+]
+
+# Onglets Gmail jamais utiles pour le coaching
+EXCLUDE_GMAIL_CATEGORIES = ['promotions', 'social']
+
+
+def is_excluded(subject: str, sender: str) -> bool:
+    """Filtre local: tout ce que le serveur exclut l'est aussi ici (EXCLUDE_SENDERS contient un mot de EXCLUDE_PATTERNS)"""
+    subject = (subject or '').lower()
+    sender = (sender or '').lower()
+    return any(p in subject for p in EXCLUDE_PATTERNS) or any(p in sender for p in EXCLUDE_PATTERNS)
+
+
+def gmail_raw_query() -> str:
+    """Requete X-GM-RAW: -category:promotions -from:stripe.com ..."""
+    terms = [f"-category:{c}" for c in EXCLUDE_GMAIL_CATEGORIES]
+    terms += [f"-from:{s}" for s in EXCLUDE_SENDERS]
+    return " ".join(terms)
+
+
+def imap_search_criteria() -> List[str]:
+    """Equivalent IMAP standard (serveurs non Gmail): NOT FROM x ..."""
+    return [f'NOT FROM "{s}"' for s in EXCLUDE_SENDERS]
@@ -0,0 +1,118 @@
+"""
+Extraction du texte des emails HTML en une seule passe (html.parser incremental)
+Supprime styles, scripts, contenus caches (preheaders, pixels de tracking) et normalise les espaces
+pour ne pas payer ce bruit en tokens LLM
+"""
+
+from html.parser import HTMLParser
+
+# Elements dont le contenu n'est jamais du texte lisible
+SKIP_TAGS = {"head", "style", "script", "noscript", "template", "title", "svg", "iframe", "object", "xml"}
+# Elements sans balise fermante
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Paragraphes: ligne vide; blocs: simple retour a la ligne
+PARAGRAPH_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "table", "ul", "ol"}
+BLOCK_TAGS = PARAGRAPH_TAGS | {"div", "li", "tr", "section", "article", "header", "footer", "center", "dd", "dt"}
+# Cellules de tableau: simple espace entre colonnes
+CELL_TAGS = {"td", "th"}
+
+# Caracteres invisibles utilises pour remplir les preheaders marketing
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad\u034f"), None)
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Parser incremental: feed() par morceaux puis get_text()"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)  # entites (&eacute; &nbsp; &#8217;) decodees
+        self._parts = []
+        self._stack = []  # [(tag, cache)]
+        self._open = {}  # tag -> nombre d'elements ouverts (fermetures orphelines en O(1))
+        self._hidden = 0  # profondeur dans un element ignore
+        self._breaks = 0  # sauts de ligne en attente avant le prochain texte
+        self._space = False  # espace en attente avant le prochain texte
+
+    def _is_hidden(self, tag: str, attrs) -> bool:
+        if tag in SKIP_TAGS:
+            return True
+        for name, value in attrs:
+            if name == "hidden":
+                return True
+            if name == "style" and value:
+                style = value.replace(" ", "").lower()
+                if "display:none" in style or "visibility:hidden" in style or "mso-hide:all" in style:
+                    return True
+        return False
+
+    def _break(self, count: int):
+        if self._parts:
+            self._breaks = max(self._breaks, count)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br" and not self._hidden:
+                self._break(1)
+            return
+        hidden = self._is_hidden(tag, attrs)
+        self._stack.append((tag, hidden))
+        self._open[tag] = self._open.get(tag, 0) + 1
+        if hidden:
+            self._hidden += 1
+        elif not self._hidden:
+            if tag in BLOCK_TAGS:
+                self._break(2 if tag in PARAGRAPH_TAGS else 1)
+            elif tag in CELL_TAGS:
+                self._space = True
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/>, <div/>: rien a empiler
+        if tag == "br" and not self._hidden:
+            self._break(1)
+
+    def handle_endtag(self, tag):
+        if not self._open.get(tag):
+            return  # Fermeture orpheline (HTML d'email souvent mal forme)
+        while self._stack:
+            open_tag, hidden = self._stack.pop()
+            self._open[open_tag] -= 1
+            if hidden:
+                self._hidden -= 1
+            if open_tag == tag:
+                break
+        if not self._hidden and tag in BLOCK_TAGS:
+            self._break(2 if tag in PARAGRAPH_TAGS else 1)
+
+    def handle_data(self, data):
+        if self._hidden:
+            return
+        data = data.translate(_INVISIBLE)
+        words = data.split()
+        if not words:
+            if data:
+                self._space = True
+            return
+        if self._breaks:
+            prefix = "\n" * self._breaks
+        elif self._parts and (self._space or data[0].isspace()):
+            prefix = " "
+        else:
+            prefix = ""
+        self._parts.append(prefix + " ".join(words))
+        self._breaks = 0
+        self._space = data[-1].isspace()
+
+    def get_text(self) -> str:
+        return "".join(self._parts)
+
+
+def html_to_text(html: str) -> str:
+    """Convertit un corps HTML en texte lisible (une seule passe)"""
+    if not html:
+        return ""
+    parser = HTMLTextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        print(f"[HTML] Erreur extraction texte: {e}")
+    return parser.get_text()
@@ -0,0 +1,208 @@
+"""
+Stockage local compresse des messages bruts (RFC822)
+Un email n'est telecharge qu'une fois: parsing et extraction des pieces jointes
+peuvent etre rejoues hors ligne, a la vitesse du disque
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+# Sur disque persistant /data si dispo, sinon local (comme la DB)
+RAW_STORE_DIR = os.getenv("RAW_STORE_DIR", "/data/raw_store" if os.path.exists("/data") else "raw_store")
+RAW_STORE_MAX_MB = int(os.getenv("RAW_STORE_MAX_MB", 2048))  # 0 = desactive
+COMPRESSION_LEVEL = 6
+
+
+class RawMessageStore:
+    """Store adresse par contenu (sha256 du message brut), compresse zlib, eviction LRU
+
+    Un meme blob est retrouvable par (dossier, UIDVALIDITY, UID) et par Message-ID.
+    Cache au mieux: une erreur disque ou SQLite (index verrouille, corrompu) compte comme un
+    absent a la lecture et une ecriture ignoree, jamais comme une erreur de chargement.
+    Une seule instance par dossier (get_store): l'eviction se fait contre un seul total.
+    """
+
+    def __init__(self, root: str = RAW_STORE_DIR, max_mb: int = RAW_STORE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.index_path = os.path.join(root, "index.db")
+        self._lock = threading.Lock()
+        self._conn = None  # connexion d'index partagee par les threads, sous self._lock
+        self._total = 0  # taille compressee sur disque, tenue a jour a chaque ecriture/eviction
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "errors": 0}
+        os.makedirs(root, exist_ok=True)
+        self._init_index()
+
+    def _init_index(self):
+        c = self._index().cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS blobs
+                     (sha TEXT PRIMARY KEY,
+                      size INTEGER, -- taille compressee sur disque
+                      raw_size INTEGER,
+                      last_access REAL)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS blob_keys
+                     (key TEXT PRIMARY KEY, -- "uid:<dossier>:<uidvalidity>:<uid>" ou "msgid:<message-id>"
+                      sha TEXT)''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_blobs_access ON blobs(last_access)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_keys_sha ON blob_keys(sha)")
+        c.execute("SELECT COALESCE(SUM(size), 0) FROM blobs")
+        self._total = c.fetchone()[0]
+        self._conn.commit()
+
+    def _index(self) -> sqlite3.Connection:
+        """Connexion a l'index, ouverte une fois (appelant sous self._lock, ou dans __init__)"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.index_path, timeout=5, check_same_thread=False)
+        return self._conn
+
+    def _reset_index(self, error: Exception, action: str):
+        """Erreur SQLite: connexion jetee (rouverte au prochain appel), le chargement continue sans cache"""
+        print(f"[RAW STORE] Index indisponible ({action}): {error}")
+        self.stats["errors"] += 1
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], f"{sha}.eml.z")
+
+    def _keys(self, folder: str = None, uidvalidity: int = None, uid: str = None, message_id: str = None):
+        keys = []
+        if folder and uidvalidity and uid:
+            keys.append(f"uid:{folder}:{uidvalidity}:{uid}")
+        if message_id:
+            keys.append(f"msgid:{message_id.strip()}")
+        return keys
+
+    def get(self, folder: str = None, uidvalidity: int = None, uid: str = None,
+            message_id: str = None) -> Optional[bytes]:
+        """Message brut decompresse, ou None si absent du store (ou store illisible)"""
+        keys = self._keys(folder, uidvalidity, uid, message_id)
+        if not keys:
+            return None
+        with self._lock:
+            try:
+                conn = self._index()
+                c = conn.cursor()
+                c.execute(f"SELECT sha FROM blob_keys WHERE key IN ({','.join('?' * len(keys))}) LIMIT 1", keys)
+                row = c.fetchone()
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                sha = row[0]
+                try:
+                    with open(self._blob_path(sha), "rb") as f:
+                        raw = zlib.decompress(f.read())
+                except (OSError, zlib.error):
+                    # Blob perdu ou corrompu: on oublie l'entree
+                    self._forget(c, sha)
+                    conn.commit()
+                    self.stats["misses"] += 1
+                    return None
+                c.execute("UPDATE blobs SET last_access = ? WHERE sha = ?", (time.time(), sha))
+                conn.commit()
+                self.stats["hits"] += 1
+                return raw
+            except sqlite3.Error as e:
+                self._reset_index(e, "lecture")
+                self.stats["misses"] += 1
+                return None
+
+    def put(self, raw: bytes, folder: str = None, uidvalidity: int = None, uid: str = None,
+            message_id: str = None) -> Optional[str]:
+        """Ajoute un message brut (idempotent) et retourne son sha256 (None si l'ecriture est ignoree)"""
+        if not raw or self.max_bytes <= 0:
+            return None
+        keys = self._keys(folder, uidvalidity, uid, message_id)
+        sha = hashlib.sha256(raw).hexdigest()
+        path = self._blob_path(sha)
+        with self._lock:
+            try:
+                conn = self._index()
+                c = conn.cursor()
+                c.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,))
+                if c.fetchone() is None:
+                    data = zlib.compress(raw, COMPRESSION_LEVEL)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = path + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                    c.execute("INSERT INTO blobs (sha, size, raw_size, last_access) VALUES (?, ?, ?, ?)",
+                              (sha, len(data), len(raw), time.time()))
+                    self._total += len(data)
+                    self.stats["writes"] += 1
+                c.executemany("INSERT OR REPLACE INTO blob_keys (key, sha) VALUES (?, ?)", [(k, sha) for k in keys])
+                conn.commit()
+                self._evict(c)
+                conn.commit()
+            except OSError as e:
+                print(f"[RAW STORE] Erreur ecriture {sha[:12]}: {e}")
+                return None
+            except sqlite3.Error as e:
+                self._reset_index(e, f"ecriture {sha[:12]}")
+                return None
+        return sha
+
+    def _forget(self, c, sha: str):
+        c.execute("SELECT size FROM blobs WHERE sha = ?", (sha,))
+        row = c.fetchone()
+        c.execute("DELETE FROM blob_keys WHERE sha = ?", (sha,))
+        c.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+        if row:
+            self._total -= row[0]
+
+    def _evict(self, c):
+        """Supprime les blobs les moins recemment utilises au-dela du plafond"""
+        if self._total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)  # marge pour ne pas evincer a chaque ecriture
+        c.execute("SELECT sha, size FROM blobs ORDER BY last_access ASC")
+        for sha, size in c.fetchall():
+            if self._total <= target:
+                break
+            try:
+                os.remove(self._blob_path(sha))
+            except OSError:
+                pass
+            c.execute("DELETE FROM blob_keys WHERE sha = ?", (sha,))
+            c.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+            self._total -= size
+            self.stats["evicted"] += 1
+
+    def get_stats(self):
+        """Compteurs hits/misses + taille du store (compresse / brut)"""
+        with self._lock:
+            stats = dict(self.stats)
+            try:
+                c = self._index().cursor()
+                c.execute("SELECT COUNT(*), COALESCE(SUM(raw_size), 0) FROM blobs")
+                count, raw_size = c.fetchone()
+            except sqlite3.Error as e:
+                self._reset_index(e, "statistiques")
+                count, raw_size = 0, 0
+            size = self._total
+        stats.update({"messages": count, "size_mb": round(size / (1024 * 1024), 1),
+                      "raw_size_mb": round(raw_size / (1024 * 1024), 1)})
+        return stats
+
+
+_STORES = {}  # {dossier absolu: store} partages par tous les lecteurs du process
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(root: str = RAW_STORE_DIR, max_mb: int = RAW_STORE_MAX_MB) -> RawMessageStore:
+    """Store du dossier `root`, cree au premier appel puis partage (lecteurs de session, backfills, IDLE)"""
+    key = os.path.abspath(root)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = RawMessageStore(root, max_mb)
+        return store